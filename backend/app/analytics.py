@@ -0,0 +1,209 @@
+import argparse
+import json
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import String, cast, delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from .models import Company, Expense, ExpenseRollup, User
+
+# Each expense is counted once per dimension; month and status totals are
+# read from the category rows.
+DIMENSIONS = ("category", "employee")
+
+RollupKey = Tuple[int, str, str, str, str]  # company, dimension, month, status, key
+
+
+def month_of(value: Optional[datetime]) -> str:
+    return (value or datetime.utcnow()).strftime("%Y-%m")
+
+
+class RollupDelta:
+    """Accumulates rollup changes so a request applies them in one upsert."""
+
+    def __init__(self):
+        self.changes: Dict[RollupKey, list] = defaultdict(lambda: [0, 0.0])
+
+    def add(self, expense, status: str, sign: int = 1) -> None:
+        """Count (sign=1) or uncount (sign=-1) an expense under `status`.
+
+        `expense` may be an Expense or a dict with the same fields.
+        """
+        get = expense.get if isinstance(expense, dict) else lambda name: getattr(expense, name)
+        month = month_of(get("date"))
+        amount = get("normalized_amount") or 0.0
+        keys = {"category": get("category") or "", "employee": str(get("employee_id"))}
+        for dimension in DIMENSIONS:
+            change = self.changes[(get("company_id"), dimension, month, status, keys[dimension])]
+            change[0] += sign
+            change[1] += sign * amount
+
+    def move(self, expense, old_status: str, new_status: str) -> None:
+        if old_status != new_status:
+            self.add(expense, old_status, -1)
+            self.add(expense, new_status, 1)
+
+    def flush(self, db: Session) -> None:
+        rows = [
+            {"company_id": k[0], "dimension": k[1], "month": k[2], "status": k[3], "key": k[4], "expense_count": c, "total": t}
+            for k, (c, t) in self.changes.items()
+            if c or t
+        ]
+        self.changes.clear()
+        if rows:
+            _upsert(db, rows)
+
+
+def _upsert(db: Session, rows) -> None:
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(ExpenseRollup).values(rows)
+        db.execute(stmt.on_duplicate_key_update(
+            expense_count=ExpenseRollup.expense_count + stmt.inserted.expense_count,
+            total=ExpenseRollup.total + stmt.inserted.total,
+        ))
+        return
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        stmt = dialect_insert(ExpenseRollup).values(rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["company_id", "dimension", "month", "status", "key"],
+            set_={
+                "expense_count": ExpenseRollup.expense_count + stmt.excluded.expense_count,
+                "total": ExpenseRollup.total + stmt.excluded.total,
+            },
+        ))
+        return
+    # Anything else: update, then insert what wasn't there
+    for row in rows:
+        key = [getattr(ExpenseRollup, k) == row[k] for k in ("company_id", "dimension", "month", "status", "key")]
+        result = db.execute(
+            update(ExpenseRollup)
+            .where(*key)
+            .values(expense_count=ExpenseRollup.expense_count + row["expense_count"], total=ExpenseRollup.total + row["total"])
+        )
+        if result.rowcount == 0:
+            db.execute(insert(ExpenseRollup).values(**row))
+
+
+def _month_expr(db: Session):
+    if db.get_bind().dialect.name == "mysql":
+        return func.date_format(Expense.date, "%Y-%m")
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(Expense.date, "YYYY-MM")
+    return func.strftime("%Y-%m", Expense.date)
+
+
+def rebuild(db: Session, company_id: Optional[int] = None) -> int:
+    """Recompute rollups from the expenses table (all companies by default)."""
+    clear = delete(ExpenseRollup)
+    if company_id is not None:
+        clear = clear.where(ExpenseRollup.company_id == company_id)
+    db.execute(clear)
+    month = _month_expr(db)
+    keys = {"category": func.coalesce(Expense.category, ""), "employee": cast(Expense.employee_id, String)}
+    inserted = 0
+    for dimension in DIMENSIONS:
+        key = keys[dimension]
+        source = (
+            select(
+                Expense.company_id,
+                literal(dimension),
+                month,
+                Expense.status,
+                key,
+                func.count(Expense.id),
+                func.coalesce(func.sum(Expense.normalized_amount), 0.0),
+            )
+            .where(Expense.company_id.is_not(None))
+            .group_by(Expense.company_id, month, Expense.status, key)
+        )
+        if company_id is not None:
+            source = source.where(Expense.company_id == company_id)
+        result = db.execute(
+            insert(ExpenseRollup).from_select(
+                ["company_id", "dimension", "month", "status", "key", "expense_count", "total"], source
+            )
+        )
+        inserted += max(result.rowcount or 0, 0)
+    db.commit()
+    return inserted
+
+
+def company_analytics(db: Session, company_id: int, from_month: Optional[str] = None, to_month: Optional[str] = None) -> Dict:
+    started = time.perf_counter()
+    query = select(
+        ExpenseRollup.dimension,
+        ExpenseRollup.month,
+        ExpenseRollup.status,
+        ExpenseRollup.key,
+        ExpenseRollup.expense_count,
+        ExpenseRollup.total,
+    ).where(ExpenseRollup.company_id == company_id, ExpenseRollup.expense_count != 0)
+    if from_month:
+        query = query.where(ExpenseRollup.month >= from_month)
+    if to_month:
+        query = query.where(ExpenseRollup.month <= to_month)
+
+    buckets = {name: defaultdict(lambda: [0, 0.0]) for name in ("category", "employee", "month", "status")}
+    for dimension, month, status, key, count, total in db.execute(query):
+        targets = [buckets[dimension][key]]
+        if dimension == "category":
+            targets += [buckets["month"][month], buckets["status"][status]]
+        for bucket in targets:
+            bucket[0] += count
+            bucket[1] += total
+
+    names = {}
+    if buckets["employee"]:
+        ids = [int(k) for k in buckets["employee"]]
+        names = {str(i): n for i, n in db.execute(select(User.id, User.name).where(User.id.in_(ids)))}
+    company = db.get(Company, company_id)
+
+    def rows(name, label, order_by_key=False):
+        items = [{label: k, "count": c, "amount": round(t, 2)} for k, (c, t) in buckets[name].items()]
+        return sorted(items, key=(lambda i: i[label]) if order_by_key else (lambda i: -i["amount"]))
+
+    by_employee = rows("employee", "employee_id")
+    for item in by_employee:
+        item["employee_name"] = names.get(item["employee_id"])
+        item["employee_id"] = int(item["employee_id"])
+    by_status = rows("status", "status")
+    return {
+        "currency": company.currency if company else None,
+        "totals": {
+            "count": sum(i["count"] for i in by_status),
+            "amount": round(sum(i["amount"] for i in by_status), 2),
+        },
+        "by_category": rows("category", "category"),
+        "by_employee": by_employee,
+        "by_month": rows("month", "month", order_by_key=True),
+        "by_status": by_status,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    # python -m app.analytics rebuild [--company ID]
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain expense analytics rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--company", type=int)
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        rows = rebuild(db, args.company)
+        print(json.dumps({"rollup_rows": rows, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}))
+    finally:
+        db.close()
@@ -0,0 +1,140 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from .config import APPROVAL_POLICY_RECHECK_SECONDS
+from .models import ApprovalPolicyVersion, ApprovalRule, ApproverAssignment
+from .principals import Principal
+
+
+@dataclass(frozen=True)
+class ApprovalPolicy:
+    """A company's approver sequence and rule thresholds, compiled once per version."""
+
+    company_id: int
+    version: int
+    steps: Tuple[Tuple[int, int], ...] = ()  # (approver_id, step_order), in order
+    percentage_threshold: Optional[int] = None
+    specific_approver_id: Optional[int] = None
+    hybrid: bool = False
+
+    @property
+    def approver_ids(self) -> List[int]:
+        return [approver_id for approver_id, _ in self.steps]
+
+
+class PolicyCache:
+    """In-process cache of compiled approval policies keyed by company.
+
+    Entries are tagged with the company's policy version. Writers bump the
+    version in the database in the same transaction as the change, so other
+    processes notice on their next version check; `recheck` seconds may
+    pass between checks for a cached entry.
+    """
+
+    def __init__(self, recheck: float = 0.0):
+        self.recheck = recheck
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[ApprovalPolicy, float]] = {}
+
+    def get(self, company_id: int, version: Callable[[], int], load: Callable[[int], ApprovalPolicy]) -> ApprovalPolicy:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(company_id)
+            if entry and now - entry[1] < self.recheck:
+                self.hits += 1
+                return entry[0]
+        current = version()
+        if entry and entry[0].version == current:
+            with self._lock:
+                self.hits += 1
+                self._entries[company_id] = (entry[0], now)
+            return entry[0]
+        with self._lock:
+            self.misses += 1
+        policy = load(current)
+        with self._lock:
+            self._entries[company_id] = (policy, now)
+        return policy
+
+    def invalidate(self, company_id: int) -> None:
+        with self._lock:
+            self._entries.pop(company_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+policy_cache = PolicyCache(APPROVAL_POLICY_RECHECK_SECONDS)
+
+
+def policy_version(db: Session, company_id: int) -> int:
+    row = db.get(ApprovalPolicyVersion, company_id)
+    return row.version if row else 0
+
+
+def bump_policy_version(db: Session, company_id: int) -> None:
+    """Mark the company's policy as changed; commit with the change itself.
+
+    The local cache entry is dropped once that commit lands; dropped any
+    earlier, a request in between could cache the old policy again and
+    serve it unchecked for up to `recheck` seconds.
+    """
+    result = db.execute(
+        update(ApprovalPolicyVersion)
+        .where(ApprovalPolicyVersion.company_id == company_id)
+        .values(version=ApprovalPolicyVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.add(ApprovalPolicyVersion(company_id=company_id, version=1))
+    event.listen(db, "after_commit", lambda session: policy_cache.invalidate(company_id), once=True)
+
+
+def _load_policy(db: Session, company_id: int, version: int) -> ApprovalPolicy:
+    assignments = (
+        db.query(ApproverAssignment)
+        .filter(ApproverAssignment.company_id == company_id)
+        .order_by(ApproverAssignment.step_order.asc())
+        .all()
+    )
+    rule = db.query(ApprovalRule).filter(ApprovalRule.company_id == company_id).first()
+    return ApprovalPolicy(
+        company_id=company_id,
+        version=version,
+        steps=tuple((a.approver_id, a.step_order) for a in assignments),
+        percentage_threshold=rule.percentage_threshold if rule else None,
+        specific_approver_id=rule.specific_approver_id if rule else None,
+        hybrid=bool(rule.hybrid) if rule else False,
+    )
+
+
+def get_policy(db: Session, company_id: int) -> ApprovalPolicy:
+    return policy_cache.get(
+        company_id,
+        lambda: policy_version(db, company_id),
+        lambda version: _load_policy(db, company_id, version),
+    )
+
+
+def approval_chain(employee: Principal, policy: ApprovalPolicy) -> List[Dict]:
+    """Approval rows for a new expense: the manager first if they approve,
+    then the company assignments in order. Only the first step is pending."""
+    approvers = []
+    if employee.manager_id and employee.is_manager_approver:
+        approvers.append(employee.manager_id)
+    approvers.extend(policy.approver_ids)
+    return [
+        {"approver_id": approver_id, "step_order": step, "status": "pending" if step == 1 else "queued"}
+        for step, approver_id in enumerate(approvers, start=1)
+    ]
@@ -1,11 +1,99 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
+from fastapi import HTTPException, status
 from jose import jwt, JWTError
 from passlib.context import CryptContext
-from .config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from .config import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_QUEUE_LIMIT,
+    PASSWORD_RETRY_AFTER_SECONDS,
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+class PasswordPool:
+    """Bounded executor for bcrypt work.
+
+    bcrypt releases the GIL, so a small thread pool gives real parallelism
+    while keeping password work off the request threadpool and event loop.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.queue_limit:
+                self.rejected += 1
+                raise PasswordPoolBusy()
+            self._pending += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # Released when the work ends, not when the caller stops waiting: a
+        # cancelled request leaves bcrypt running on its thread until done
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "pending": self._pending,
+                "rejected": self.rejected,
+            }
+
+
+password_pool = PasswordPool(workers=PASSWORD_HASH_WORKERS, queue_limit=PASSWORD_HASH_QUEUE_LIMIT)
+
+
+def _too_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many password requests",
+        headers={"Retry-After": str(PASSWORD_RETRY_AFTER_SECONDS)},
+    )
+
+
+async def hash_password(password: str) -> str:
+    try:
+        return await password_pool.run(pwd_context.hash, password)
+    except PasswordPoolBusy:
+        raise _too_busy()
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify on the password pool. The second value is a replacement hash
+    when the stored one uses an outdated scheme or work factor."""
+    try:
+        return await password_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)
+    except PasswordPoolBusy:
+        raise _too_busy()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -0,0 +1,251 @@
+import argparse
+import csv
+import io
+import json
+import math
+import time
+from datetime import date, datetime
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import fx
+from .analytics import RollupDelta
+from .approvals import approval_chain, get_policy
+from .config import IMPORT_CHUNK_SIZE, IMPORT_MAX_ERRORS
+from .models import Approval, Expense, User
+from .principals import Principal
+
+IMPORT_STATUSES = ("pending", "approved", "rejected")
+
+
+def guess_format(filename: Optional[str]) -> str:
+    if filename and filename.lower().endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    return "csv"
+
+
+def read_rows(stream: BinaryIO, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """(row number, record) pairs; unparseable NDJSON lines yield None."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        # Row 1 is the header
+        for n, row in enumerate(csv.DictReader(text), start=2):
+            yield n, row
+        return
+    for n, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield n, json.loads(line)
+        except ValueError:
+            yield n, None
+
+
+def _chunks(rows: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parse_date(value: Any) -> datetime:
+    if value in (None, ""):
+        return datetime.utcnow()
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    return datetime.fromisoformat(str(value).strip())
+
+
+class ExpenseImporter:
+    """Bulk-load expenses for one company.
+
+    Employees, approver assignments and FX rates are resolved once up front
+    (rates once per currency/target/day), then each chunk is validated in a
+    single pass and written with multi-row inserts in its own transaction.
+    Admins may import for any employee of their company and set a historical
+    status; everyone else imports their own pending expenses.
+    """
+
+    def __init__(self, db: Session, actor: Principal, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.db = db
+        self.actor = actor
+        self.chunk_size = chunk_size
+        self.is_admin = actor.role == "admin"
+        if self.is_admin:
+            users = db.query(User).filter(User.company_id == actor.company_id).all()
+            employees = [Principal.from_user(u) for u in users]
+        else:
+            employees = [actor]
+        self.by_id = {e.id: e for e in employees}
+        self.by_email = {e.email.lower(): e for e in employees}
+        policy = get_policy(db, actor.company_id)
+        self.chains = {e.id: approval_chain(e, policy) for e in employees}
+        self.rates: Dict[Tuple[str, str, date], Any] = {}
+        self.returning = db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+
+    def _error(self, row: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def _rate(self, base: str, target: str, day: date) -> float:
+        key = (base, target, day)
+        if key not in self.rates:
+            try:
+                self.rates[key] = fx.get_rate(base, target, day)
+            except KeyError as exc:
+                self.rates[key] = ValueError(f"Unsupported currency: {exc.args[0]}")
+            except Exception:
+                self.rates[key] = ValueError("Exchange rates unavailable")
+        rate = self.rates[key]
+        if isinstance(rate, Exception):
+            raise rate
+        return rate
+
+    def _employee(self, record: Dict) -> Principal:
+        email = str(record.get("employee_email") or "").strip().lower()
+        employee_id = record.get("employee_id")
+        if not email and employee_id in (None, ""):
+            return self.actor
+        try:
+            employee = self.by_email.get(email) if email else self.by_id.get(int(employee_id))
+        except (TypeError, ValueError):
+            employee = None
+        if employee is None:
+            raise ValueError("Unknown employee")
+        return employee
+
+    def _validate(self, record: Any) -> Tuple[Dict, Principal, str]:
+        if not isinstance(record, dict):
+            raise ValueError("Invalid JSON")
+        for field in ("amount", "currency", "category"):
+            if record.get(field) in (None, ""):
+                raise ValueError(f"Missing {field}")
+        try:
+            amount = float(record["amount"])
+        except (TypeError, ValueError):
+            raise ValueError("Invalid amount")
+        if not math.isfinite(amount):
+            raise ValueError("Invalid amount")
+        currency = str(record["currency"]).strip().upper()
+        try:
+            expense_date = _parse_date(record.get("date"))
+        except ValueError:
+            raise ValueError("Invalid date")
+        status = str(record.get("status") or "pending").strip().lower()
+        if status not in IMPORT_STATUSES or (status != "pending" and not self.is_admin):
+            raise ValueError(f"Invalid status: {status}")
+        employee = self._employee(record)
+        target = employee.currency or "USD"
+        steps = len(self.chains[employee.id]) if status == "pending" else 0
+        values = {
+            "employee_id": employee.id,
+            "company_id": self.actor.company_id,
+            "amount": amount,
+            "currency": currency,
+            "normalized_amount": amount * self._rate(currency, target, expense_date.date()),
+            "category": str(record["category"]).strip(),
+            "description": str(record.get("description") or ""),
+            "date": expense_date,
+            "status": status,
+            "total_steps": steps,
+            "current_step": 1 if steps else None,
+        }
+        return values, employee, status
+
+    def _insert(self, values: List[Dict]) -> List[int]:
+        if self.returning:
+            result = self.db.execute(insert(Expense).returning(Expense.id, sort_by_parameter_order=True), values)
+            return list(result.scalars())
+        # No executemany RETURNING (MySQL): the ORM flush still batches what it can
+        expenses = [Expense(**v) for v in values]
+        self.db.add_all(expenses)
+        self.db.flush()
+        return [e.id for e in expenses]
+
+    def _load_chunk(self, chunk: List[Tuple[int, Any]]) -> None:
+        valid = []
+        for n, record in chunk:
+            try:
+                valid.append((n,) + self._validate(record))
+            except ValueError as exc:
+                self._error(n, str(exc))
+        if not valid:
+            return
+        try:
+            ids = self._insert([values for _, values, _, _ in valid])
+            approvals = [
+                {"expense_id": expense_id, **step}
+                for expense_id, (_, _, employee, status) in zip(ids, valid)
+                if status == "pending"
+                for step in self.chains[employee.id]
+            ]
+            if approvals:
+                self.db.execute(insert(Approval), approvals)
+            rollups = RollupDelta()
+            for _, values, _, status in valid:
+                rollups.add(values, status)
+            rollups.flush(self.db)
+            self.db.commit()
+        except Exception as exc:
+            self.db.rollback()
+            for n, _, _, _ in valid:
+                self._error(n, f"Database error: {exc.__class__.__name__}")
+            return
+        self.db.expunge_all()
+        self.imported += len(valid)
+
+    def run(self, rows: Iterable[Tuple[int, Any]]) -> Dict:
+        started = time.perf_counter()
+        for chunk in _chunks(rows, self.chunk_size):
+            self.rows += len(chunk)
+            self._load_chunk(chunk)
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+
+def import_expenses(db: Session, actor: Principal, stream: BinaryIO, fmt: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict:
+    return ExpenseImporter(db, actor, chunk_size).run(read_rows(stream, fmt))
+
+
+if __name__ == "__main__":
+    # python -m app.bulk_import --as admin@example.com expenses.csv [more.ndjson ...]
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk-import expenses from CSV/NDJSON files")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--as", dest="email", required=True, help="importing user (admins may import for their whole company)")
+    parser.add_argument("--format", choices=("csv", "ndjson"))
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == args.email).first()
+        if user is None or user.company_id is None:
+            parser.error(f"{args.email} is not a user linked to a company")
+        actor = Principal.from_user(user)
+        for path in args.files:
+            with open(path, "rb") as fh:
+                report = import_expenses(db, actor, fh, args.format or guess_format(path), args.chunk_size)
+            print(json.dumps({"file": path, **report}))
+    finally:
+        db.close()
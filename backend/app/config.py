@@ -12,13 +12,87 @@ SECRET_KEY = os.getenv("SECRET_KEY", "super-secret-key-change-me")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
+# Password hashing: bcrypt work factor, and the dedicated worker pool that
+# runs it. Requests beyond workers + queue limit are rejected with 429.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+PASSWORD_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_RETRY_AFTER_SECONDS", "1"))
+
 # Build DATABASE_URL from MYSQL_* if not explicitly set
 _explicit_db_url = os.getenv("DATABASE_URL")
 if _explicit_db_url:
     DATABASE_URL = _explicit_db_url
 else:
-    # Temporarily force SQLite for local smoke tests; remove once MySQL credentials are fixed
-    DATABASE_URL = "sqlite:///./receiptpath.db"
+    # Without DATABASE_URL the app runs on a local SQLite file
+    DATABASE_URL = f"sqlite:///{os.getenv('SQLITE_PATH', './receiptpath.db')}"
+
+# Async endpoints (login, me, submit, pending approvals, decide) use an async
+# engine on the same database; ASYNC_DATABASE_URL defaults to DATABASE_URL with
+# its async driver (aiosqlite, aiomysql, asyncpg). DB_ASYNC=0 runs those
+# endpoints' queries on the sync engine in the threadpool instead, which is
+# the default for SQLite: aiosqlite still runs each connection on a thread and
+# SQLite serializes writers, so the async engine only adds overhead there.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+DB_ASYNC = os.getenv("DB_ASYNC", "0" if DATABASE_URL.startswith("sqlite") else "1") == "1"
+
+# Connection pool (sync and async engines each get one). Checkout waits up to
+# DB_POOL_TIMEOUT seconds for a free connection. DB_POOL_PRE_PING is always,
+# idle (ping only connections unused for DB_POOL_PING_IDLE_SECONDS) or never.
+# DB_POOL_WARM connections are opened at startup (default: DB_POOL_SIZE).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "idle").lower()
+DB_POOL_PING_IDLE_SECONDS = float(os.getenv("DB_POOL_PING_IDLE_SECONDS", "30"))
+DB_POOL_WARM = int(os.getenv("DB_POOL_WARM", str(DB_POOL_SIZE)))
+
+# SQLite mode (file databases only). Every connection is opened with the
+# journal mode, synchronous level, busy timeout (ms), mmap size (bytes) and
+# page cache size (negative: KiB) below. With SQLITE_WRITE_QUEUE=1 the hot
+# write endpoints (submit, decide) hand their writes to one writer thread
+# that commits up to SQLITE_WRITE_BATCH queued writes per transaction, while
+# reads keep using the pool concurrently.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL").upper()
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_WRITE_QUEUE = os.getenv("SQLITE_WRITE_QUEUE", "1") == "1"
+SQLITE_WRITE_BATCH = int(os.getenv("SQLITE_WRITE_BATCH", "64"))
+
+# Exchange-rate cache: rates are served fresh for FX_CACHE_TTL_SECONDS, then
+# served stale for up to FX_CACHE_STALE_SECONDS more while a refresh runs
+FX_CACHE_TTL_SECONDS = float(os.getenv("FX_CACHE_TTL_SECONDS", "3600"))
+FX_CACHE_STALE_SECONDS = float(os.getenv("FX_CACHE_STALE_SECONDS", "86400"))
+
+# Daily rate snapshots are stored against a single pivot currency and every
+# other pair is derived as a cross-rate. FX_RATES_FILE (JSON or CSV) is loaded
+# into the store at startup, which lets the app run without network access.
+FX_PIVOT_CURRENCY = os.getenv("FX_PIVOT_CURRENCY", "USD").upper()
+FX_RATES_FILE = os.getenv("FX_RATES_FILE")
+
+# Authenticated-principal cache: token -> user snapshot, so authenticated
+# requests skip the user lookup. Role/password changes evict entries in the
+# same process; other workers see them after the TTL.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+# Approval policy cache: seconds a cached company policy is trusted before its
+# version is re-read (0 checks on every use, keeping workers strictly coherent)
+APPROVAL_POLICY_RECHECK_SECONDS = float(os.getenv("APPROVAL_POLICY_RECHECK_SECONDS", "0"))
+
+# Expense export: rows fetched per server-side cursor batch (and per parquet row group)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Bulk expense import: rows per transaction, and how many row errors to report
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+# Country/currency catalogue: served from this file when present (written by
+# `python -m app.countries`), otherwise from the bundled app/data snapshot
+COUNTRIES_CACHE_FILE = os.getenv("COUNTRIES_CACHE_FILE")
 
 # CORS: prefer BACKEND_CORS_ORIGINS, fallback to ALLOWED_ORIGINS for compatibility
 _cors_env = os.getenv("BACKEND_CORS_ORIGINS") or os.getenv("ALLOWED_ORIGINS")
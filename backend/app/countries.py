@@ -0,0 +1,103 @@
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+from typing import Dict, List, Optional
+
+import requests
+from fastapi import Request, Response
+
+from .config import COUNTRIES_CACHE_FILE
+
+BUNDLED_FILE = os.path.join(os.path.dirname(__file__), "data", "countries.json")
+RESTCOUNTRIES_URL = "https://restcountries.com/v3.1/all?fields=name,currencies"
+
+
+class EncodedJSON:
+    """A JSON document encoded once, with its gzip body and ETag."""
+
+    __slots__ = ("body", "gzip_body", "etag")
+
+    def __init__(self, obj):
+        self.body = json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, mtime=0)
+        self.etag = '"%s"' % hashlib.sha256(self.body).hexdigest()[:32]
+
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": "public, max-age=86400", "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+            if "*" in tags or self.etag in tags:
+                return Response(status_code=304, headers=headers)
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            return Response(self.gzip_body, media_type="application/json", headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
+
+
+def _reshape(data: List[Dict]) -> List[Dict]:
+    result = []
+    for item in data:
+        name = item.get("name", {}).get("common") or item.get("name", {}).get("official")
+        codes = list((item.get("currencies") or {}).keys())
+        result.append({"name": name, "currencies": codes})
+    return sorted(result, key=lambda c: c["name"] or "")
+
+
+class Catalogue:
+    def __init__(self, countries: List[Dict]):
+        self.countries = countries
+        # /utils/countries (app) and /utils/currencies (mysql_auth) shapes
+        self.countries_json = EncodedJSON(countries)
+        self.currencies_json = EncodedJSON({
+            "items": [
+                {"country": c["name"], "currency": c["currencies"][0]}
+                for c in countries
+                if c["name"] and c["currencies"]
+            ]
+        })
+
+
+_catalogue: Optional[Catalogue] = None
+_lock = threading.Lock()
+
+
+def _read_snapshot() -> List[Dict]:
+    path = COUNTRIES_CACHE_FILE if COUNTRIES_CACHE_FILE and os.path.exists(COUNTRIES_CACHE_FILE) else BUNDLED_FILE
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def get_catalogue() -> Catalogue:
+    global _catalogue
+    if _catalogue is None:
+        with _lock:
+            if _catalogue is None:
+                _catalogue = Catalogue(_read_snapshot())
+    return _catalogue
+
+
+def refresh(path: Optional[str] = None) -> int:
+    """Download the catalogue from restcountries and write it to the cache file."""
+    global _catalogue
+    path = path or COUNTRIES_CACHE_FILE
+    if not path:
+        raise RuntimeError("COUNTRIES_CACHE_FILE is not set")
+    resp = requests.get(RESTCOUNTRIES_URL, timeout=15)
+    resp.raise_for_status()
+    countries = _reshape(resp.json())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(countries, fh, ensure_ascii=False)
+    os.replace(tmp, path)
+    with _lock:
+        _catalogue = Catalogue(countries)
+    return len(countries)
+
+
+if __name__ == "__main__":
+    # python -m app.countries [cache_file]
+    print(f"{refresh(sys.argv[1] if len(sys.argv) > 1 else None)} countries written")
@@ -1,16 +1,81 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import asyncio
+
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.engine import url as sa_url
-from .config import DATABASE_URL
+from .config import (
+    ASYNC_DATABASE_URL,
+    DATABASE_URL,
+    DB_ASYNC,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PING_IDLE_SECONDS,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_MMAP_SIZE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_WRITE_BATCH,
+    SQLITE_WRITE_QUEUE,
+)
+from .pool import PRE_PING_STRATEGIES, MonitoredAsyncQueuePool, MonitoredQueuePool, install_idle_ping
+from .sqlite import JOURNAL_MODES, SYNCHRONOUS_LEVELS, WriteQueue, begin_immediate, install_pragmas, is_file_database
+
+
+if DB_POOL_PRE_PING not in PRE_PING_STRATEGIES:
+    raise ValueError(f"DB_POOL_PRE_PING must be one of {', '.join(PRE_PING_STRATEGIES)}")
+if SQLITE_JOURNAL_MODE not in JOURNAL_MODES:
+    raise ValueError(f"SQLITE_JOURNAL_MODE must be one of {', '.join(JOURNAL_MODES)}")
+if SQLITE_SYNCHRONOUS not in SYNCHRONOUS_LEVELS:
+    raise ValueError(f"SQLITE_SYNCHRONOUS must be one of {', '.join(SYNCHRONOUS_LEVELS)}")
 
 
-class Base(DeclarativeBase):
-    pass
+def pool_options(url, poolclass) -> dict:
+    """Engine arguments for the configured pool; in-memory SQLite keeps its own."""
+    u = sa_url.make_url(url)
+    if u.get_backend_name() == "sqlite" and u.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING == "always",
+    }
 
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+def tune_sqlite(target) -> None:
+    if is_file_database(target.url):
+        install_pragmas(
+            target, SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE
+        )
+
+
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL, MonitoredQueuePool))
+if DB_POOL_PRE_PING == "idle":
+    install_idle_ping(engine, DB_POOL_PING_IDLE_SECONDS)
+tune_sqlite(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# SQLite mode: the hot writes go through one group-committing writer thread
+write_queue = None
+if SQLITE_WRITE_QUEUE and is_file_database(DATABASE_URL):
+    # The writer owns one connection and takes the write lock as it begins
+    writer_engine = create_engine(DATABASE_URL, pool_size=1, max_overflow=0)
+    tune_sqlite(writer_engine)
+    begin_immediate(writer_engine)
+    write_queue = WriteQueue(
+        sessionmaker(bind=writer_engine, autoflush=False, expire_on_commit=False), SQLITE_WRITE_BATCH
+    )
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -19,6 +84,119 @@ def get_db():
         db.close()
 
 
+# Async drivers for each sync backend
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "mysql": "aiomysql", "postgresql": "asyncpg"}
+
+
+def async_url(url: str) -> sa_url.URL:
+    """`url` with the backend's async driver swapped in."""
+    u = sa_url.make_url(url)
+    driver = ASYNC_DRIVERS.get(u.get_backend_name())
+    return u.set(drivername=f"{u.get_backend_name()}+{driver}") if driver else u
+
+
+# Sessions that may hold a sync connection at once under DB_ASYNC=0
+THREADED_SESSION_SLOTS = DB_POOL_SIZE + DB_MAX_OVERFLOW if DB_MAX_OVERFLOW >= 0 else 1000
+_threaded_slots = asyncio.Semaphore(THREADED_SESSION_SLOTS)
+
+
+class ThreadedSession:
+    """The subset of AsyncSession the async endpoints use, backed by a sync
+    Session whose calls run in the threadpool (DB_ASYNC=0).
+
+    A session takes a slot before its first statement and keeps it until
+    closed, so threadpool threads never block on pool checkout while the
+    sessions holding connections wait for a thread.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+        self._slot = False
+
+    async def _call(self, fn, *args, **kwargs):
+        if not self._slot:
+            await _threaded_slots.acquire()
+            self._slot = True
+        return await run_in_threadpool(fn, *args, **kwargs)
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await self._call(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await self._call(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def get(self, entity, ident):
+        return await self._call(self.sync_session.get, entity, ident)
+
+    async def flush(self) -> None:
+        await self._call(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await self._call(self.sync_session.commit)
+
+    async def refresh(self, instance) -> None:
+        await self._call(self.sync_session.refresh, instance)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await self._call(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self) -> None:
+        try:
+            await run_in_threadpool(self.sync_session.close)
+        finally:
+            if self._slot:
+                self._slot = False
+                _threaded_slots.release()
+
+
+async_engine = None
+if DB_ASYNC:
+    _async_url = ASYNC_DATABASE_URL or async_url(DATABASE_URL)
+    async_engine = create_async_engine(_async_url, **pool_options(_async_url, MonitoredAsyncQueuePool))
+    if DB_POOL_PRE_PING == "idle":
+        install_idle_ping(async_engine, DB_POOL_PING_IDLE_SECONDS)
+    tune_sqlite(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if DB_ASYNC else None
+
+
+def pool_stats() -> dict:
+    """Checkout telemetry and gauges for each engine's pool."""
+    engines = {"sync": engine, "async": async_engine.sync_engine if async_engine is not None else None}
+    stats = {name: e.pool.stats() for name, e in engines.items() if e is not None and hasattr(e.pool, "stats")}
+    if write_queue is not None:
+        stats["sqlite_writer"] = write_queue.stats()
+    return stats
+
+
+async def get_async_db():
+    db = AsyncSessionLocal() if DB_ASYNC else ThreadedSession(SessionLocal(expire_on_commit=False))
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def run_write(db, handler, item):
+    """Write `item` with `handler` and commit; returns the item's result.
+
+    `handler(session, items)` writes a list of items without committing and
+    returns one result per item (an Exception instance for an item that
+    failed). In SQLite mode the item is queued for the writer thread, which
+    hands the handler every queued item of its kind and commits them
+    together; otherwise it runs alone on `db`, which commits.
+    """
+    if write_queue is not None:
+        return await asyncio.wrap_future(write_queue.submit(handler, item))
+    result = (await db.run_sync(handler, [item]))[0]
+    if isinstance(result, Exception):
+        raise result
+    await db.commit()
+    return result
+
+
 def ensure_database_exists():
     """Ensure the target database exists.
 
@@ -39,4 +217,26 @@ def ensure_database_exists():
             conn.commit()
     except Exception:
         # Ignore if not supported or insufficient permissions; startup will fail later if unusable
-        pass
\ No newline at end of file
+        pass
+
+
+def add_missing_columns(table) -> list[str]:
+    """Add columns declared on `table` that an existing database lacks.
+
+    create_all only creates missing tables; this covers columns added to
+    existing models later. New columns need a server default or must be
+    nullable.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table.name):
+        return []
+    existing = {c["name"] for c in inspector.get_columns(table.name)}
+    added = []
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=engine.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+            added.append(column.name)
+    return added
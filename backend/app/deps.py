@@ -1,15 +1,19 @@
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .database import get_db
+from .database import get_async_db
 from .models import User
 from .auth import decode_token
+from .principals import Principal, principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> Principal:
     payload = decode_token(token)
     if payload is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
@@ -18,13 +22,19 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     if email is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
 
-    user = db.query(User).filter(User.email == email).first()
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return user
+    principal = Principal.from_user(user)
+    principal_cache.put(token, user.id, principal, expires_in=payload["exp"] - time.time() if "exp" in payload else None)
+    return principal
 
 
-def require_admin(user: User = Depends(get_current_user)) -> User:
+async def require_admin(user: Principal = Depends(get_current_user)) -> Principal:
     if user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
-    return user
\ No newline at end of file
+    return user
@@ -0,0 +1,235 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from .config import EXPORT_BATCH_SIZE
+from .models import Approval, Company, Expense, User
+
+# (media type, file extension) per export format
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Column name and kind; kinds drive CSV rendering and the parquet schema
+EXPENSE_EXPORT_COLUMNS: List[Tuple[str, str]] = [
+    ("id", "int"),
+    ("employee_id", "int"),
+    ("employee_name", "str"),
+    ("category", "str"),
+    ("description", "str"),
+    ("date", "timestamp"),
+    ("amount", "float"),
+    ("currency", "str"),
+    ("normalized_amount", "float"),
+    ("company_currency", "str"),
+    ("status", "str"),
+    ("created_at", "timestamp"),
+    ("approval_trail", "json"),
+]
+
+_FLUSH_BYTES = 64 * 1024
+
+
+def _text(value: Any, kind: str) -> Any:
+    if value is None:
+        return ""
+    if kind == "json":
+        return json.dumps(value, default=str)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], columns: List[Tuple[str, str]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([name for name, _ in columns])
+    for row in rows:
+        writer.writerow([_text(row.get(name), kind) for name, kind in columns])
+        if buf.tell() >= _FLUSH_BYTES:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode()
+
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]], columns: List[Tuple[str, str]]) -> Iterator[bytes]:
+    buf = []
+    size = 0
+    for row in rows:
+        line = json.dumps({name: row.get(name) for name, _ in columns}, default=str) + "\n"
+        buf.append(line)
+        size += len(line)
+        if size >= _FLUSH_BYTES:
+            yield "".join(buf).encode()
+            buf, size = [], 0
+    yield "".join(buf).encode()
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _parquet_schema(pa, columns: List[Tuple[str, str]]):
+    types = {
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "str": pa.string(),
+        "json": pa.string(),
+        "date": pa.date32(),
+        "timestamp": pa.timestamp("us"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def iter_parquet(rows: Iterable[Dict[str, Any]], columns: List[Tuple[str, str]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(pa, columns)
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+
+    def flush(batch):
+        data = {
+            name: [json.dumps(r.get(name), default=str) if kind == "json" and r.get(name) is not None else r.get(name) for r in batch]
+            for name, kind in columns
+        }
+        writer.write_table(pa.Table.from_pydict(data, schema=schema))
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            flush(batch)
+            batch = []
+            yield sink.take()
+    if batch:
+        flush(batch)
+    writer.close()
+    yield sink.take()
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(
+    rows: Iterable[Dict[str, Any]],
+    columns: List[Tuple[str, str]],
+    fmt: str,
+    gzip: bool,
+    filename: str,
+) -> StreamingResponse:
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported format: {fmt}")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Parquet export requires pyarrow")
+    media_type, ext = EXPORT_FORMATS[fmt]
+    body = {"csv": iter_csv, "ndjson": iter_ndjson, "parquet": iter_parquet}[fmt](rows, columns)
+    filename = f"{filename}.{ext}"
+    if gzip:
+        body = gzip_stream(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+def iter_expense_rows(company_id: int, filters=None, employee_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Company expenses with approval trails, read in `EXPORT_BATCH_SIZE` batches.
+
+    Uses its own sessions because the response body outlives the request's
+    `get_db` session. The expense scan holds a server-side cursor, so the
+    approval lookups go through a second session/connection. The identity
+    map only holds weak references, so finished batches are collected.
+    """
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    lookup = SessionLocal()
+    try:
+        company = db.get(Company, company_id)
+        company_currency = company.currency if company else None
+        stmt = (
+            select(Expense, User.name)
+            .join(User, User.id == Expense.employee_id)
+            .where(Expense.company_id == company_id)
+        )
+        if employee_id is not None:
+            stmt = stmt.where(Expense.employee_id == employee_id)
+        if filters is not None:
+            stmt = filters.apply(stmt)
+        stmt = stmt.order_by(Expense.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        for partition in db.execute(stmt).partitions():
+            ids = [expense.id for expense, _ in partition]
+            trails: Dict[int, list] = {i: [] for i in ids}
+            approvals = lookup.execute(
+                select(Approval, User.name)
+                .join(User, User.id == Approval.approver_id)
+                .where(Approval.expense_id.in_(ids))
+                .order_by(Approval.expense_id, Approval.step_order)
+            )
+            for approval, approver_name in approvals:
+                trails[approval.expense_id].append({
+                    "step": approval.step_order,
+                    "approver": approver_name,
+                    "status": approval.status,
+                    "comment": approval.comment,
+                    "decided_at": approval.decided_at.isoformat() if approval.decided_at else None,
+                })
+            for expense, employee_name in partition:
+                yield {
+                    "id": expense.id,
+                    "employee_id": expense.employee_id,
+                    "employee_name": employee_name,
+                    "category": expense.category,
+                    "description": expense.description,
+                    "date": expense.date,
+                    "amount": expense.amount,
+                    "currency": expense.currency,
+                    "normalized_amount": expense.normalized_amount,
+                    "company_currency": company_currency,
+                    "status": expense.status,
+                    "created_at": expense.created_at,
+                    "approval_trail": trails[expense.id],
+                }
+    finally:
+        lookup.close()
+        db.close()
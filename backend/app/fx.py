@@ -0,0 +1,334 @@
+import csv
+import json
+import sys
+import threading
+import time
+from datetime import date, datetime
+from typing import Callable, Dict, Optional
+
+import requests
+
+from .config import FX_CACHE_TTL_SECONDS, FX_CACHE_STALE_SECONDS, FX_PIVOT_CURRENCY
+
+
+def _fetch_latest(base: str) -> Dict:
+    resp = requests.get(f"https://api.exchangerate-api.com/v4/latest/{base}", timeout=10)
+    resp.raise_for_status()
+    return resp.json()
+
+
+class _Entry:
+    __slots__ = ("payload", "fetched_at")
+
+    def __init__(self, payload: Dict, fetched_at: float):
+        self.payload = payload
+        self.fetched_at = fetched_at
+
+
+class RateCache:
+    """Shared rate-table cache keyed by base currency.
+
+    Fresh entries are served directly. Entries past the TTL but inside the
+    stale window are served immediately while one background refresh runs.
+    Concurrent misses for the same base wait on a single upstream fetch.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, fetcher: Callable[[str], Dict] = _fetch_latest):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.fetcher = fetcher
+        self._entries: Dict[str, _Entry] = {}
+        self._inflight: Dict[str, threading.Event] = {}
+        self._errors: Dict[str, BaseException] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def get(self, base: str) -> Dict:
+        base = base.upper()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(base)
+            if entry is not None:
+                age = now - entry.fetched_at
+                if age < self.ttl:
+                    self.hits += 1
+                    return entry.payload
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self._start_refresh(base, background=True)
+                    return entry.payload
+            self.misses += 1
+            event, leader = self._start_refresh(base, background=False)
+
+        if leader:
+            self._refresh(base, event)
+        else:
+            event.wait()
+
+        with self._lock:
+            entry = self._entries.get(base)
+            error = self._errors.get(base)
+        if entry is not None and time.monotonic() - entry.fetched_at < self.ttl + self.stale_ttl:
+            return entry.payload
+        raise error or RuntimeError(f"No exchange rates for {base}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "errors": self.errors,
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl,
+                "stale_seconds": self.stale_ttl,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._errors.clear()
+
+    # Must be called with self._lock held. Returns (event, is_leader).
+    def _start_refresh(self, base: str, background: bool):
+        event = self._inflight.get(base)
+        if event is not None:
+            return event, False
+        event = threading.Event()
+        self._inflight[base] = event
+        if background:
+            threading.Thread(target=self._refresh, args=(base, event), daemon=True).start()
+            return event, False
+        return event, True
+
+    def _refresh(self, base: str, event: threading.Event) -> None:
+        try:
+            payload = self.fetcher(base)
+        except Exception as exc:
+            with self._lock:
+                self.errors += 1
+                self._errors[base] = exc
+        else:
+            with self._lock:
+                self.refreshes += 1
+                self._entries[base] = _Entry(payload, time.monotonic())
+                self._errors.pop(base, None)
+        finally:
+            with self._lock:
+                self._inflight.pop(base, None)
+            event.set()
+
+
+# ---- Snapshot store -------------------------------------------------------
+
+def rebase(rates: Dict[str, float], base: str, pivot: str = FX_PIVOT_CURRENCY) -> Dict[str, float]:
+    """Re-express a rate table quoted in `base` against `pivot`."""
+    rates = {k.upper(): float(v) for k, v in rates.items()}
+    rates[base.upper()] = 1.0
+    if base.upper() == pivot:
+        return rates
+    if pivot not in rates:
+        raise KeyError(pivot)
+    factor = rates[pivot]
+    return {k: v / factor for k, v in rates.items()}
+
+
+def cross_rate(rates: Dict[str, float], base: str, target: str) -> float:
+    base, target = base.upper(), target.upper()
+    if base == target:
+        return 1.0
+    return rates[target] / rates[base]
+
+
+def save_snapshot(db, day: date, rates: Dict[str, float], pivot: str = FX_PIVOT_CURRENCY) -> None:
+    from .models import FxRate
+
+    db.query(FxRate).filter(FxRate.pivot == pivot, FxRate.rate_date == day).delete()
+    db.add_all(FxRate(pivot=pivot, rate_date=day, currency=code, rate=rate) for code, rate in rates.items())
+    db.commit()
+
+
+def load_snapshot(db, day: Optional[date] = None, pivot: str = FX_PIVOT_CURRENCY):
+    """Return (rate_date, rates) for the latest snapshot on or before `day`."""
+    from .models import FxRate
+
+    latest = db.query(FxRate.rate_date).filter(FxRate.pivot == pivot)
+    if day is not None:
+        latest = latest.filter(FxRate.rate_date <= day)
+    row = latest.order_by(FxRate.rate_date.desc()).first()
+    if row is None:
+        return None, None
+    rows = db.query(FxRate.currency, FxRate.rate).filter(FxRate.pivot == pivot, FxRate.rate_date == row[0]).all()
+    return row[0], {code: rate for code, rate in rows}
+
+
+class SnapshotStore:
+    """Daily pivot snapshots in the app database's fx_rates table.
+
+    The database is only touched on first use, so importing this module
+    (as mysql_auth does, with its own store) creates no engine.
+    """
+
+    def ensure(self) -> None:
+        from .database import engine
+        from .models import FxRate
+
+        FxRate.__table__.create(bind=engine, checkfirst=True)
+
+    def load(self, day: Optional[date], pivot: str):
+        from .database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return load_snapshot(db, day, pivot)
+        finally:
+            db.close()
+
+    def save(self, day: date, rates: Dict[str, float], pivot: str) -> None:
+        from .database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            save_snapshot(db, day, rates, pivot)
+        finally:
+            db.close()
+
+
+class FxRates:
+    """Pivot snapshots from `store`: today's through a RateCache that asks
+    upstream at most once a day, past days memoised as they never change.
+
+    `store` provides ensure(), load(day, pivot) -> (rate_date, rates) and
+    save(day, rates, pivot).
+    """
+
+    def __init__(self, store, pivot: str = FX_PIVOT_CURRENCY, ttl: float = FX_CACHE_TTL_SECONDS,
+                 stale_ttl: float = FX_CACHE_STALE_SECONDS):
+        self.store = store
+        self.pivot = pivot
+        self.rate_cache = RateCache(ttl=ttl, stale_ttl=stale_ttl, fetcher=self._fetch_pivot)
+        self._snapshots: Dict[date, Dict] = {}
+        self._snapshot_lock = threading.Lock()
+
+    def ensure_store(self) -> None:
+        self.store.ensure()
+
+    def save(self, day: date, rates: Dict[str, float], pivot: Optional[str] = None) -> None:
+        self.store.save(day, rates, pivot or self.pivot)
+        with self._snapshot_lock:
+            self._snapshots.clear()
+
+    def _fetch_pivot(self, pivot: str) -> Dict:
+        today = datetime.utcnow().date()
+        day, rates = self.store.load(today, pivot)
+        if day == today:
+            return {"base": pivot, "date": day.isoformat(), "rates": rates}
+        try:
+            payload = _fetch_latest(pivot)
+        except Exception:
+            # Offline: keep serving the most recent stored snapshot
+            if rates is None:
+                raise
+            return {"base": pivot, "date": day.isoformat(), "rates": rates}
+        rates = rebase(payload.get("rates", {}), payload.get("base", pivot), pivot)
+        self.save(today, rates, pivot)
+        return {"base": pivot, "date": today.isoformat(), "rates": rates}
+
+    def get_snapshot(self, on: Optional[date] = None) -> Dict:
+        """Pivot snapshot for `on` (defaults to today), derived from the store."""
+        if on is None or on >= datetime.utcnow().date():
+            return self.rate_cache.get(self.pivot)
+        with self._snapshot_lock:
+            cached = self._snapshots.get(on)
+        if cached is not None:
+            return cached
+        day, rates = self.store.load(on, self.pivot)
+        if rates is None:
+            # Nothing stored that far back; use the current snapshot instead
+            return self.rate_cache.get(self.pivot)
+        snapshot = {"base": self.pivot, "date": day.isoformat(), "rates": rates}
+        with self._snapshot_lock:
+            self._snapshots[on] = snapshot
+        return snapshot
+
+    def get_rate(self, base: str, target: str, on: Optional[date] = None) -> float:
+        if base.upper() == target.upper():
+            return 1.0
+        return cross_rate(self.get_snapshot(on)["rates"], base, target)
+
+    def get_rates(self, base: str, on: Optional[date] = None) -> Dict:
+        snapshot = self.get_snapshot(on)
+        pivot_rates = snapshot["rates"]
+        base = base.upper()
+        if base not in pivot_rates:
+            raise KeyError(base)
+        return {
+            "base": base,
+            "date": snapshot["date"],
+            "rates": {code: cross_rate(pivot_rates, base, code) for code in pivot_rates},
+        }
+
+    def load_rates_file(self, path: str) -> int:
+        """Load a JSON/CSV rate file into the store. Returns the number of days stored."""
+        snapshots = read_rates_file(path)
+        for day, rates in snapshots.items():
+            self.save(day, rates)
+        self.rate_cache.clear()
+        return len(snapshots)
+
+
+# The app's rates, kept in its own database
+app_rates = FxRates(SnapshotStore())
+rate_cache = app_rates.rate_cache
+ensure_store = app_rates.ensure_store
+get_snapshot = app_rates.get_snapshot
+get_rate = app_rates.get_rate
+get_rates = app_rates.get_rates
+load_rates_file = app_rates.load_rates_file
+
+
+# ---- File loader -----------------------------------------------------------
+
+def _parse_date(value) -> date:
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)[:10]).date()
+
+
+def read_rates_file(path: str) -> Dict[date, Dict[str, float]]:
+    """Parse a JSON or CSV rate file into {day: pivot rates}.
+
+    JSON: one exchangerate-api style object (`base`, `date`, `rates`) or a list
+    of them. CSV: `date,currency,rate` columns with an optional `base` column
+    (defaults to the pivot currency).
+    """
+    snapshots: Dict[date, Dict[str, float]] = {}
+    if path.lower().endswith(".csv"):
+        grouped: Dict[tuple, Dict[str, float]] = {}
+        with open(path, newline="") as fh:
+            for row in csv.DictReader(fh):
+                key = (_parse_date(row["date"]), (row.get("base") or FX_PIVOT_CURRENCY).upper())
+                grouped.setdefault(key, {})[row["currency"].upper()] = float(row["rate"])
+        for (day, base), rates in grouped.items():
+            snapshots.setdefault(day, {}).update(rebase(rates, base))
+        return snapshots
+
+    with open(path) as fh:
+        data = json.load(fh)
+    for item in data if isinstance(data, list) else [data]:
+        day = _parse_date(item.get("date") or datetime.utcnow().date())
+        base = (item.get("base") or FX_PIVOT_CURRENCY).upper()
+        snapshots.setdefault(day, {}).update(rebase(item.get("rates", {}), base))
+    return snapshots
+
+
+if __name__ == "__main__":
+    # python -m app.fx rates.json [more.csv ...]
+    ensure_store()
+    for p in sys.argv[1:]:
+        print(f"{p}: {load_rates_file(p)} day(s) loaded")
@@ -1,8 +1,15 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import inspect
 
-from .config import BACKEND_CORS_ORIGINS
-from .database import Base, engine, ensure_database_exists
+from .config import BACKEND_CORS_ORIGINS, DB_POOL_WARM, FX_RATES_FILE
+from .analytics import rebuild as rebuild_rollups
+from .database import SessionLocal, add_missing_columns, async_engine, engine, ensure_database_exists, write_queue
+from .fx import load_rates_file
+from .migrations import upgrade as run_migrations
+from .pool import warm, warm_async
+from .models import Base, Expense
+from .reconcile import reconcile_expenses
 from .routers import auth as auth_router
 from .routers import admin as admin_router
 from .routers import expenses as expenses_router
@@ -21,7 +28,40 @@ app.add_middleware(
 @app.on_event("startup")
 def on_startup():
     ensure_database_exists()
+    had_rollups = inspect(engine).has_table("expense_rollups")
     Base.metadata.create_all(bind=engine)
+    if add_missing_columns(Expense.__table__):
+        # Backfill approval counters on databases that predate them
+        db = SessionLocal()
+        try:
+            reconcile_expenses(db, fix=True)
+        finally:
+            db.close()
+    run_migrations(engine)
+    if not had_rollups:
+        # Seed analytics rollups from existing expenses
+        db = SessionLocal()
+        try:
+            rebuild_rollups(db)
+        finally:
+            db.close()
+    if FX_RATES_FILE:
+        load_rates_file(FX_RATES_FILE)
+    # Open pooled connections now rather than on the first requests
+    warm(engine, DB_POOL_WARM)
+
+
+@app.on_event("startup")
+async def warm_async_pool():
+    if async_engine is not None:
+        await warm_async(async_engine, DB_POOL_WARM)
+
+
+@app.on_event("shutdown")
+def drain_write_queue():
+    # Commit whatever the SQLite writer still has queued
+    if write_queue is not None:
+        write_queue.close()
 
 
 app.include_router(auth_router.router)
@@ -31,5 +71,5 @@ app.include_router(utils_router.router)
 app.include_router(company_router.router)
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
\ No newline at end of file
@@ -0,0 +1,89 @@
+import argparse
+import json
+from datetime import datetime
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, insert, select, text
+
+# create_all builds missing tables from the models, indexes included, and
+# add_missing_columns adds new columns to existing tables. Migrations cover
+# the rest for databases that predate a change, such as an index added to
+# a table that already exists. Each step checks what exists first, so a
+# database fresh from create_all just records the versions.
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def create_index(conn, table: str, name: str, columns: Sequence[str], unique: bool = False) -> bool:
+    if name in {index["name"] for index in inspect(conn).get_indexes(table)}:
+        return False
+    conn.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})"))
+    return True
+
+
+def _pagination_and_inbox_indexes(conn) -> None:
+    create_index(conn, "expenses", "ix_expenses_employee_created_id", ["employee_id", "created_at", "id"])
+    create_index(conn, "expenses", "ix_expenses_company_created_id", ["company_id", "created_at", "id"])
+    create_index(conn, "approvals", "ix_approvals_approver_status_step", ["approver_id", "status", "step_order"])
+
+
+def _hot_query_indexes(conn) -> None:
+    # Decisions look up the caller's pending step on an expense
+    create_index(conn, "approvals", "ix_approvals_expense_approver_status", ["expense_id", "approver_id", "status"])
+    # Approval chains read a company's assignments in step order
+    create_index(conn, "approver_assignments", "ix_approver_assignments_company_step", ["company_id", "step_order"])
+    # Admin listings filter a company's expenses by status and date
+    create_index(conn, "expenses", "ix_expenses_company_status_date", ["company_id", "status", "date"])
+
+
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "keyset pagination and approver inbox indexes", _pagination_and_inbox_indexes),
+    (2, "composite indexes for decisions, approval chains and filtered listings", _hot_query_indexes),
+]
+
+
+def upgrade(engine) -> List[int]:
+    """Apply pending migrations in order, each in its own transaction."""
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        done = set(conn.scalars(select(schema_migrations.c.version)))
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(insert(schema_migrations).values(version=version, description=description, applied_at=datetime.utcnow()))
+        applied.append(version)
+    return applied
+
+
+def status(engine) -> List[Dict]:
+    applied = {}
+    if inspect(engine).has_table(schema_migrations.name):
+        with engine.connect() as conn:
+            applied = {row.version: row.applied_at for row in conn.execute(select(schema_migrations))}
+    return [
+        {"version": version, "description": description, "applied_at": applied.get(version)}
+        for version, description, _ in MIGRATIONS
+    ]
+
+
+if __name__ == "__main__":
+    # python -m app.migrations [status|upgrade]
+    from .database import engine
+    from .models import Base
+
+    parser = argparse.ArgumentParser(description="Apply or list versioned schema migrations")
+    parser.add_argument("command", choices=["status", "upgrade"], nargs="?", default="status")
+    args = parser.parse_args()
+    if args.command == "upgrade":
+        Base.metadata.create_all(bind=engine)
+        print(json.dumps({"applied": upgrade(engine)}))
+    else:
+        print(json.dumps(status(engine), default=str, indent=2))
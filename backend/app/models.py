@@ -1,7 +1,12 @@
-from sqlalchemy import String, Integer, DateTime, ForeignKey, Boolean, Float, Text
-from sqlalchemy.orm import Mapped, mapped_column
-from datetime import datetime
-from .database import Base
+from sqlalchemy import String, Integer, Date, DateTime, ForeignKey, Boolean, Float, Text, UniqueConstraint, Index, false
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from datetime import date, datetime
+
+
+# Declared here rather than in .database so the models (and the code that
+# only needs them) can be imported without creating the engine
+class Base(DeclarativeBase):
+    pass
 
 
 class User(Base):
@@ -32,6 +37,13 @@ class Company(Base):
 
 class Expense(Base):
     __tablename__ = "expenses"
+    __table_args__ = (
+        # Keyset pagination: (scope, created_at, id) descending
+        Index("ix_expenses_employee_created_id", "employee_id", "created_at", "id"),
+        Index("ix_expenses_company_created_id", "company_id", "created_at", "id"),
+        # Admin listings filtered by status and date range
+        Index("ix_expenses_company_status_date", "company_id", "status", "date"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     employee_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), index=True)
@@ -44,10 +56,21 @@ class Expense(Base):
     date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     status: Mapped[str] = mapped_column(String(20), default="pending")  # pending, approved, rejected
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Approval progress, updated with each decision (checked by app.reconcile)
+    approved_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    total_steps: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    current_step: Mapped[int | None] = mapped_column(Integer, nullable=True)  # step awaiting a decision
+    specific_approver_approved: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
 
 
 class Approval(Base):
     __tablename__ = "approvals"
+    __table_args__ = (
+        # Approver inbox: pending steps per approver
+        Index("ix_approvals_approver_status_step", "approver_id", "status", "step_order"),
+        # Decisions: the caller's pending step on one expense
+        Index("ix_approvals_expense_approver_status", "expense_id", "approver_id", "status"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     expense_id: Mapped[int] = mapped_column(Integer, ForeignKey("expenses.id"), index=True)
@@ -61,6 +84,10 @@ class Approval(Base):
 
 class ApproverAssignment(Base):
     __tablename__ = "approver_assignments"
+    __table_args__ = (
+        # Approval chains: a company's approvers in step order
+        Index("ix_approver_assignments_company_step", "company_id", "step_order"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     company_id: Mapped[int] = mapped_column(Integer, ForeignKey("companies.id"), index=True)
@@ -75,4 +102,46 @@ class ApprovalRule(Base):
     company_id: Mapped[int] = mapped_column(Integer, ForeignKey("companies.id"), unique=True)
     percentage_threshold: Mapped[int | None] = mapped_column(Integer, nullable=True)  # e.g., 60 means 60%
     specific_approver_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("users.id"), nullable=True)
-    hybrid: Mapped[bool] = mapped_column(Boolean, default=False)
\ No newline at end of file
+    hybrid: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+class ExpenseRollup(Base):
+    """Expense count and normalized total per company, month, status and
+    category or employee; maintained alongside expense writes (app.analytics)."""
+
+    __tablename__ = "expense_rollups"
+    __table_args__ = (
+        UniqueConstraint("company_id", "dimension", "month", "status", "key", name="uq_expense_rollups_bucket"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    company_id: Mapped[int] = mapped_column(Integer, ForeignKey("companies.id"))
+    dimension: Mapped[str] = mapped_column(String(16))  # category, employee
+    month: Mapped[str] = mapped_column(String(7))  # YYYY-MM of the expense date
+    status: Mapped[str] = mapped_column(String(20))
+    key: Mapped[str] = mapped_column(String(100))  # category name or employee id
+    expense_count: Mapped[int] = mapped_column(Integer, default=0)
+    total: Mapped[float] = mapped_column(Float, default=0.0)
+
+
+class ApprovalPolicyVersion(Base):
+    """Bumped whenever a company's approver assignments or rule change, so
+    every process can tell its cached approval policy is stale."""
+
+    __tablename__ = "approval_policy_versions"
+
+    company_id: Mapped[int] = mapped_column(Integer, ForeignKey("companies.id"), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class FxRate(Base):
+    """One row per currency of a daily snapshot quoted against the pivot currency."""
+
+    __tablename__ = "fx_rates"
+    __table_args__ = (UniqueConstraint("pivot", "rate_date", "currency", name="uq_fx_rates_pivot_date_currency"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    pivot: Mapped[str] = mapped_column(String(10))
+    rate_date: Mapped[date] = mapped_column(Date)
+    currency: Mapped[str] = mapped_column(String(10))
+    rate: Mapped[float] = mapped_column(Float)
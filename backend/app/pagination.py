@@ -0,0 +1,119 @@
+import base64
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, Query, status
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query as OrmQuery
+
+from .models import Expense
+
+# Columns a caller may project with ?fields=a,b,c
+EXPENSE_FIELDS = (
+    "id",
+    "employee_id",
+    "company_id",
+    "amount",
+    "currency",
+    "normalized_amount",
+    "category",
+    "description",
+    "date",
+    "status",
+    "created_at",
+)
+
+
+def encode_cursor(value, id_: int) -> str:
+    """Opaque cursor for a (sort value, id) keyset position."""
+    text = value.isoformat() if isinstance(value, datetime) else repr(value)
+    raw = f"{text}|{id_}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, parse=datetime.fromisoformat):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        value, id_ = raw.rsplit("|", 1)
+        return parse(value), int(id_)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(EXPENSE_FIELDS)
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in EXPENSE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+class ExpenseFilters:
+    """Common expense list filters, used as a FastAPI dependency.
+
+    min_amount/max_amount are in the company currency (normalized_amount),
+    so one range covers expenses submitted in any currency.
+    """
+
+    def __init__(
+        self,
+        status: Optional[str] = None,
+        category: Optional[str] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+    ):
+        self.status = status
+        self.category = category
+        self.date_from = date_from
+        self.date_to = date_to
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+
+    def apply(self, query: OrmQuery) -> OrmQuery:
+        if self.status:
+            query = query.filter(Expense.status == self.status)
+        if self.category:
+            query = query.filter(Expense.category == self.category)
+        if self.date_from:
+            query = query.filter(Expense.date >= datetime.combine(self.date_from, datetime.min.time()))
+        if self.date_to:
+            # Inclusive of the whole end day
+            query = query.filter(Expense.date < datetime.combine(self.date_to + timedelta(days=1), datetime.min.time()))
+        if self.min_amount is not None:
+            query = query.filter(Expense.normalized_amount >= self.min_amount)
+        if self.max_amount is not None:
+            query = query.filter(Expense.normalized_amount <= self.max_amount)
+        return query
+
+
+def page_limit(limit: int = Query(50, ge=1, le=500)) -> int:
+    return limit
+
+
+def paginate_expenses(query: OrmQuery, limit: int, cursor: Optional[str], fields: List[str]) -> Dict[str, Any]:
+    """Keyset page over (created_at, id) descending.
+
+    `query` must already select from Expense with its scope and filters
+    applied. One extra row is fetched to tell whether another page exists.
+    """
+    columns = [getattr(Expense, f) for f in fields]
+    # created_at/id are always read so the next cursor can be built
+    query = query.with_entities(*columns, Expense.created_at.label("_created_at"), Expense.id.label("_id"))
+    if cursor:
+        created_at, id_ = decode_cursor(cursor)
+        query = query.filter(
+            or_(Expense.created_at < created_at, and_(Expense.created_at == created_at, Expense.id < id_))
+        )
+    rows = query.order_by(Expense.created_at.desc(), Expense.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]._created_at, rows[-1]._id)
+    return {
+        "items": [{f: getattr(row, f) for f in fields} for row in rows],
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,150 @@
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Pre-ping strategies: ping on every checkout, only connections idle longer
+# than the idle threshold, or never (rely on pool_recycle)
+PRE_PING_STRATEGIES = ("always", "idle", "never")
+
+
+class PoolMetrics:
+    """Checkout counters shared by the SQLAlchemy pools and the mysql_auth pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waited = 0  # checkouts that found no idle connection and no spare capacity
+        self.exhausted = 0  # checkouts that timed out
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.ping_failures = 0
+
+    def record(self, seconds: float, waited: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.waited += waited
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def record_exhausted(self) -> None:
+        with self._lock:
+            self.exhausted += 1
+
+    def record_ping_failure(self) -> None:
+        with self._lock:
+            self.ping_failures += 1
+
+    def stats(self, **gauges) -> Dict:
+        with self._lock:
+            return {
+                **gauges,
+                "checkouts": self.checkouts,
+                "waited": self.waited,
+                "exhausted": self.exhausted,
+                "wait_ms_avg": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_max * 1000, 3),
+                "ping_failures": self.ping_failures,
+            }
+
+
+class _MonitoredPool:
+    """QueuePool mixin timing every checkout, including waits for a free slot."""
+
+    metrics: PoolMetrics
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+        saturated = self.checkedin() == 0 and -1 < self._max_overflow <= self._overflow
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record_exhausted()
+            raise
+        self.metrics.record(time.perf_counter() - started, saturated)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep the counters
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def stats(self) -> Dict:
+        return self.metrics.stats(
+            size=self.size(),
+            in_use=self.checkedout(),
+            idle=self.checkedin(),
+            overflow=max(self.overflow(), 0),
+            max_overflow=self._max_overflow,
+        )
+
+
+class MonitoredQueuePool(_MonitoredPool, QueuePool):
+    pass
+
+
+class MonitoredAsyncQueuePool(_MonitoredPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def install_idle_ping(engine, idle_seconds: float) -> None:
+    """Ping connections on checkout only when they sat idle for `idle_seconds`.
+
+    A failed ping raises DisconnectionError, which makes the pool discard the
+    connection and retry the checkout with a fresh one.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "checkin")
+    def _checked_in(dbapi_connection, record):
+        record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(sync_engine, "checkout")
+    def _checked_out(dbapi_connection, record, proxy):
+        checked_in_at = record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < idle_seconds:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        except Exception:
+            pool = sync_engine.pool
+            if isinstance(pool, _MonitoredPool):
+                pool.metrics.record_ping_failure()
+            raise exc.DisconnectionError()
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+
+def warm(engine, count: int) -> int:
+    """Open up to `count` pooled connections at once so the first requests skip connect."""
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(engine.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+async def warm_async(engine, count: int) -> int:
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(await engine.connect())
+    finally:
+        for connection in connections:
+            await connection.close()
+    return len(connections)
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+
+from .config import PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Read-only snapshot of the authenticated user.
+
+    Handlers that need to modify the user must load the row with
+    `db.get(User, principal.id)`.
+    """
+
+    id: int
+    name: str
+    email: str
+    role: str
+    country: str
+    currency: str
+    company_id: Optional[int] = None
+    manager_id: Optional[int] = None
+    is_manager_approver: bool = False
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            name=user.name,
+            email=user.email,
+            role=user.role,
+            country=user.country,
+            currency=user.currency,
+            company_id=user.company_id,
+            manager_id=user.manager_id,
+            is_manager_approver=bool(user.is_manager_approver),
+        )
+
+
+class PrincipalCache:
+    """Bounded LRU of token -> principal with a per-entry expiry.
+
+    Entries can be evicted per user id so that role, manager and password
+    changes take effect on the next request. Invalidation is per process;
+    other workers pick the change up once the TTL runs out.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, _ = entry
+            if expires_at <= now:
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return value
+
+    def put(self, token: str, user_id: int, value, expires_in: Optional[float] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if expires_in is None else min(self.ttl, expires_in)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (value, time.monotonic() + ttl, user_id)
+            self._by_user.setdefault(user_id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._remove(token)
+
+    def invalidate_token(self, token: str) -> None:
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+            }
+
+    # Must be called with self._lock held
+    def _remove(self, token: str) -> None:
+        _, _, user_id = self._entries.pop(token)
+        tokens = self._by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[user_id]
+
+
+principal_cache = PrincipalCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
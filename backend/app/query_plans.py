@@ -0,0 +1,250 @@
+"""Capture EXPLAIN plans for the queries behind the API endpoints and fail on
+full table scans.
+
+Seeds a throwaway SQLite database (or the empty database in --database-url)
+with a company, approvers and expenses through the API, calls each endpoint
+in-process while recording the SQL it runs, then EXPLAINs every SELECT,
+UPDATE and DELETE. Prints (or writes with --output) the plans as JSON and
+exits 1 when one scans a whole table it is not expected to (see
+EXPECTED_SCANS) and that is not listed with --allow-scan.
+
+Planner statistics are left alone by default, so the plans depend on the
+schema and the queries rather than on how much data was seeded: statistics
+gathered from a small seed make scanning a few pages the cheapest plan.
+Pass --analyze to plan against statistics of the seeded (or your own) data.
+
+    cd backend && python -m app.query_plans [--database-url URL] [--output plans.json]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+PASSWORD = "plan-check-password"
+
+# Endpoints that read a whole table by design: endpoint -> tables
+EXPECTED_SCANS = {
+    # Lists every user of the company; with one company that is the table
+    "GET /admin/users": {"users"},
+    # Names of everyone with spend in range, usually most of the company
+    "GET /admin/analytics": {"users"},
+}
+
+# "SCAN <table>" with or without an index; not "SCAN 5 CONSTANT ROWS" (a VALUES list)
+_SQLITE_SCAN = re.compile(r"^SCAN (?!\d+ CONSTANT ROWS|CONSTANT ROW)(\w+)")
+_POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def _table(name: str) -> str:
+    # SQLAlchemy aliases tables as <table>_<n>
+    return re.sub(r"_\d+$", "", name)
+
+
+def explain(conn, statement: str, parameters) -> Dict:
+    """Plan lines and fully scanned tables for one captured statement."""
+    dialect = conn.dialect.name
+    if isinstance(parameters, list):
+        # executemany: the first parameter set stands for all of them
+        parameters = parameters[0] if parameters else ()
+    if dialect == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        plan = [row[3] for row in rows]
+        scans = [_table(m.group(1)) for m in map(_SQLITE_SCAN.match, plan) if m]
+    elif dialect == "mysql":
+        rows = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings().all()
+        plan = [
+            f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} {row.get('Extra') or ''}".strip()
+            for row in rows
+        ]
+        scans = [_table(row["table"]) for row in rows if row["type"] in ("ALL", "index") and row["table"]]
+    elif dialect == "postgresql":
+        plan = [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()]
+        scans = [m.group(1) for line in plan for m in [_POSTGRES_SCAN.search(line)] if m]
+    else:
+        raise SystemExit(f"EXPLAIN is not supported for {dialect}")
+    return {"plan": plan, "full_scans": sorted(set(scans))}
+
+
+class Recorder:
+    """Collects the statements each endpoint call runs, on every engine."""
+
+    def __init__(self):
+        self.endpoint: Optional[str] = None
+        self.statements: Dict[str, Dict] = {}
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.endpoint is None:
+            return
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        if verb not in ("SELECT", "UPDATE", "DELETE"):
+            return
+        self.statements.setdefault(f"{self.endpoint}\n{statement}", {
+            "endpoint": self.endpoint,
+            "sql": statement,
+            "parameters": list(parameters) if executemany else parameters,
+        })
+
+
+def seed(client, employees: int, expenses: int) -> Dict:
+    """Company, manager, employees and expenses, created through the API."""
+
+    def ok(response):
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    def login(email):
+        token = ok(client.post("/auth/login", json={"email": email, "password": PASSWORD}))["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    ok(client.post("/auth/signup", json={"name": "Admin", "email": "admin@plans.io", "password": PASSWORD, "currency": "USD"}))
+    admin = login("admin@plans.io")
+    ok(client.post("/company/create", json={"name": "Plans Co", "country": "US", "currency": "USD"}, headers=admin))
+    # One manager per ten employees, so no approver owns most of the approvals
+    managers = [
+        ok(client.post("/admin/users", headers=admin, json={
+            "name": f"Manager {i}", "email": f"manager{i}@plans.io", "password": PASSWORD, "role": "manager",
+        }))
+        for i in range(max(employees // 10, 1))
+    ]
+    staff = [
+        ok(client.post("/admin/users", headers=admin, json={
+            "name": f"Employee {i}", "email": f"employee{i}@plans.io", "password": PASSWORD, "role": "employee",
+            "manager_id": managers[i % len(managers)]["id"], "is_manager_approver": True,
+        }))
+        for i in range(employees)
+    ]
+    admin_id = ok(client.get("/auth/me", headers=admin))["id"]
+    ok(client.put("/admin/approver-assignments", headers=admin, json={"assignments": [{"approver_id": admin_id, "step_order": 1}]}))
+    lines = "\n".join(
+        json.dumps({
+            "employee_id": staff[i % len(staff)]["id"],
+            "amount": 5 + i % 500,
+            "currency": "USD",
+            "category": ("travel", "meals", "lodging", "supplies")[i % 4],
+            "description": f"seed {i}",
+            "date": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}",
+        })
+        for i in range(expenses)
+    )
+    ok(client.post("/expenses/bulk", headers=admin, files={"file": ("seed.ndjson", lines.encode())}))
+    return {"admin": admin, "manager": login("manager0@plans.io"), "employee": login("employee0@plans.io")}
+
+
+def drive(client, recorder: Recorder, headers: Dict) -> None:
+    from .approvals import policy_cache
+    from .principals import principal_cache
+
+    admin, manager, employee = headers["admin"], headers["manager"], headers["employee"]
+
+    def call(endpoint, method, path, **kwargs):
+        # Cold caches, so the queries behind them run too
+        principal_cache.clear()
+        policy_cache.clear()
+        recorder.endpoint = endpoint
+        try:
+            response = client.request(method, path, **kwargs)
+        finally:
+            recorder.endpoint = None
+        assert response.status_code < 400, f"{endpoint}: {response.status_code} {response.text}"
+        return response.json()
+
+    call("POST /auth/login", "POST", "/auth/login", json={"email": "employee0@plans.io", "password": PASSWORD})
+    call("GET /auth/me", "GET", "/auth/me", headers=employee)
+    call("POST /expenses/", "POST", "/expenses/", headers=employee,
+         json={"amount": 12, "currency": "USD", "category": "meals", "description": "plan check"})
+    page = call("GET /expenses/me", "GET", "/expenses/me", headers=employee, params={"limit": 5})
+    call("GET /expenses/me?cursor", "GET", "/expenses/me", headers=employee, params={"limit": 5, "cursor": page["next_cursor"]})
+    call("GET /expenses/me?status&date", "GET", "/expenses/me", headers=employee,
+         params={"status": "pending", "date_from": "2024-03-01", "date_to": "2024-06-30"})
+    pending = call("GET /expenses/approvals/pending", "GET", "/expenses/approvals/pending", headers=manager)
+    for sort in ("oldest", "amount_desc"):
+        inbox = call(f"GET /expenses/approvals/inbox?sort={sort}", "GET", "/expenses/approvals/inbox", headers=manager,
+                     params={"sort": sort, "limit": 5})
+        call(f"GET /expenses/approvals/inbox?sort={sort}&cursor", "GET", "/expenses/approvals/inbox", headers=manager,
+             params={"sort": sort, "limit": 5, "cursor": inbox["next_cursor"]})
+    call("POST /expenses/approvals/{id}/decide", "POST", f"/expenses/approvals/{pending[0]['expense_id']}/decide",
+         headers=manager, json={"approve": True})
+    call("POST /expenses/approvals/decide-batch", "POST", "/expenses/approvals/decide-batch", headers=manager,
+         json={"decisions": [{"expense_id": a["expense_id"], "approve": True} for a in pending[1:6]]})
+    call("GET /admin/expenses", "GET", "/admin/expenses", headers=admin, params={"limit": 5})
+    call("GET /admin/expenses?status&date", "GET", "/admin/expenses", headers=admin,
+         params={"status": "pending", "date_from": "2024-03-01", "date_to": "2024-03-31"})
+    call("GET /admin/analytics", "GET", "/admin/analytics", headers=admin, params={"from_month": "2024-01", "to_month": "2024-06"})
+    call("GET /admin/users", "GET", "/admin/users", headers=admin)
+    call("GET /admin/approver-assignments", "GET", "/admin/approver-assignments", headers=admin)
+
+
+def analyze(engine) -> None:
+    """Refresh planner statistics so plans reflect the seeded data."""
+    from sqlalchemy import inspect
+
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "mysql":
+            for table in inspect(conn).get_table_names():
+                conn.exec_driver_sql(f"ANALYZE TABLE {table}").all()
+        else:
+            conn.exec_driver_sql("ANALYZE")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="SQLAlchemy URL of an empty database (default: temp SQLite)")
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--expenses", type=int, default=5000)
+    parser.add_argument("--analyze", action="store_true",
+                        help="refresh planner statistics after seeding (plans then depend on the seed size)")
+    parser.add_argument("--allow-scan", action="append", default=[], metavar="TABLE",
+                        help="table that may be scanned in full (repeatable)")
+    parser.add_argument("--output", help="write the plans here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # Settings are read at import, so configure before loading the app
+    workdir = tempfile.mkdtemp(prefix="query-plans-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/plans.db"
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    from .database import engine
+    from .main import app
+
+    recorder = Recorder()
+    with TestClient(app) as client:
+        headers = seed(client, args.employees, args.expenses)
+        if args.analyze:
+            analyze(engine)
+        event.listen(Engine, "before_cursor_execute", recorder)
+        try:
+            drive(client, recorder, headers)
+        finally:
+            event.remove(Engine, "before_cursor_execute", recorder)
+
+    allowed = set(args.allow_scan)
+    queries, failures = [], 0
+    with engine.connect() as conn:
+        for captured in recorder.statements.values():
+            result = {"endpoint": captured["endpoint"], "sql": captured["sql"], **explain(conn, captured["sql"], captured["parameters"])}
+            result["failed"] = bool(set(result["full_scans"]) - allowed - EXPECTED_SCANS.get(result["endpoint"], set()))
+            failures += result["failed"]
+            queries.append(result)
+            if result["failed"]:
+                print(f"FULL SCAN {', '.join(result['full_scans'])} in {result['endpoint']}:\n  {' '.join(result['sql'].split())}",
+                      file=sys.stderr)
+
+    report = json.dumps({"database": engine.dialect.name, "queries": queries, "failures": failures}, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(report)
+    else:
+        print(report)
+    print(f"{len(queries)} queries, {failures} with full scans", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import argparse
+import json
+from typing import Dict
+
+from sqlalchemy import and_, case, func, select, update
+from sqlalchemy.orm import Session
+
+from .models import Approval, ApprovalRule, Expense
+
+RECONCILE_BATCH_SIZE = 5000
+_SAMPLE_LIMIT = 20
+
+
+def _batch(db: Session, after_id: int, batch_size: int):
+    approved = func.sum(case((Approval.status == "approved", 1), else_=0))
+    current = func.min(case((Approval.status == "pending", Approval.step_order)))
+    specific = func.max(
+        case((and_(Approval.status == "approved", Approval.approver_id == ApprovalRule.specific_approver_id), 1), else_=0)
+    )
+    stmt = (
+        select(
+            Expense.id,
+            Expense.approved_count,
+            Expense.total_steps,
+            Expense.current_step,
+            Expense.specific_approver_approved,
+            func.count(Approval.id).label("total"),
+            func.coalesce(approved, 0).label("approved"),
+            current.label("current"),
+            func.coalesce(specific, 0).label("specific"),
+        )
+        .outerjoin(Approval, Approval.expense_id == Expense.id)
+        .outerjoin(ApprovalRule, ApprovalRule.company_id == Expense.company_id)
+        .where(Expense.id > after_id)
+        .group_by(Expense.id)
+        .order_by(Expense.id)
+        .limit(batch_size)
+    )
+    return db.execute(stmt).all()
+
+
+def reconcile_expenses(db: Session, fix: bool = False, batch_size: int = RECONCILE_BATCH_SIZE) -> Dict:
+    """Compare each expense's progress counters with its approval rows.
+
+    Walks expenses in id order, recomputing the counters from approvals in
+    one grouped query per batch. With `fix`, mismatched rows are rewritten.
+    """
+    checked = mismatched = 0
+    samples = []
+    last_id = 0
+    while True:
+        rows = _batch(db, last_id, batch_size)
+        if not rows:
+            break
+        last_id = rows[-1].id
+        checked += len(rows)
+        fixes = []
+        for r in rows:
+            expected = {
+                "approved_count": int(r.approved),
+                "total_steps": int(r.total),
+                "current_step": r.current,
+                "specific_approver_approved": bool(r.specific),
+            }
+            actual = {
+                "approved_count": r.approved_count,
+                "total_steps": r.total_steps,
+                "current_step": r.current_step,
+                "specific_approver_approved": bool(r.specific_approver_approved),
+            }
+            if expected != actual:
+                mismatched += 1
+                if len(samples) < _SAMPLE_LIMIT:
+                    samples.append({"expense_id": r.id, "expected": expected, "actual": actual})
+                fixes.append({"id": r.id, **expected})
+        if fix and fixes:
+            db.execute(update(Expense), fixes)
+            db.commit()
+    return {"checked": checked, "mismatched": mismatched, "fixed": mismatched if fix else 0, "samples": samples}
+
+
+if __name__ == "__main__":
+    # python -m app.reconcile [--fix]
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Check expense approval counters against approval rows")
+    parser.add_argument("--fix", action="store_true", help="rewrite mismatched counters")
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        print(json.dumps(reconcile_expenses(db, args.fix, args.batch_size), indent=2))
+    finally:
+        db.close()
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from ..database import get_db
-from ..models import User, Company, ApproverAssignment, ApprovalRule
+from ..database import get_async_db, get_db
+from ..models import User, Company, Expense, ApproverAssignment, ApprovalRule
 from ..schemas import (
     UserCreate,
     UserResponse,
@@ -12,21 +14,29 @@ from ..schemas import (
     ApproverAssignmentsUpdate,
     ApproverAssignmentItem,
     ApprovalRuleUpdate,
+    ExpensePage,
 )
-from ..auth import get_password_hash
+from ..auth import hash_password
 from ..deps import require_admin
+from ..principals import Principal, principal_cache
+from ..approvals import bump_policy_version
+from ..pagination import ExpenseFilters, page_limit, paginate_expenses, parse_fields
+from ..export import EXPENSE_EXPORT_COLUMNS, export_response, iter_expense_rows
+from ..analytics import company_analytics
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 @router.get("/users", response_model=list[UserResponse])
-def list_users(db: Session = Depends(get_db), _: User = Depends(require_admin)):
-    return db.query(User).all()
+def list_users(db: Session = Depends(get_db), admin: Principal = Depends(require_admin)):
+    return db.query(User).filter(User.company_id == admin.company_id).all()
 
 
 @router.post("/users", response_model=UserResponse)
-def create_user(payload: UserCreate, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+async def create_user(payload: UserCreate, db: AsyncSession = Depends(get_async_db), admin: Principal = Depends(require_admin)):
+    # Hash before checking out a connection so it isn't held during bcrypt
+    hashed_password = await hash_password(payload.password)
     # Ensure email unique
-    existing = db.query(User).filter(User.email == payload.email).first()
+    existing = await db.scalar(select(User.id).where(User.email == payload.email))
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already exists")
 
@@ -38,7 +48,7 @@ def create_user(payload: UserCreate, db: Session = Depends(get_db), admin: User
     user = User(
         name=payload.name,
         email=payload.email,
-        hashed_password=get_password_hash(payload.password),
+        hashed_password=hashed_password,
         role=payload.role,
         country=payload.country,
         currency=payload.currency,
@@ -47,27 +57,29 @@ def create_user(payload: UserCreate, db: Session = Depends(get_db), admin: User
         is_manager_approver=payload.is_manager_approver or False,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
 @router.post("/company", response_model=CompanyResponse)
-def create_company(payload: CompanyCreate, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+def create_company(payload: CompanyCreate, db: Session = Depends(get_db), admin: Principal = Depends(require_admin)):
     company = Company(name=payload.name, country=payload.country, currency=payload.currency or payload.country)
     db.add(company)
     db.commit()
     db.refresh(company)
     # Link admin to company if not already linked
     if admin.company_id != company.id:
-        admin.company_id = company.id
-        db.add(admin)
+        admin_user = db.get(User, admin.id)
+        admin_user.company_id = company.id
+        db.add(admin_user)
         db.commit()
+        principal_cache.invalidate_user(admin.id)
     return company
 
 
 @router.put("/users/{user_id}/role", response_model=UserResponse)
-def update_user_role(user_id: int, role: str, db: Session = Depends(get_db), _: User = Depends(require_admin)):
+def update_user_role(user_id: int, role: str, db: Session = Depends(get_db), _: Principal = Depends(require_admin)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
@@ -75,11 +87,12 @@ def update_user_role(user_id: int, role: str, db: Session = Depends(get_db), _:
     db.add(user)
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate_user(user.id)
     return user
 
 
 @router.put("/users/{user_id}/manager", response_model=UserResponse)
-def update_user_manager(user_id: int, manager_id: int | None = None, is_manager_approver: bool | None = None, db: Session = Depends(get_db), _: User = Depends(require_admin)):
+def update_user_manager(user_id: int, manager_id: int | None = None, is_manager_approver: bool | None = None, db: Session = Depends(get_db), _: Principal = Depends(require_admin)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
@@ -89,28 +102,30 @@ def update_user_manager(user_id: int, manager_id: int | None = None, is_manager_
     db.add(user)
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate_user(user.id)
     return user
 
 
 @router.put("/approver-assignments", response_model=list[ApproverAssignmentItem])
-def update_approver_assignments(payload: ApproverAssignmentsUpdate, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+def update_approver_assignments(payload: ApproverAssignmentsUpdate, db: Session = Depends(get_db), admin: Principal = Depends(require_admin)):
     # Delete existing assignments for company
     db.query(ApproverAssignment).filter(ApproverAssignment.company_id == admin.company_id).delete()
     # Insert new assignments
     for item in payload.assignments:
         db.add(ApproverAssignment(company_id=admin.company_id, approver_id=item.approver_id, step_order=item.step_order))
+    bump_policy_version(db, admin.company_id)
     db.commit()
     return payload.assignments
 
 
 @router.get("/approver-assignments", response_model=list[ApproverAssignmentItem])
-def list_approver_assignments(db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+def list_approver_assignments(db: Session = Depends(get_db), admin: Principal = Depends(require_admin)):
     items = db.query(ApproverAssignment).filter(ApproverAssignment.company_id == admin.company_id).order_by(ApproverAssignment.step_order.asc()).all()
     return [ApproverAssignmentItem(approver_id=i.approver_id, step_order=i.step_order) for i in items]
 
 
 @router.put("/approval-rule")
-def update_approval_rule(payload: ApprovalRuleUpdate, db: Session = Depends(get_db), admin: User = Depends(require_admin)):
+def update_approval_rule(payload: ApprovalRuleUpdate, db: Session = Depends(get_db), admin: Principal = Depends(require_admin)):
     rule = db.query(ApprovalRule).filter(ApprovalRule.company_id == admin.company_id).first()
     if not rule:
         rule = ApprovalRule(company_id=admin.company_id)
@@ -121,16 +136,57 @@ def update_approval_rule(payload: ApprovalRuleUpdate, db: Session = Depends(get_
         rule.specific_approver_id = payload.specific_approver_id
     if payload.hybrid is not None:
         rule.hybrid = payload.hybrid
+    bump_policy_version(db, admin.company_id)
     db.commit()
     return {"status": "ok"}
 
 
 @router.post("/users/{user_id}/reset-password")
-def reset_password(user_id: int, new_password: str, db: Session = Depends(get_db), _: User = Depends(require_admin)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def reset_password(user_id: int, new_password: str, db: AsyncSession = Depends(get_async_db), _: Principal = Depends(require_admin)):
+    hashed_password = await hash_password(new_password)
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    user.hashed_password = get_password_hash(new_password)
-    db.add(user)
-    db.commit()
-    return {"status": "ok"}
\ No newline at end of file
+    user.hashed_password = hashed_password
+    await db.commit()
+    principal_cache.invalidate_user(user.id)
+    return {"status": "ok"}
+
+
+@router.get("/expenses", response_model=ExpensePage)
+def list_expenses(
+    employee_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    limit: int = Depends(page_limit),
+    filters: ExpenseFilters = Depends(),
+    db: Session = Depends(get_db),
+    admin: Principal = Depends(require_admin),
+):
+    query = db.query(Expense).filter(Expense.company_id == admin.company_id)
+    if employee_id is not None:
+        query = query.filter(Expense.employee_id == employee_id)
+    return paginate_expenses(filters.apply(query), limit, cursor, parse_fields(fields))
+
+
+@router.get("/expenses/export")
+def export_expenses(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    gzip: bool = False,
+    employee_id: Optional[int] = None,
+    filters: ExpenseFilters = Depends(),
+    admin: Principal = Depends(require_admin),
+):
+    rows = iter_expense_rows(admin.company_id, filters, employee_id)
+    return export_response(rows, EXPENSE_EXPORT_COLUMNS, format, gzip, f"expenses-{admin.company_id}")
+
+
+@router.get("/analytics")
+def expense_analytics(
+    from_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="YYYY-MM, inclusive"),
+    to_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="YYYY-MM, inclusive"),
+    db: Session = Depends(get_db),
+    admin: Principal = Depends(require_admin),
+):
+    """Company spend by category, employee, month and status, in the company currency."""
+    return company_analytics(db, admin.company_id, from_month, to_month)
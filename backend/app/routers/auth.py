@@ -1,59 +1,78 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
+from ..database import get_async_db
 from ..models import User
 from ..schemas import LoginRequest, Token, UserResponse, ChangePasswordRequest, UserCreate
-from ..auth import verify_password, create_access_token, get_password_hash
+from ..auth import create_access_token, hash_password, verify_and_update_password
 from ..deps import get_current_user
+from ..principals import Principal, principal_cache
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.post("/login", response_model=Token)
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == payload.email).first()
-    if not user or not verify_password(payload.password, user.hashed_password):
+async def login(payload: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.email == payload.email))).scalars().first()
+    if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    user_id, hashed_password = user.id, user.hashed_password
+    claims = {"sub": user.email, "role": user.role, "name": user.name}
+    # Give the connection back before bcrypt; it is only needed again for a rehash
+    await db.close()
+    valid, new_hash = await verify_and_update_password(payload.password, hashed_password)
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    if new_hash:
+        # Stored hash predates the current work factor; upgrade it transparently
+        await db.execute(update(User).where(User.id == user_id).values(hashed_password=new_hash))
+        await db.commit()
 
-    access_token = create_access_token({"sub": user.email, "role": user.role, "name": user.name})
+    access_token = create_access_token(claims)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.post("/signup", response_model=UserResponse)
-def signup(payload: UserCreate, db: Session = Depends(get_db)):
-    existing_admin = db.query(User).filter(User.role == "admin").first()
+async def signup(payload: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    # Hash before checking out a connection so it isn't held during bcrypt
+    hashed_password = await hash_password(payload.password)
+    existing_admin = await db.scalar(select(User.id).where(User.role == "admin").limit(1))
     if existing_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin already exists")
 
-    existing_email = db.query(User).filter(User.email == payload.email).first()
+    existing_email = await db.scalar(select(User.id).where(User.email == payload.email))
     if existing_email:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already exists")
 
     user = User(
         name=payload.name,
         email=payload.email,
-        hashed_password=get_password_hash(payload.password),
+        hashed_password=hashed_password,
         role="admin",
         country=payload.country,
         currency=payload.currency or payload.country,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
 @router.get("/me", response_model=UserResponse)
-def me(current_user: User = Depends(get_current_user)):
+async def me(current_user: Principal = Depends(get_current_user)):
     return current_user
 
 
 @router.post("/change-password")
-def change_password(payload: ChangePasswordRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    if not verify_password(payload.old_password, current_user.hashed_password):
+async def change_password(payload: ChangePasswordRequest, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    hashed_password = await db.scalar(select(User.hashed_password).where(User.id == current_user.id))
+    await db.close()
+    valid, _ = await verify_and_update_password(payload.old_password, hashed_password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Old password incorrect")
-    current_user.hashed_password = get_password_hash(payload.new_password)
-    db.add(current_user)
-    db.commit()
-    return {"status": "ok"}
\ No newline at end of file
+    new_hash = await hash_password(payload.new_password)
+    await db.execute(update(User).where(User.id == current_user.id).values(hashed_password=new_hash))
+    await db.commit()
+    principal_cache.invalidate_user(current_user.id)
+    return {"status": "ok"}
@@ -5,12 +5,14 @@ from ..database import get_db
 from ..models import Company, User, ApproverAssignment, ApprovalRule
 from ..schemas import CompanyCreate, CompanyResponse, ApproverAssignmentsUpdate, ApprovalRuleUpdate
 from ..deps import get_current_user, require_admin
+from ..principals import Principal, principal_cache
+from ..approvals import bump_policy_version
 
 router = APIRouter(prefix="/company", tags=["company"])
 
 
 @router.post("/create", response_model=CompanyResponse)
-def create_company(payload: CompanyCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_company(payload: CompanyCreate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     # Only allow if user has no company yet or is admin
     if current_user.company_id:
         raise HTTPException(status_code=400, detail="Company already assigned")
@@ -21,10 +23,12 @@ def create_company(payload: CompanyCreate, db: Session = Depends(get_db), curren
     db.refresh(company)
 
     # Link current user as admin to company
-    current_user.company_id = company.id
-    current_user.role = "admin"
-    db.add(current_user)
+    user = db.get(User, current_user.id)
+    user.company_id = company.id
+    user.role = "admin"
+    db.add(user)
     db.commit()
+    principal_cache.invalidate_user(user.id)
 
     return company
 
@@ -33,7 +37,7 @@ def create_company(payload: CompanyCreate, db: Session = Depends(get_db), curren
 def update_approver_assignments(
     payload: ApproverAssignmentsUpdate,
     db: Session = Depends(get_db),
-    _: User = Depends(require_admin),
+    _: Principal = Depends(require_admin),
 ):
     # Replace all assignments for admin's company
     # Fetch admin company
@@ -54,6 +58,8 @@ def update_approver_assignments(
         db.refresh(assignment)
         created.append({"id": assignment.id, "approver_id": assignment.approver_id, "step_order": assignment.step_order})
 
+    bump_policy_version(db, company_id)
+    db.commit()
     return created
 
 
@@ -61,7 +67,7 @@ def update_approver_assignments(
 def update_approval_rule(
     payload: ApprovalRuleUpdate,
     db: Session = Depends(get_db),
-    current_admin: User = Depends(require_admin),
+    current_admin: Principal = Depends(require_admin),
 ):
     # Upsert approval rule per company
     company_id = current_admin.company_id
@@ -78,5 +84,6 @@ def update_approval_rule(
         rule.specific_approver_id = payload.specific_approver_id
     rule.hybrid = payload.hybrid if payload.hybrid is not None else rule.hybrid
     db.add(rule)
+    bump_policy_version(db, company_id)
     db.commit()
     return {"status": "ok"}
\ No newline at end of file
@@ -1,91 +1,117 @@
-from datetime import datetime
-from typing import List
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional
 
-import requests
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from ..database import get_db
-from ..models import User, Expense, Approval, ApproverAssignment, ApprovalRule
-from ..schemas import ExpenseCreate, ExpenseResponse, ApprovalDecision
+from ..database import get_async_db, get_db, run_write
+from ..models import Expense, Approval, User
+from ..schemas import ExpenseCreate, ExpenseResponse, ExpensePage, ApprovalDecision, ApprovalBatchDecision
 from ..deps import get_current_user
+from ..principals import Principal
+from ..pagination import ExpenseFilters, decode_cursor, encode_cursor, page_limit, paginate_expenses, parse_fields
+from .. import fx
+from ..approvals import ApprovalPolicy, approval_chain, get_policy
+from ..bulk_import import guess_format, import_expenses
+from ..analytics import RollupDelta
 
 router = APIRouter(prefix="/expenses", tags=["expenses"])
 
 
-def get_rate(base: str, target: str) -> float:
-    if base == target:
-        return 1.0
+def get_rate(base: str, target: str, on: Optional[date] = None) -> float:
     try:
-        r = requests.get(f"https://api.exchangerate-api.com/v4/latest/{base}", timeout=10)
-        r.raise_for_status()
-        data = r.json()
-        rates = data.get("rates", {})
-        return float(rates.get(target, 1.0))
+        return fx.get_rate(base, target, on)
+    except KeyError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported currency: {exc.args[0]}")
     except Exception:
-        return 1.0
-
-
-def bootstrap_approvals_for_expense(db: Session, employee: User, expense: Expense):
-    # Build sequence: optional manager first if is_manager_approver, then company approver assignments
-    step = 1
-    if employee.manager_id and employee.is_manager_approver:
-        db.add(Approval(expense_id=expense.id, approver_id=employee.manager_id, step_order=step, status="pending"))
-        step += 1
-    # Company assignments in order
-    assignments: List[ApproverAssignment] = (
-        db.query(ApproverAssignment)
-        .filter(ApproverAssignment.company_id == employee.company_id)
-        .order_by(ApproverAssignment.step_order.asc())
-        .all()
-    )
-    for a in assignments:
-        status_val = "pending" if step == 1 and not (employee.manager_id and employee.is_manager_approver) else "queued"
-        db.add(Approval(expense_id=expense.id, approver_id=a.approver_id, step_order=step, status=status_val))
-        step += 1
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Exchange rates unavailable")
+
+
+def record_expenses(db: Session, items: List[tuple]) -> List[Expense]:
+    """Insert (employee, payload, date, normalized amount) expenses with their
+    approval chains and rollups in a few set-based statements; the caller commits."""
+    expenses, chains = [], []
+    for employee, payload, expense_date, normalized_amount in items:
+        chain = approval_chain(employee, get_policy(db, employee.company_id))
+        expenses.append(Expense(
+            employee_id=employee.id,
+            company_id=employee.company_id,
+            amount=payload.amount,
+            currency=payload.currency,
+            normalized_amount=normalized_amount,
+            category=payload.category,
+            description=payload.description,
+            date=expense_date,
+            status="pending",
+            total_steps=len(chain),
+            current_step=1 if chain else None,
+        ))
+        chains.append(chain)
+    # Flush for the ids, then insert the chains and rollups in the same transaction
+    db.add_all(expenses)
+    db.flush()
+    approvals = [{"expense_id": e.id, **step} for e, chain in zip(expenses, chains) for step in chain]
+    if approvals:
+        db.execute(insert(Approval), approvals)
+    rollups = RollupDelta()
+    for expense in expenses:
+        rollups.add(expense, "pending")
+    rollups.flush(db)
+    return expenses
 
 
 @router.post("/", response_model=ExpenseResponse)
-def submit_expense(payload: ExpenseCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def submit_expense(payload: ExpenseCreate, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
     if current_user.company_id is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User is not linked to a company")
 
-    # Normalize to company currency
+    # Normalize to company currency at the rate for the expense date
+    expense_date = datetime.fromisoformat(payload.date) if payload.date else datetime.utcnow()
     company_currency = current_user.currency if current_user.currency else "USD"
-    rate = get_rate(payload.currency, company_currency)
-    normalized_amount = payload.amount * rate
-
-    expense = Expense(
-        employee_id=current_user.id,
-        company_id=current_user.company_id,
-        amount=payload.amount,
-        currency=payload.currency,
-        normalized_amount=normalized_amount,
-        category=payload.category,
-        description=payload.description,
-        date=datetime.fromisoformat(payload.date) if payload.date else datetime.utcnow(),
-        status="pending",
-    )
-    db.add(expense)
-    db.commit()
-    db.refresh(expense)
+    # A rate-cache miss reads the snapshot store (or the network) synchronously
+    rate = await run_in_threadpool(get_rate, payload.currency, company_currency, expense_date.date())
+    return await run_write(db, record_expenses, (current_user, payload, expense_date, payload.amount * rate))
 
-    # Create approvals chain
-    bootstrap_approvals_for_expense(db, current_user, expense)
-    db.commit()
-    db.refresh(expense)
-    return expense
+
+@router.post("/bulk")
+def bulk_import(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    if current_user.company_id is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User is not linked to a company")
+    return import_expenses(db, current_user, file.file, format or guess_format(file.filename))
 
 
-@router.get("/me", response_model=List[ExpenseResponse])
-def my_expenses(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    items = db.query(Expense).filter(Expense.employee_id == current_user.id).order_by(Expense.created_at.desc()).all()
-    return items
+@router.get("/me", response_model=ExpensePage)
+def my_expenses(
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    limit: int = Depends(page_limit),
+    filters: ExpenseFilters = Depends(),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    query = filters.apply(db.query(Expense).filter(Expense.employee_id == current_user.id))
+    return paginate_expenses(query, limit, cursor, parse_fields(fields))
 
 
 @router.get("/approvals/pending")
-def pending_approvals(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    items = db.query(Approval).filter(Approval.approver_id == current_user.id, Approval.status == "pending").order_by(Approval.step_order.asc()).all()
+async def pending_approvals(db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    items = (
+        await db.execute(
+            select(Approval)
+            .where(Approval.approver_id == current_user.id, Approval.status == "pending")
+            .order_by(Approval.step_order.asc())
+        )
+    ).scalars().all()
     return [
         {
             "id": a.id,
@@ -97,71 +123,221 @@ def pending_approvals(db: Session = Depends(get_db), current_user: User = Depend
     ]
 
 
-def evaluate_rules_and_progress(db: Session, expense: Expense) -> None:
-    # Fetch approvals
-    approvals: List[Approval] = db.query(Approval).filter(Approval.expense_id == expense.id).order_by(Approval.step_order.asc()).all()
-    approved_count = sum(1 for a in approvals if a.status == "approved")
-    total_count = len(approvals)
+# Inbox sort orders: (column, descending)
+INBOX_SORTS = {
+    "oldest": (Expense.created_at, False),
+    "newest": (Expense.created_at, True),
+    "amount_desc": (Expense.normalized_amount, True),
+    "amount_asc": (Expense.normalized_amount, False),
+}
 
-    # Fetch rule for company
-    rule = db.query(ApprovalRule).filter(ApprovalRule.company_id == expense.company_id).first()
-    specific_approved = False
-    if rule and rule.specific_approver_id:
-        specific_approved = any(a.approver_id == rule.specific_approver_id and a.status == "approved" for a in approvals)
 
-    # If any rejection -> reject immediately
-    if any(a.status == "rejected" for a in approvals):
-        expense.status = "rejected"
-        db.add(expense)
-        return
+@router.get("/approvals/inbox")
+def approvals_inbox(
+    sort: str = Query("oldest", pattern="^(oldest|newest|amount_desc|amount_asc)$"),
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_limit),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Pending steps for the caller with the expense details, one joined query per page."""
+    column, descending = INBOX_SORTS[sort]
+    mine = and_(Approval.approver_id == current_user.id, Approval.status == "pending")
+    # The name is looked up per returned row by primary key. A join would let
+    # the planner drive the query from users, which it scans when it's small.
+    employee_name = select(User.name).where(User.id == Expense.employee_id).correlate(Expense).scalar_subquery()
+    query = (
+        db.query(
+            Approval.id.label("approval_id"),
+            Approval.expense_id,
+            Approval.step_order,
+            Expense.employee_id,
+            employee_name.label("employee_name"),
+            Expense.amount,
+            Expense.currency,
+            Expense.normalized_amount,
+            Expense.category,
+            Expense.description,
+            Expense.date,
+            Expense.created_at,
+        )
+        .join(Expense, Expense.id == Approval.expense_id)
+        .filter(mine)
+    )
+    if cursor:
+        value, last_id = decode_cursor(cursor, datetime.fromisoformat if column is Expense.created_at else float)
+        if descending:
+            query = query.filter(or_(column < value, and_(column == value, Approval.id < last_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, Approval.id > last_id)))
+    order = (column.desc(), Approval.id.desc()) if descending else (column.asc(), Approval.id.asc())
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at if column is Expense.created_at else last.normalized_amount, last.approval_id)
+    total, total_amount = db.query(func.count(Approval.id), func.coalesce(func.sum(Expense.normalized_amount), 0)).join(
+        Expense, Expense.id == Approval.expense_id
+    ).filter(mine).one()
+    return {
+        "items": [dict(row._mapping) for row in rows],
+        "next_cursor": next_cursor,
+        "total": total,
+        "total_normalized_amount": total_amount,
+    }
+
+
+def decision_outcome(policy: ApprovalPolicy, expense: Expense, approval: Approval, approve: bool) -> dict:
+    """Expense progress after one decision, computed from its counters alone."""
+    approved_count = expense.approved_count + (1 if approve else 0)
+    total_count = expense.total_steps
+    specific_approved = bool(expense.specific_approver_approved) or (
+        approve and policy.specific_approver_id is not None and approval.approver_id == policy.specific_approver_id
+    )
 
     # Determine approval based on rules
     percentage_ok = False
-    if rule and rule.percentage_threshold is not None:
-        percentage_ok = (approved_count / max(total_count, 1)) * 100 >= rule.percentage_threshold
+    if policy.percentage_threshold is not None:
+        percentage_ok = (approved_count / max(total_count, 1)) * 100 >= policy.percentage_threshold
     else:
         # Default: require all approvals
         percentage_ok = approved_count == total_count and total_count > 0
 
-    if rule and rule.hybrid:
+    if policy.hybrid:
         approved = percentage_ok or specific_approved
     else:
         approved = specific_approved or percentage_ok
 
-    if approved:
-        expense.status = "approved"
-        db.add(expense)
-        return
+    # A rejection rejects immediately
+    new_status = "rejected" if not approve else "approved" if approved else "pending"
+    next_step = approval.step_order + 1 if new_status == "pending" and approval.step_order < total_count else None
+    return {
+        "approved_count": approved_count,
+        "specific_approver_approved": specific_approved,
+        "current_step": next_step,
+        "status": new_status,
+    }
 
-    # Otherwise, advance next queued to pending
-    for a in approvals:
-        if a.status == "queued":
-            a.status = "pending"
-            db.add(a)
-            break
 
+def apply_decisions(db: Session, decisions: List[tuple]) -> List[Optional[str]]:
+    """Apply (expense_id, approver_id, approve, comment) decisions, at most one
+    per expense, with one locking read and set-based writes; the caller commits.
 
-@router.post("/approvals/{expense_id}/decide")
-def decide(expense_id: int, payload: ApprovalDecision, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    expense = db.query(Expense).filter(Expense.id == expense_id).first()
-    if not expense:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Expense not found")
+    Progress comes from each expense's counters rather than re-reading its
+    approval rows. Returns each expense's new status, or None where the
+    approver has no pending step on it.
+    """
+    statuses: List[Optional[str]] = [None] * len(decisions)
+    if not decisions:
+        return statuses
+    index = {(expense_id, approver_id): i for i, (expense_id, approver_id, _, _) in enumerate(decisions)}
 
-    approval = (
-        db.query(Approval)
-        .filter(Approval.expense_id == expense_id, Approval.approver_id == current_user.id, Approval.status == "pending")
-        .first()
+    # Lock the pending steps and their expenses together, reading current state.
+    # Plain IN lists rather than a row-value IN, which SQLite answers with a scan.
+    rows = (
+        db.query(Approval, Expense)
+        .join(Expense, Expense.id == Approval.expense_id)
+        .filter(
+            Approval.expense_id.in_({expense_id for expense_id, _ in index}),
+            Approval.approver_id.in_({approver_id for _, approver_id in index}),
+            Approval.status == "pending",
+        )
+        .populate_existing()
+        .with_for_update()
+        .all()
     )
-    if not approval:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No pending approval for user")
+    now = datetime.utcnow()
+    approval_updates, expense_updates = [], []
+    next_steps: Dict[int, List[int]] = defaultdict(list)  # step -> expenses moving on to it
+    rollups = RollupDelta()
+    for approval, expense in rows:
+        i = index.get((expense.id, approval.approver_id))
+        if i is None or statuses[i] is not None:
+            continue
+        _, _, approve, comment = decisions[i]
+        outcome = decision_outcome(get_policy(db, expense.company_id), expense, approval, approve)
+        approval_updates.append({
+            "id": approval.id,
+            "status": "approved" if approve else "rejected",
+            "comment": comment,
+            "decided_at": now,
+        })
+        expense_updates.append({"id": expense.id, **outcome})
+        rollups.move(expense, expense.status, outcome["status"])
+        if outcome["current_step"] is not None:
+            next_steps[outcome["current_step"]].append(expense.id)
+        statuses[i] = outcome["status"]
 
-    approval.status = "approved" if payload.approve else "rejected"
-    approval.comment = payload.comment
-    approval.decided_at = datetime.utcnow()
-    db.add(approval)
-    db.commit()
+    if approval_updates:
+        db.execute(update(Approval), approval_updates)
+        db.execute(update(Expense), expense_updates)
+    # Open the next queued step of expenses still in progress
+    for step_order, expense_ids in next_steps.items():
+        db.execute(
+            update(Approval)
+            .where(Approval.expense_id.in_(expense_ids), Approval.step_order == step_order, Approval.status == "queued")
+            .values(status="pending")
+        )
+    rollups.flush(db)
+    return statuses
 
-    # Evaluate flow
-    evaluate_rules_and_progress(db, expense)
+
+@router.post("/approvals/decide-batch")
+def decide_batch(payload: ApprovalBatchDecision, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    """Apply many decisions at once: one locking read, set-based writes, one commit."""
+    started = time.perf_counter()
+    results: List[Optional[dict]] = [None] * len(payload.decisions)
+    first = {}  # expense id -> index of its first decision
+    for i, item in enumerate(payload.decisions):
+        if item.expense_id in first:
+            results[i] = {"expense_id": item.expense_id, "ok": False, "error": "Duplicate expense id"}
+        else:
+            first[item.expense_id] = i
+
+    statuses = apply_decisions(db, [
+        (expense_id, current_user.id, payload.decisions[i].approve, payload.decisions[i].comment)
+        for expense_id, i in first.items()
+    ])
     db.commit()
-    return {"status": "ok"}
\ No newline at end of file
+
+    for (expense_id, i), new_status in zip(first.items(), statuses):
+        if new_status is None:
+            results[i] = {"expense_id": expense_id, "ok": False, "error": "No pending approval for user"}
+        else:
+            results[i] = {"expense_id": expense_id, "ok": True, "status": new_status}
+    return {
+        "results": results,
+        "approved": sum(1 for r in results if r.get("status") == "approved"),
+        "rejected": sum(1 for r in results if r.get("status") == "rejected"),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def record_decisions(db: Session, items: List[tuple]) -> List:
+    """Write handler for single decisions (see `run_write`).
+
+    Items are applied in rounds with one decision per expense each, so a
+    later decision on the same expense sees the earlier one.
+    """
+    results: List = [None] * len(items)
+    remaining = list(range(len(items)))
+    while remaining:
+        seen, now, later = set(), [], []
+        for i in remaining:
+            (later if items[i][0] in seen else now).append(i)
+            seen.add(items[i][0])
+        for i, new_status in zip(now, apply_decisions(db, [items[i] for i in now])):
+            results[i] = new_status or HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No pending approval for user")
+        remaining = later
+    return results
+
+
+@router.post("/approvals/{expense_id}/decide")
+async def decide(expense_id: int, payload: ApprovalDecision, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    if await db.scalar(select(Expense.id).where(Expense.id == expense_id)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Expense not found")
+    await run_write(db, record_decisions, (expense_id, current_user.id, payload.approve, payload.comment))
+    return {"status": "ok"}
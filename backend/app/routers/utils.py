@@ -1,25 +1,34 @@
-import requests
-from fastapi import APIRouter
+from datetime import date
+
+from fastapi import APIRouter, HTTPException, Request
+
+from ..countries import get_catalogue
+from ..database import pool_stats
+from ..fx import get_rates, rate_cache
 
 router = APIRouter(prefix="/utils", tags=["utils"])
 
 
 @router.get("/countries")
-def countries():
-    url = "https://restcountries.com/v3.1/all?fields=name,currencies"
-    r = requests.get(url, timeout=10)
-    r.raise_for_status()
-    data = r.json()
-    items = []
-    for c in data:
-        name = c.get("name", {}).get("common")
-        currencies = list((c.get("currencies") or {}).keys())
-        items.append({"name": name, "currencies": currencies})
-    return items
+def countries(request: Request):
+    return get_catalogue().countries_json.response(request)
+
+
+@router.get("/rates/cache-stats")
+def rates_cache_stats():
+    return rate_cache.stats()
+
+
+@router.get("/db/pool-stats")
+def db_pool_stats():
+    return pool_stats()
 
 
 @router.get("/rates/{base}")
-def rates(base: str):
-    r = requests.get(f"https://api.exchangerate-api.com/v4/latest/{base}", timeout=10)
-    r.raise_for_status()
-    return r.json()
\ No newline at end of file
+def rates(base: str, on: date | None = None):
+    try:
+        return get_rates(base, on)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Unsupported currency")
+    except Exception:
+        raise HTTPException(status_code=502, detail="Exchange rate service error")
\ No newline at end of file
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field
+from typing import Any, Dict, Optional, List
+from datetime import datetime
 
 
 class Token(BaseModel):
@@ -110,13 +111,18 @@ class ExpenseResponse(BaseModel):
     normalized_amount: float
     category: str
     description: str
-    date: str
+    date: datetime
     status: str
 
     class Config:
         from_attributes = True
 
 
+class ExpensePage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
 class ApprovalAction(BaseModel):
     comment: Optional[str] = None
 
@@ -132,4 +138,12 @@ class ResetPasswordRequest(BaseModel):
 
 class ApprovalDecision(BaseModel):
     approve: bool
-    comment: Optional[str] = None
\ No newline at end of file
+    comment: Optional[str] = None
+
+
+class ApprovalBatchItem(ApprovalDecision):
+    expense_id: int
+
+
+class ApprovalBatchDecision(BaseModel):
+    decisions: List[ApprovalBatchItem] = Field(..., min_length=1, max_length=1000)
@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import url as sa_url
+
+JOURNAL_MODES = ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF")
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def is_file_database(url) -> bool:
+    u = sa_url.make_url(url)
+    return u.get_backend_name() == "sqlite" and u.database not in (None, "", ":memory:")
+
+
+def install_pragmas(engine, journal_mode: str, synchronous: str, busy_timeout_ms: int, mmap_size: int, cache_size: int) -> None:
+    """Tune every new SQLite connection of `engine` (sync or async)."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "connect")
+    def _connect(dbapi_connection, record):
+        cursor = dbapi_connection.cursor()
+        try:
+            # busy_timeout first, so switching the journal mode waits for other writers
+            cursor.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+            cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+            cursor.execute(f"PRAGMA synchronous = {synchronous}")
+            cursor.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+            cursor.execute(f"PRAGMA cache_size = {int(cache_size)}")
+        finally:
+            cursor.close()
+
+
+def begin_immediate(engine) -> None:
+    """Start every transaction on `engine` with BEGIN IMMEDIATE.
+
+    pysqlite begins lazily at the first write and mishandles SAVEPOINT, so
+    its handling is switched off and the write lock is taken up front.
+    Only the writer's engine uses this: on pooled connections an eager
+    BEGIN would make read-then-write requests fail instead of waiting.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+class WriteQueue:
+    """One writer thread that group-commits queued writes.
+
+    Writes are `(handler, item)` pairs. A handler takes a session and a list
+    of items, writes them without committing and returns one result per
+    item, an Exception instance for an item that failed. The writer drains
+    up to `max_batch` queued writes, hands each handler all of its items in
+    one call, so a batch costs a handful of statements rather than a few
+    per request, and commits the batch once. A handler that raises is
+    retried item by item to find the culprit. Callers get a Future that
+    resolves once the batch is committed.
+    """
+
+    def __init__(self, session_factory, max_batch: int = 64):
+        self._session_factory = session_factory
+        self.max_batch = max(max_batch, 1)
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.jobs = 0
+        self.failed = 0
+        self.largest_batch = 0
+        self.batch_total = 0.0
+
+    def submit(self, handler, item) -> Future:
+        future: Future = Future()
+        self._ensure_started()
+        self._queue.put((handler, item, future))
+        return future
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            job = self._queue.get()
+            if job is None:
+                return
+            batch = [job]
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            self._commit(batch)
+
+    @staticmethod
+    def _apply(session, handler, items) -> List:
+        try:
+            with session.begin_nested():
+                return list(handler(session, items))
+        except Exception:
+            if len(items) == 1:
+                raise
+        results = []
+        for item in items:
+            try:
+                with session.begin_nested():
+                    results.append(handler(session, [item])[0])
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+    def _commit(self, batch) -> None:
+        started = time.perf_counter()
+        groups: Dict = {}
+        for handler, item, future in batch:
+            if future.set_running_or_notify_cancel():
+                groups.setdefault(handler, []).append((item, future))
+        outcomes = []
+        session = self._session_factory()
+        try:
+            for handler, jobs in groups.items():
+                try:
+                    results = self._apply(session, handler, [item for item, _ in jobs])
+                except Exception as exc:
+                    results = [exc]
+                outcomes += zip((future for _, future in jobs), results)
+                # Results stay loaded but detached, so later handlers load fresh state
+                session.expunge_all()
+            session.commit()
+        except Exception as exc:
+            # The whole batch is lost; writes that failed on their own keep their error
+            session.rollback()
+            own = {id(future): r for future, r in outcomes if isinstance(r, Exception)}
+            outcomes = [(future, own.get(id(future), exc)) for jobs in groups.values() for _, future in jobs]
+        finally:
+            session.close()
+
+        with self._lock:
+            self.batches += 1
+            self.jobs += len(outcomes)
+            self.failed += sum(1 for _, r in outcomes if isinstance(r, Exception))
+            self.largest_batch = max(self.largest_batch, len(outcomes))
+            self.batch_total += time.perf_counter() - started
+        for future, result in outcomes:
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Finish the queued jobs and stop the writer thread."""
+        with self._lock:
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "batches": self.batches,
+                "jobs": self.jobs,
+                "failed": self.failed,
+                "largest_batch": self.largest_batch,
+                "avg_batch": round(self.jobs / self.batches, 2) if self.batches else 0.0,
+                "batch_ms_avg": round(self.batch_total / self.batches * 1000, 3) if self.batches else 0.0,
+            }
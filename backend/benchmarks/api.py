@@ -0,0 +1,418 @@
+"""Throughput and latency of the main API endpoints, with a baseline check.
+
+Seeds a synthetic company through the API: an admin, one manager per
+--team-size employees (each manager approves their team's expenses), a
+chain of --chain company approvers after them and --expenses imported
+expenses. It then drives login, me, submit, pending, decide and
+upload_receipt with --concurrency clients. Each --mode gets its own
+throwaway SQLite database:
+
+  asgi     the app in this process, called through httpx's ASGI transport
+  uvicorn  the app in a uvicorn subprocess, called over HTTP
+
+upload_receipt is served by the mysql_auth app and only queues the OCR job,
+so it measures the upload path (stub OCR engine, cache off), not OCR.
+
+Prints a JSON report with requests per second and p50/p95/p99 latency per
+mode and endpoint. With a baseline (--baseline, default api_baseline.json
+next to this file, if it exists) each result is compared with it and
+changes beyond --tolerance are listed as regressions. Absolute numbers only
+compare on the same machine, so the committed api_baseline.json is for
+reference only: regressions are reported, and the run exits 1 for them only
+with --fail-on-regression against a baseline saved (--save-baseline) on the
+machine running the check.
+
+    cd backend && pip install -r requirements-dev.txt
+    python -m benchmarks.api [--mode both] [--concurrency 50] [--requests 1000]
+
+Exchange rates and the country catalogue are stubbed, so no network is needed.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api_baseline.json")
+PASSWORD = "bench-password"
+
+STUB_RATES = {"USD": 1.0, "EUR": 0.9, "GBP": 0.78, "INR": 83.0, "JPY": 150.0}
+STUB_COUNTRIES = [
+    {"name": "France", "currencies": ["EUR"]},
+    {"name": "India", "currencies": ["INR"]},
+    {"name": "Japan", "currencies": ["JPY"]},
+    {"name": "United Kingdom", "currencies": ["GBP"]},
+    {"name": "United States", "currencies": ["USD"]},
+]
+
+
+def bench_env(args, database_url: str) -> dict:
+    return {
+        "DATABASE_URL": database_url,
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+        "PASSWORD_HASH_QUEUE_LIMIT": str(max(args.concurrency, 64)),
+        "OCR_ENGINE": "stub",
+        "OCR_CACHE_DIR": "",
+        # Uploads outpace the OCR workers; queue them all rather than answer 429
+        "OCR_QUEUE_LIMIT": str(max(args.requests, 256)),
+        # The receipts app never needs MySQL for uploads
+        "MYSQL_POOL_WARM": "0",
+        "MYSQL_SESSION_SWEEP_SECONDS": "0",
+    }
+
+
+def stub_network() -> None:
+    """Serve exchange rates and countries from fixed data instead of the network."""
+    from datetime import date
+
+    from app import countries, fx
+
+    fx.rate_cache.fetcher = lambda pivot: {
+        "base": pivot,
+        "date": date.today().isoformat(),
+        "rates": fx.rebase(STUB_RATES, "USD", pivot),
+    }
+    fx.rate_cache.clear()
+    countries._catalogue = countries.Catalogue(STUB_COUNTRIES)
+
+
+def receipt_images(count: int = 16) -> list:
+    from PIL import Image, PngImagePlugin
+
+    images = []
+    for i in range(count):
+        info = PngImagePlugin.PngInfo()
+        # The stub OCR engine reads its text from this chunk
+        info.add_text("ocr_text", f"Bench Store {i}\n2024-03-{1 + i % 28:02d}\nTotal {10 + i}.50")
+        buf = BytesIO()
+        Image.new("RGB", (400, 600), "white").save(buf, "PNG", pnginfo=info)
+        images.append(buf.getvalue())
+    return images
+
+
+def percentile(ordered: list, pct: float) -> float:
+    # Nearest rank
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+async def drive(client: httpx.AsyncClient, concurrency: int, requests: list) -> dict:
+    """Send `requests` ((method, path, kwargs) tuples) from `concurrency` workers."""
+    queue = iter(requests)
+    latencies, errors = [], {}
+
+    async def worker():
+        for method, path, kwargs in queue:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                error = str(response.status_code) if response.status_code >= 400 else None
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if not latencies:
+        return {"requests": 0, "errors": 0, "rps": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors.values()),
+        # Status code or transport error -> count
+        "error_kinds": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        **{f"p{p}_ms": round(percentile(latencies, p) * 1000, 2) for p in (50, 95, 99)},
+    }
+
+
+async def seed(client: httpx.AsyncClient, args) -> dict:
+    """Create the company, its users and approval chain, and the seed expenses."""
+    # Below the password-hashing queue limit, which would answer 429
+    slots = asyncio.Semaphore(16)
+
+    async def ok(response):
+        async with slots:
+            response = await response
+        assert response.status_code < 400, f"{response.request.url}: {response.status_code} {response.text}"
+        return response.json()
+
+    async def login(email):
+        token = (await ok(client.post("/auth/login", json={"email": email, "password": PASSWORD})))["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    async def create_user(headers, **fields):
+        return await ok(client.post("/admin/users", headers=headers, json={"password": PASSWORD, **fields}))
+
+    await ok(client.post("/auth/signup", json={"name": "Admin", "email": "admin@bench.io", "password": PASSWORD, "currency": "USD"}))
+    admin = await login("admin@bench.io")
+    await ok(client.post("/company/create", headers=admin, json={"name": "Bench Co", "country": "US", "currency": "USD"}))
+
+    managers = await asyncio.gather(*(
+        create_user(admin, name=f"Manager {i}", email=f"manager{i}@bench.io", role="manager")
+        for i in range(max(math.ceil(args.employees / args.team_size), 1))
+    ))
+    approvers = await asyncio.gather(*(
+        create_user(admin, name=f"Approver {i}", email=f"approver{i}@bench.io", role="manager")
+        for i in range(args.chain)
+    ))
+    employees = await asyncio.gather(*(
+        create_user(admin, name=f"Employee {i}", email=f"employee{i}@bench.io", role="employee",
+                    manager_id=managers[i % len(managers)]["id"], is_manager_approver=True)
+        for i in range(args.employees)
+    ))
+    await ok(client.put("/admin/approver-assignments", headers=admin, json={"assignments": [
+        {"approver_id": a["id"], "step_order": step} for step, a in enumerate(approvers, start=1)
+    ]}))
+    if args.expenses:
+        lines = "\n".join(
+            json.dumps({
+                "employee_id": employees[i % len(employees)]["id"],
+                "amount": 5 + i % 500,
+                "currency": ("USD", "EUR", "GBP", "INR")[i % 4],
+                "category": ("travel", "meals", "lodging", "supplies")[i % 4],
+                "description": f"seed {i}",
+                "date": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}",
+            })
+            for i in range(args.expenses)
+        )
+        await ok(client.post("/expenses/bulk", headers=admin, files={"file": ("seed.ndjson", lines.encode())}))
+
+    return {
+        "employees": [e["email"] for e in employees],
+        "managers": [m["email"] for m in managers],
+        "tokens": dict(zip(
+            [e["email"] for e in employees] + [m["email"] for m in managers],
+            await asyncio.gather(*(login(e["email"]) for e in employees + managers)),
+        )),
+    }
+
+
+async def run_workload(client: httpx.AsyncClient, receipts: httpx.AsyncClient, args, images: list) -> dict:
+    company = await seed(client, args)
+    employees, managers, tokens = company["employees"], company["managers"], company["tokens"]
+    employee = [tokens[e] for e in employees]
+    manager = [tokens[m] for m in managers]
+    n, c = args.requests, args.concurrency
+
+    report = {}
+    report["login"] = await drive(client, c, [
+        ("POST", "/auth/login", {"json": {"email": employees[i % len(employees)], "password": PASSWORD}}) for i in range(n)
+    ])
+    report["me"] = await drive(client, c, [
+        ("GET", "/auth/me", {"headers": employee[i % len(employee)]}) for i in range(n)
+    ])
+    report["submit"] = await drive(client, c, [
+        ("POST", "/expenses/", {"headers": employee[i % len(employee)], "json": {
+            "amount": 10 + i % 90, "currency": ("USD", "EUR", "INR")[i % 3], "category": "travel", "description": f"bench {i}",
+        }}) for i in range(n)
+    ])
+    report["pending"] = await drive(client, c, [
+        ("GET", "/expenses/approvals/pending", {"headers": manager[i % len(manager)]}) for i in range(n)
+    ])
+    # Each manager decides their own team's pending expenses, interleaved
+    queues = []
+    for headers in manager:
+        pending = (await client.get("/expenses/approvals/pending", headers=headers)).json()
+        queues.append([(a["expense_id"], headers) for a in pending])
+    decisions = [item for batch in zip(*queues) for item in batch] if queues else []
+    report["decide"] = await drive(client, c, [
+        ("POST", f"/expenses/approvals/{expense_id}/decide", {"headers": headers, "json": {"approve": i % 5 != 0}})
+        for i, (expense_id, headers) in enumerate(decisions[:n])
+    ])
+    report["upload_receipt"] = await drive(receipts, c, [
+        ("POST", "/upload_receipt", {"files": {"file": (f"receipt{i}.png", images[i % len(images)], "image/png")}})
+        for i in range(n)
+    ])
+    # Let the queued OCR jobs finish so shutdown doesn't cancel them
+    deadline = time.monotonic() + 120
+    while (await receipts.get("/receipts/stats")).json()["pending"] and time.monotonic() < deadline:
+        await asyncio.sleep(0.2)
+    return report
+
+
+def client_limits(concurrency: int) -> httpx.Limits:
+    return httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+
+async def run_asgi(args, images: list) -> dict:
+    from app.main import app
+    from mysql_auth.app import app as receipts_app
+
+    stub_network()
+    # Startup hooks print (mysql_auth reports the missing MySQL); keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        async with app.router.lifespan_context(app), receipts_app.router.lifespan_context(receipts_app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=300) as client, \
+                    httpx.AsyncClient(transport=httpx.ASGITransport(app=receipts_app), base_url="http://bench", timeout=300) as receipts:
+                return await run_workload(client, receipts, args, images)
+
+
+class Server:
+    """`python -m benchmarks.api serve` in a subprocess."""
+
+    def __init__(self, target: str, env: dict, port: int):
+        self.url = f"http://127.0.0.1:{port}"
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.api", "serve", target, "--port", str(port)],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=sys.stderr,
+        )
+
+    def wait_ready(self, timeout: float = 60.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited with {self.process.returncode}")
+            try:
+                if httpx.get(f"{self.url}/health").status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("server did not start")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+async def run_uvicorn(args, env: dict, images: list) -> dict:
+    servers = [Server("app.main:app", env, args.port), Server("mysql_auth.app:app", env, args.port + 1)]
+    try:
+        for server in servers:
+            server.wait_ready()
+        limits = client_limits(args.concurrency)
+        async with httpx.AsyncClient(base_url=servers[0].url, limits=limits, timeout=300) as client, \
+                httpx.AsyncClient(base_url=servers[1].url, limits=limits, timeout=300) as receipts:
+            return await run_workload(client, receipts, args, images)
+    finally:
+        for server in servers:
+            server.stop()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> tuple:
+    """Per-result change against `baseline`, and the results that regressed."""
+    changes, regressions = {}, []
+    for mode, endpoints in results.items():
+        for name, now in endpoints.items():
+            before = baseline.get("results", {}).get(mode, {}).get(name)
+            if not before or not before["requests"] or not now["requests"]:
+                continue
+            change = {
+                key: round((now[key] - before[key]) / before[key] * 100, 1) if before[key] else None
+                for key in ("rps", "p50_ms", "p95_ms", "p99_ms")
+            }
+            changes.setdefault(mode, {})[name] = {f"{key}_change_pct": value for key, value in change.items()}
+            reasons = []
+            if now["rps"] < before["rps"] * (1 - tolerance):
+                reasons.append(f"rps {before['rps']} -> {now['rps']}")
+            if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                reasons.append(f"p95 {before['p95_ms']}ms -> {now['p95_ms']}ms")
+            if now["errors"] > before["errors"]:
+                reasons.append(f"errors {before['errors']} -> {now['errors']}")
+            if reasons:
+                regressions.append({"mode": mode, "endpoint": name, "reasons": reasons})
+    return changes, regressions
+
+
+def serve(argv) -> None:
+    import importlib
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.api serve")
+    parser.add_argument("target", help="module:attribute of the ASGI app")
+    parser.add_argument("--port", type=int, required=True)
+    args = parser.parse_args(argv)
+    module, attribute = args.target.split(":")
+    app = getattr(importlib.import_module(module), attribute)
+    stub_network()
+    # Client connections sit idle between phases; don't race uvicorn closing them
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", timeout_keep_alive=300)
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["serve"]:
+        serve(argv[1:])
+        return 0
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["asgi", "uvicorn", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint and mode")
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--team-size", type=int, default=10, help="employees per manager")
+    parser.add_argument("--chain", type=int, default=2, help="company approvers after the manager")
+    parser.add_argument("--expenses", type=int, default=2000, help="expenses imported before the run")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--database-url", help="sync SQLAlchemy URL of an empty database (one --mode only)")
+    parser.add_argument("--port", type=int, default=8775, help="uvicorn port (the receipts app uses the next one)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed fractional change before a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 when the baseline check finds a regression")
+    parser.add_argument("--output", help="write the report here instead of stdout")
+    args = parser.parse_args(argv)
+    if args.database_url and args.mode == "both":
+        parser.error("--database-url needs a single --mode")
+
+    modes = ["asgi", "uvicorn"] if args.mode == "both" else [args.mode]
+    workdir = tempfile.mkdtemp(prefix="api-bench-")
+    envs = {mode: bench_env(args, args.database_url or f"sqlite:///{workdir}/{mode}.db") for mode in modes}
+    images = receipt_images()
+
+    results = {}
+    for mode in modes:
+        if mode == "asgi":
+            # Settings are read at import, so configure before loading the app
+            os.environ.update(envs[mode])
+            sys.path.insert(0, BACKEND_DIR)
+            results[mode] = asyncio.run(run_asgi(args, images))
+        else:
+            results[mode] = asyncio.run(run_uvicorn(args, {**os.environ, **envs[mode]}, images))
+
+    report = {
+        "config": {key: getattr(args, key) for key in ("concurrency", "requests", "employees", "team_size", "chain", "expenses", "bcrypt_rounds")},
+        "database": (args.database_url or "sqlite").split(":")[0],
+        "host": {"platform": platform.platform(), "cpus": os.cpu_count(), "python": platform.python_version()},
+        "results": results,
+    }
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        changes, regressions = compare(results, baseline, args.tolerance)
+        report["baseline"] = {"path": args.baseline, "tolerance": args.tolerance, "changes": changes, "regressions": regressions}
+    if args.save_baseline:
+        with open(args.baseline, "w") as fh:
+            json.dump(report, fh, indent=2)
+            fh.write("\n")
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text)
+    else:
+        print(text)
+    for r in regressions:
+        print(f"REGRESSION {r['mode']} {r['endpoint']}: {'; '.join(r['reasons'])}", file=sys.stderr)
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
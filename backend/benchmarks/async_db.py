@@ -0,0 +1,195 @@
+"""Compare the hot endpoints with DB_ASYNC=1 (async engine) and DB_ASYNC=0
+(the same queries on the sync engine, run in the threadpool).
+
+Seeds a throwaway SQLite database (or the database in --database-url) with a
+company, a manager who approves every employee's expenses and a set of
+employees, then starts one uvicorn server per mode and drives login, me,
+submit, pending and decide with --concurrency clients each. Prints a JSON
+report with requests per second and p50/p99 latency per endpoint and mode.
+
+    cd backend && python -m benchmarks.async_db [--concurrency 500] [--requests 5000]
+
+Exchange rates come from a generated FX_RATES_FILE, so no network is needed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "bench-password"
+
+
+def prepare_env(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="async-db-bench-")
+    rates_file = os.path.join(workdir, "rates.json")
+    with open(rates_file, "w") as fh:
+        json.dump({"base": "USD", "date": date.today().isoformat(), "rates": {"USD": 1.0, "EUR": 0.9, "INR": 83.0}}, fh)
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{workdir}/bench.db",
+        "FX_RATES_FILE": rates_file,
+        "BCRYPT_ROUNDS": "4",
+        "PASSWORD_HASH_QUEUE_LIMIT": str(args.concurrency),
+    })
+    return env
+
+
+def seed(employees: int) -> list:
+    """Create the company and users; returns the employee emails."""
+    from app.auth import get_password_hash
+    from app.database import SessionLocal, engine
+    from app.models import Base, Company, User
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        hashed = get_password_hash(PASSWORD)
+        company = Company(name="Bench Co", country="US", currency="USD")
+        db.add(company)
+        db.flush()
+        manager = User(name="Manager", email="manager@bench.io", hashed_password=hashed, role="manager",
+                       country="US", currency="USD", company_id=company.id)
+        db.add(manager)
+        db.flush()
+        emails = [f"employee{i}@bench.io" for i in range(employees)]
+        db.add_all(
+            User(name=f"Employee {i}", email=email, hashed_password=hashed, role="employee", country="US",
+                 currency="USD", company_id=company.id, manager_id=manager.id, is_manager_approver=True)
+            for i, email in enumerate(emails)
+        )
+        db.commit()
+        return emails
+    finally:
+        db.close()
+
+
+class Server:
+    def __init__(self, env: dict, port: int):
+        self.url = f"http://127.0.0.1:{port}"
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=env,
+        )
+
+    def wait_ready(self, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(f"{self.url}/health").status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("server did not start")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+async def drive(client: httpx.AsyncClient, concurrency: int, requests: list) -> dict:
+    """Send `requests` ((method, path, kwargs) tuples) from `concurrency` workers."""
+    queue = iter(requests)
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        for method, path, kwargs in queue:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1),
+    }
+
+
+async def run_mode(url: str, emails: list, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        tokens = {}
+        for email in emails + ["manager@bench.io"]:
+            r = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+            tokens[email] = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        manager = tokens["manager@bench.io"]
+        employee = [tokens[e] for e in emails]
+        n = args.requests
+
+        report = {}
+        report["login"] = await drive(client, args.concurrency, [
+            ("POST", "/auth/login", {"json": {"email": emails[i % len(emails)], "password": PASSWORD}}) for i in range(n)
+        ])
+        report["me"] = await drive(client, args.concurrency, [
+            ("GET", "/auth/me", {"headers": employee[i % len(employee)]}) for i in range(n)
+        ])
+        report["submit"] = await drive(client, args.concurrency, [
+            ("POST", "/expenses/", {"headers": employee[i % len(employee)], "json": {
+                "amount": 10 + i % 90, "currency": "EUR", "category": "travel", "description": f"bench {i}",
+            }}) for i in range(n)
+        ])
+        report["pending"] = await drive(client, args.concurrency, [
+            ("GET", "/expenses/approvals/pending", {"headers": employee[i % len(employee)]}) for i in range(n)
+        ])
+        pending = (await client.get("/expenses/approvals/pending", headers=manager)).json()
+        report["decide"] = await drive(client, args.concurrency, [
+            ("POST", f"/expenses/approvals/{a['expense_id']}/decide", {"headers": manager, "json": {"approve": True}})
+            for a in pending[:n]
+        ])
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000, help="requests per endpoint and mode")
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--database-url", help="sync SQLAlchemy URL of an empty database (default: temp SQLite)")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    env = prepare_env(args)
+    os.environ.update(env)
+    sys.path.insert(0, BACKEND_DIR)
+    emails = seed(args.employees)
+
+    results = {}
+    for mode, flag in (("sync", "0"), ("async", "1")):
+        server = Server({**env, "DB_ASYNC": flag}, args.port)
+        try:
+            server.wait_ready()
+            results[mode] = asyncio.run(run_mode(server.url, emails, args))
+        finally:
+            server.stop()
+    print(json.dumps({
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "database": env["DATABASE_URL"].split(":")[0],
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
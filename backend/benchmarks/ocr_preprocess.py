@@ -0,0 +1,110 @@
+"""Compare receipt OCR latency and field accuracy with and without preprocessing.
+
+Renders the receipts described in receipt_samples.json as 12 MP phone-style
+JPEGs (skewed, with EXIF orientation), runs them through the OCR worker
+function once per mode and prints a JSON report, including how much
+preprocessing changes the share of vendor, date and total amount fields
+read correctly ("accuracy_delta").
+
+    cd backend && python -m benchmarks.ocr_preprocess [--repeat 3] [--engine tesseract]
+
+With the stub engine (no tesseract installed) the text comes from the JPEG
+comment, so only the latency numbers are meaningful.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+
+from mysql_auth import receipts
+from mysql_auth.preprocess import PreprocessConfig
+
+SAMPLES_FILE = os.path.join(os.path.dirname(__file__), "receipt_samples.json")
+
+# Inverse of the transpose ImageOps.exif_transpose applies for each tag
+_STORE_TRANSPOSE = {3: Image.Transpose.ROTATE_180, 6: Image.Transpose.ROTATE_90, 8: Image.Transpose.ROTATE_270}
+
+
+def render_sample(sample: dict, size=(3024, 4032)) -> bytes:
+    image = Image.new("L", size, 245)
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=110)
+    except TypeError:
+        font = ImageFont.load_default()
+    y = 300
+    for line in sample["lines"]:
+        draw.text((250, y), line, fill=20, font=font)
+        y += 170
+    if sample.get("rotate"):
+        image = image.rotate(sample["rotate"], resample=Image.Resampling.BICUBIC, fillcolor=245)
+    orientation = sample.get("orientation", 1)
+    if orientation in _STORE_TRANSPOSE:
+        image = image.transpose(_STORE_TRANSPOSE[orientation])
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    out = BytesIO()
+    image.convert("RGB").save(out, "JPEG", quality=90, exif=exif, comment="\n".join(sample["lines"]).encode())
+    return out.getvalue()
+
+
+def score(parsed: dict, expected: dict) -> dict:
+    return {k: parsed.get(k) == v for k, v in expected.items()}
+
+
+def run_mode(samples, blobs, engine: str, config: PreprocessConfig, repeat: int) -> dict:
+    receipts._engine = engine
+    receipts._preprocess = config
+    latencies, hits = [], {}
+    for sample, blob in zip(samples, blobs):
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = receipts.run_ocr(blob)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        for field, ok in score(result["parsed"], sample["expected"]).items():
+            hits.setdefault(field, []).append(ok)
+    latencies.sort()
+    return {
+        "runs": len(latencies),
+        "mean_ms": round(statistics.mean(latencies), 1),
+        "p50_ms": round(latencies[len(latencies) // 2], 1),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+        "field_accuracy": round(sum(map(sum, hits.values())) / sum(map(len, hits.values())), 3),
+        "accuracy_by_field": {field: round(sum(oks) / len(oks), 3) for field, oks in hits.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--engine", default=None, help="tesseract or stub (default: auto-detect)")
+    parser.add_argument("--deskew", action="store_true")
+    args = parser.parse_args()
+
+    from mysql_auth.app import TESSERACT_CMD, TESSDATA_PREFIX
+
+    engine = args.engine or receipts.resolve_engine(TESSERACT_CMD)
+    receipts._init_worker(engine, TESSERACT_CMD, TESSDATA_PREFIX, PreprocessConfig())
+
+    with open(SAMPLES_FILE) as fh:
+        samples = json.load(fh)
+    blobs = [render_sample(s) for s in samples]
+
+    raw = run_mode(samples, blobs, engine, PreprocessConfig(enabled=False), args.repeat)
+    preprocessed = run_mode(samples, blobs, engine, PreprocessConfig(enabled=True, deskew=args.deskew), args.repeat)
+    report = {
+        "engine": engine,
+        "samples": len(samples),
+        "raw": raw,
+        "preprocessed": preprocessed,
+        "accuracy_delta": round(preprocessed["field_accuracy"] - raw["field_accuracy"], 3),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,35 @@
+import json
 import os
-import re
-from datetime import datetime
-import secrets
-import requests
-import bcrypt
+import time
+from contextlib import closing, contextmanager
+from datetime import date, datetime
+from types import MappingProxyType
+from typing import Mapping
 import mysql.connector
-from mysql.connector import pooling
-from fastapi import FastAPI, HTTPException, Request, Header, UploadFile, File
+from fastapi import Depends, FastAPI, HTTPException, Request, Header, Query, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from dotenv import load_dotenv
-import pytesseract
+from io import BytesIO
 from PIL import Image
 
+from app.approvals import ApprovalPolicy, PolicyCache
+from app.auth import hash_password, verify_and_update_password
+from app.countries import get_catalogue
+from app.fx import FxRates
+from app.config import APPROVAL_POLICY_RECHECK_SECONDS, EXPORT_BATCH_SIZE
+from app.export import EXPENSE_EXPORT_COLUMNS, export_response
+from app.pagination import decode_cursor, encode_cursor
+from app.principals import principal_cache
+from .fx_store import MySQLSnapshotStore
+from .receipts import BatchTooLarge, OcrQueueFull, expand_batch, ocr_service, parse_receipt_date
+from .pool import BlockingPool, PoolExhausted
+from .migrations import migrate
+from .reconcile import reconcile_expenses
+from .sessions import SessionSweeper, create_session, find_session, revoke_session
+
 load_dotenv()
 
 MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
@@ -29,14 +45,27 @@ ALLOWED_ORIGINS = os.getenv(
 
 TESSERACT_CMD = os.getenv("TESSERACT_CMD", r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe")
 TESSDATA_PREFIX = os.getenv("TESSDATA_PREFIX", r"C:\\Program Files\\Tesseract-OCR\\tessdata")
-pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
-os.environ["TESSDATA_PREFIX"] = TESSDATA_PREFIX
 
-POOL: pooling.MySQLConnectionPool | None = None
+# Connection pool: checkout waits up to MYSQL_POOL_TIMEOUT seconds, then the
+# request gets a 503. MYSQL_POOL_PRE_PING is always, idle or never.
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "5"))
+MYSQL_POOL_MAX_OVERFLOW = int(os.getenv("MYSQL_POOL_MAX_OVERFLOW", "5"))
+MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "30"))
+MYSQL_POOL_RECYCLE = float(os.getenv("MYSQL_POOL_RECYCLE", "1800"))
+MYSQL_POOL_PRE_PING = os.getenv("MYSQL_POOL_PRE_PING", "idle").lower()
+MYSQL_POOL_PING_IDLE_SECONDS = float(os.getenv("MYSQL_POOL_PING_IDLE_SECONDS", "30"))
+MYSQL_POOL_WARM = int(os.getenv("MYSQL_POOL_WARM", str(MYSQL_POOL_SIZE)))
 
-def get_conn():
-    if POOL is not None:
-        return POOL.get_connection()
+# Login sessions last MYSQL_SESSION_TTL_SECONDS; expired ones are deleted every
+# MYSQL_SESSION_SWEEP_SECONDS (0 disables), MYSQL_SESSION_SWEEP_BATCH rows at a time
+MYSQL_SESSION_TTL_SECONDS = int(os.getenv("MYSQL_SESSION_TTL_SECONDS", "43200"))
+MYSQL_SESSION_SWEEP_SECONDS = float(os.getenv("MYSQL_SESSION_SWEEP_SECONDS", "300"))
+MYSQL_SESSION_SWEEP_BATCH = int(os.getenv("MYSQL_SESSION_SWEEP_BATCH", "1000"))
+
+# Approval policies per company, checked against companies.approval_version
+policy_cache = PolicyCache(APPROVAL_POLICY_RECHECK_SECONDS)
+
+def connect():
     return mysql.connector.connect(
         host=MYSQL_HOST,
         port=MYSQL_PORT,
@@ -46,6 +75,74 @@ def get_conn():
         auth_plugin='mysql_native_password'
     )
 
+POOL = BlockingPool(
+    connect,
+    size=MYSQL_POOL_SIZE,
+    max_overflow=MYSQL_POOL_MAX_OVERFLOW,
+    timeout=MYSQL_POOL_TIMEOUT,
+    recycle=MYSQL_POOL_RECYCLE,
+    pre_ping=MYSQL_POOL_PRE_PING,
+    ping_idle=MYSQL_POOL_PING_IDLE_SECONDS,
+)
+
+def get_conn():
+    try:
+        return POOL.get_connection()
+    except PoolExhausted:
+        raise
+    except Exception:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+
+@contextmanager
+def connection():
+    """A pooled connection that goes back to the pool on every exit path.
+
+    The pool rolls back a transaction left open by an error.
+    """
+    conn = get_conn()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+class RequestDB:
+    """One connection per request, shared by authentication and the handler.
+
+    It is checked out on first use, so requests served from the principal
+    cache that never touch the database don't take one. `release()` hands it
+    back early (before bcrypt or streaming); a later use checks out again.
+    """
+
+    def __init__(self):
+        self._conn = None
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = get_conn()
+        return self._conn
+
+    def cursor(self, **kwargs):
+        return closing(self.conn.cursor(**kwargs))
+
+    def commit(self):
+        self.conn.commit()
+
+    def release(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.close()
+
+def request_db():
+    db = RequestDB()
+    try:
+        yield db
+    finally:
+        db.release()
+
+session_sweeper = SessionSweeper(connection, MYSQL_SESSION_SWEEP_SECONDS, MYSQL_SESSION_SWEEP_BATCH)
+# FX snapshots live in this database, not the SQLAlchemy app's
+fx_rates = FxRates(MySQLSnapshotStore(connection))
 def ensure_database_exists():
     try:
         server_conn = mysql.connector.connect(
@@ -55,106 +152,152 @@ def ensure_database_exists():
             password=MYSQL_PASSWORD,
             auth_plugin='mysql_native_password'
         )
-        cur = server_conn.cursor()
-        cur.execute(f"CREATE DATABASE IF NOT EXISTS `{MYSQL_DATABASE}` DEFAULT CHARACTER SET utf8mb4")
-        server_conn.commit()
-        cur.close(); server_conn.close()
+        with closing(server_conn), closing(server_conn.cursor()) as cur:
+            cur.execute(f"CREATE DATABASE IF NOT EXISTS `{MYSQL_DATABASE}` DEFAULT CHARACTER SET utf8mb4")
+            server_conn.commit()
     except Exception as e:
         print(f"Database ensure error: {e}")
 
 def init_schema():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS companies (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            country VARCHAR(255) NOT NULL,
-            currency VARCHAR(64) NOT NULL,
-            cfo_user_id INT NULL
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            email VARCHAR(255) NOT NULL UNIQUE,
-            password_hash VARCHAR(255) NOT NULL,
-            role ENUM('admin','manager','employee') NOT NULL,
-            country VARCHAR(255) NOT NULL,
-            currency VARCHAR(64) NOT NULL,
-            manager_id INT NULL,
-            company_id INT NULL,
-            is_manager_approver BOOLEAN DEFAULT FALSE,
-            auth_token TEXT,
-            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE SET NULL
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS approver_assignments (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            company_id INT NOT NULL,
-            approver_id INT NOT NULL,
-            step_order INT NOT NULL,
-            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
-            FOREIGN KEY (approver_id) REFERENCES users(id) ON DELETE CASCADE
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            employee_id INT NOT NULL,
-            amount DECIMAL(12,2) NOT NULL,
-            description TEXT,
-            category VARCHAR(100),
-            date DATE,
-            currency VARCHAR(64) NOT NULL,
-            status ENUM('Pending','Approved','Rejected') DEFAULT 'Pending',
-            manager_comment TEXT,
-            company_id INT,
-            FOREIGN KEY (employee_id) REFERENCES users(id) ON DELETE CASCADE,
-            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE SET NULL
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS approvals (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            expense_id INT NOT NULL,
-            approver_id INT NOT NULL,
-            step_order INT NOT NULL,
-            decision ENUM('Pending','Approved','Rejected') DEFAULT 'Pending',
-            comment TEXT,
-            decided_at DATETIME NULL,
-            FOREIGN KEY (expense_id) REFERENCES expenses(id) ON DELETE CASCADE,
-            FOREIGN KEY (approver_id) REFERENCES users(id) ON DELETE CASCADE
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS approval_rules (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            company_id INT NOT NULL,
-            percentage_threshold INT DEFAULT 60,
-            cfo_user_id INT NULL,
-            hybrid BOOLEAN DEFAULT FALSE,
-            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
-            FOREIGN KEY (cfo_user_id) REFERENCES users(id) ON DELETE SET NULL
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    with connection() as conn, closing(conn.cursor()) as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS companies (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                country VARCHAR(255) NOT NULL,
+                currency VARCHAR(64) NOT NULL,
+                cfo_user_id INT NULL,
+                approval_version INT NOT NULL DEFAULT 0
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                email VARCHAR(255) NOT NULL UNIQUE,
+                password_hash VARCHAR(255) NOT NULL,
+                role ENUM('admin','manager','employee') NOT NULL,
+                country VARCHAR(255) NOT NULL,
+                currency VARCHAR(64) NOT NULL,
+                manager_id INT NULL,
+                company_id INT NULL,
+                is_manager_approver BOOLEAN DEFAULT FALSE,
+                FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE SET NULL
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                token_hash BINARY(32) PRIMARY KEY,
+                user_id INT NOT NULL,
+                created_at DATETIME NOT NULL,
+                expires_at DATETIME NOT NULL,
+                user_agent VARCHAR(255) NULL,
+                ip_address VARCHAR(45) NULL,
+                INDEX ix_sessions_expires_at (expires_at),
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS approver_assignments (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                company_id INT NOT NULL,
+                approver_id INT NOT NULL,
+                step_order INT NOT NULL,
+                FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
+                FOREIGN KEY (approver_id) REFERENCES users(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS expenses (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                employee_id INT NOT NULL,
+                amount DECIMAL(12,2) NOT NULL,
+                description TEXT,
+                category VARCHAR(100),
+                date DATE,
+                currency VARCHAR(64) NOT NULL,
+                status ENUM('Draft','Pending','Approved','Rejected') DEFAULT 'Pending',
+                manager_comment TEXT,
+                company_id INT,
+                created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                INDEX ix_expenses_employee_created_id (employee_id, created_at, id),
+                INDEX ix_expenses_company_created_id (company_id, created_at, id),
+                FOREIGN KEY (employee_id) REFERENCES users(id) ON DELETE CASCADE,
+                FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE SET NULL
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        # Older databases were created before draft expenses existed
+        cur.execute(
+            "SELECT COLUMN_TYPE FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=%s AND TABLE_NAME='expenses' AND COLUMN_NAME='status'",
+            (MYSQL_DATABASE,)
+        )
+        row = cur.fetchone()
+        if row and "'Draft'" not in str(row[0]):
+            cur.execute("ALTER TABLE expenses MODIFY status ENUM('Draft','Pending','Approved','Rejected') DEFAULT 'Pending'")
+        # ... and before keyset pagination over (created_at, id)
+        cur.execute(
+            "SELECT 1 FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=%s AND TABLE_NAME='expenses' AND COLUMN_NAME='created_at'",
+            (MYSQL_DATABASE,)
+        )
+        if cur.fetchone() is None:
+            cur.execute(
+                "ALTER TABLE expenses ADD COLUMN created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+                "ADD INDEX ix_expenses_employee_created_id (employee_id, created_at, id), "
+                "ADD INDEX ix_expenses_company_created_id (company_id, created_at, id)"
+            )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS approvals (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                expense_id INT NOT NULL,
+                approver_id INT NOT NULL,
+                step_order INT NOT NULL,
+                decision ENUM('Pending','Approved','Rejected') DEFAULT 'Pending',
+                comment TEXT,
+                decided_at DATETIME NULL,
+                FOREIGN KEY (expense_id) REFERENCES expenses(id) ON DELETE CASCADE,
+                FOREIGN KEY (approver_id) REFERENCES users(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS approval_rules (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                company_id INT NOT NULL,
+                percentage_threshold INT DEFAULT 60,
+                cfo_user_id INT NULL,
+                hybrid BOOLEAN DEFAULT FALSE,
+                FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE,
+                FOREIGN KEY (cfo_user_id) REFERENCES users(id) ON DELETE SET NULL
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        # Approval progress counters arrived later; backfill them from the approvals
+        cur.execute(
+            "SELECT 1 FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=%s AND TABLE_NAME='expenses' AND COLUMN_NAME='approved_count'",
+            (MYSQL_DATABASE,)
+        )
+        if cur.fetchone() is None:
+            cur.execute(
+                "ALTER TABLE expenses ADD COLUMN approved_count INT NOT NULL DEFAULT 0, "
+                "ADD COLUMN total_steps INT NOT NULL DEFAULT 0, "
+                "ADD COLUMN current_step INT NULL, "
+                "ADD COLUMN specific_approver_approved BOOLEAN NOT NULL DEFAULT FALSE"
+            )
+            reconcile_expenses(conn, fix=True)
+        conn.commit()
+        migrate(conn, MYSQL_DATABASE)
 
 class SignupRequest(BaseModel):
     name: str
@@ -205,88 +348,100 @@ app.add_middleware(
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(_: Request, exc: HTTPException):
-    return JSONResponse(status_code=exc.status_code, content={"message": exc.detail})
+    return JSONResponse(status_code=exc.status_code, content={"message": exc.detail}, headers=exc.headers)
+
+@app.exception_handler(PoolExhausted)
+async def pool_exhausted_handler(_: Request, exc: PoolExhausted):
+    return JSONResponse(status_code=503, content={"message": "Database busy, retry shortly"}, headers={"Retry-After": "1"})
 
 @app.on_event("startup")
 def on_startup():
     try:
         ensure_database_exists()
-        global POOL
         try:
-            POOL = pooling.MySQLConnectionPool(
-                pool_name="trae_pool",
-                pool_size=int(os.getenv("MYSQL_POOL_SIZE", "5")),
-                host=MYSQL_HOST,
-                port=MYSQL_PORT,
-                user=MYSQL_USER,
-                password=MYSQL_PASSWORD,
-                database=MYSQL_DATABASE,
-                auth_plugin='mysql_native_password'
-            )
+            POOL.warm(MYSQL_POOL_WARM)
         except Exception as e:
-            print(f"Pool init error: {e}")
+            print(f"Pool warm-up error: {e}")
         init_schema()
+        fx_rates.ensure_store()
     except Exception as e:
         print(f"Schema init error: {e}")
+    ocr_service.start(TESSERACT_CMD, TESSDATA_PREFIX)
+    session_sweeper.start()
 
+@app.on_event("shutdown")
+def on_shutdown():
+    session_sweeper.shutdown()
+    ocr_service.shutdown()
+
+def insert_admin(payload: SignupRequest, password_hash: str, db: RequestDB) -> dict:
+    with db.cursor(dictionary=True) as cur:
+        cur.execute("SELECT COUNT(*) AS c FROM users WHERE role='admin'")
+        row = cur.fetchone()
+        if row and row['c'] > 0:
+            raise HTTPException(status_code=403, detail="Admin already exists")
+        cur.execute("SELECT id FROM users WHERE email=%s", (payload.email,))
+        if cur.fetchone():
+            raise HTTPException(status_code=400, detail="Email already exists")
+        company_name = payload.company_name or f"{payload.name}'s Company"
+        cur.execute(
+            "INSERT INTO companies (name, country, currency) VALUES (%s,%s,%s)",
+            (company_name, payload.country, payload.currency)
+        )
+        db.commit()
+        cur.execute("SELECT LAST_INSERT_ID() AS id")
+        company_id = cur.fetchone()["id"]
+        cur.execute(
+            "INSERT INTO users (name, email, password_hash, role, country, currency, company_id, is_manager_approver) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)",
+            (payload.name, payload.email, password_hash, 'admin', payload.country, payload.currency, company_id, True)
+        )
+        db.commit()
+        cur.execute("SELECT id, name, email, role, country, currency FROM users WHERE email=%s", (payload.email,))
+        return cur.fetchone()
+
+# The async handlers below await bcrypt, so every query they make runs in the
+# threadpool: a pool checkout can block, and blocking the event loop on it
+# would stall the very requests that are due to give connections back.
 @app.post('/auth/signup')
-def admin_signup(payload: SignupRequest):
-    try:
-        conn = get_conn()
-    except Exception:
-        raise HTTPException(status_code=503, detail="Database unavailable")
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT COUNT(*) AS c FROM users WHERE role='admin'")
-    row = cur.fetchone()
-    if row and row['c'] > 0:
-        cur.close(); conn.close()
-        raise HTTPException(status_code=403, detail="Admin already exists")
-    cur.execute("SELECT id FROM users WHERE email=%s", (payload.email,))
-    if cur.fetchone():
-        cur.close(); conn.close()
-        raise HTTPException(status_code=400, detail="Email already exists")
-    password_hash = bcrypt.hashpw(payload.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    company_name = payload.company_name or f"{payload.name}'s Company"
-    cur.execute(
-        "INSERT INTO companies (name, country, currency) VALUES (%s,%s,%s)",
-        (company_name, payload.country, payload.currency)
-    )
-    conn.commit()
-    cur.execute("SELECT LAST_INSERT_ID() AS id")
-    company_id = cur.fetchone()["id"]
-    cur.execute(
-        "INSERT INTO users (name, email, password_hash, role, country, currency, company_id, is_manager_approver) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)",
-        (payload.name, payload.email, password_hash, 'admin', payload.country, payload.currency, company_id, True)
-    )
-    conn.commit()
-    cur.execute("SELECT id, name, email, role, country, currency FROM users WHERE email=%s", (payload.email,))
-    user = cur.fetchone()
-    cur.close(); conn.close()
+async def admin_signup(payload: SignupRequest, db: RequestDB = Depends(request_db)):
+    # Hash before checking out a connection so it isn't held during bcrypt
+    password_hash = await hash_password(payload.password)
+    user = await run_in_threadpool(insert_admin, payload, password_hash, db)
     return {"message":"Signup successful","user":user}
 
-@app.post('/auth/login')
-def login(payload: LoginRequest):
+def find_login_user(email: str, db: RequestDB) -> dict | None:
     try:
-        conn = get_conn()
-    except Exception:
-        raise HTTPException(status_code=503, detail="Database unavailable")
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT id, name, email, password_hash, role, country, currency, auth_token, company_id FROM users WHERE email=%s", (payload.email,))
-    user = cur.fetchone()
+        with db.cursor(dictionary=True) as cur:
+            cur.execute("SELECT id, name, email, password_hash, role, country, currency, company_id FROM users WHERE email=%s", (email,))
+            return cur.fetchone()
+    finally:
+        # Don't hold the connection while bcrypt runs
+        db.release()
+
+def open_session(user_id: int, new_hash: str | None, request: Request, db: RequestDB) -> str:
+    # A fresh session per login, so each device gets its own token and expiry
+    with db.cursor() as cur:
+        if new_hash:
+            cur.execute("UPDATE users SET password_hash=%s WHERE id=%s", (new_hash, user_id))
+        token = create_session(
+            cur, user_id, MYSQL_SESSION_TTL_SECONDS,
+            user_agent=request.headers.get("user-agent"),
+            ip_address=request.client.host if request.client else None,
+        )
+    db.commit()
+    return token
+
+@app.post('/auth/login')
+async def login(payload: LoginRequest, request: Request, db: RequestDB = Depends(request_db)):
+    user = await run_in_threadpool(find_login_user, payload.email, db)
     if not user:
-        cur.close(); conn.close()
         raise HTTPException(status_code=401, detail="Invalid credentials")
     if user['role'] not in ('admin','manager','employee'):
-        cur.close(); conn.close()
         raise HTTPException(status_code=403, detail="Invalid role")
-    if not bcrypt.checkpw(payload.password.encode('utf-8'), user['password_hash'].encode('utf-8')):
-        cur.close(); conn.close()
+    valid, new_hash = await verify_and_update_password(payload.password, user['password_hash'])
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = user['auth_token'] or secrets.token_urlsafe(32)
-    if not user['auth_token']:
-        cur.execute("UPDATE users SET auth_token=%s WHERE id=%s", (token, user['id']))
-        conn.commit()
-    cur.close(); conn.close()
+    token = await run_in_threadpool(open_session, user['id'], new_hash, request, db)
     return {
         "message":"Login successful",
         "access_token": token,
@@ -301,218 +456,450 @@ def login(payload: LoginRequest):
         }
     }
 
-def auth_user_from_header(authorization: str | None) -> dict:
+def bearer_token(authorization: str | None) -> str:
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
     parts = authorization.split()
     if len(parts) == 2 and parts[0].lower() == "bearer":
-        token = parts[1]
-    else:
-        token = authorization
-    try:
-        conn = get_conn()
-    except Exception:
-        raise HTTPException(status_code=503, detail="Database unavailable")
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT id, name, email, role, country, currency, manager_id, company_id FROM users WHERE auth_token=%s", (token,))
-    user = cur.fetchone()
-    cur.close(); conn.close()
-    if not user:
+        return parts[1]
+    return authorization
+
+def auth_user_from_header(authorization: str | None, db: RequestDB) -> Mapping:
+    token = bearer_token(authorization)
+    user = principal_cache.get(token)
+    if user is not None:
+        return user
+    with db.cursor(dictionary=True) as cur:
+        row = find_session(cur, token)
+    if not row:
         raise HTTPException(status_code=401, detail="Invalid token")
+    # Never cached past the session's own expiry
+    expires_in = row.pop('expires_in')
+    user = MappingProxyType(row)
+    principal_cache.put(token, user['id'], user, expires_in=expires_in)
     return user
 
+def current_user(authorization: str | None = Header(None), db: RequestDB = Depends(request_db)) -> Mapping:
+    """Authenticated user, looked up on the request's shared connection."""
+    return auth_user_from_header(authorization, db)
+
+@app.post('/auth/logout')
+def logout(authorization: str | None = Header(None), db: RequestDB = Depends(request_db)):
+    token = bearer_token(authorization)
+    with db.cursor() as cur:
+        revoked = revoke_session(cur, token)
+    db.commit()
+    # Other workers keep serving their cached copy until PRINCIPAL_CACHE_TTL_SECONDS
+    principal_cache.invalidate_token(token)
+    if not revoked:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return {"message": "Logged out"}
+
+def insert_user(payload: CreateUserRequest, password_hash: str, company_id: int, db: RequestDB) -> dict:
+    with db.cursor(dictionary=True) as cur:
+        cur.execute("SELECT id FROM users WHERE email=%s", (payload.email,))
+        if cur.fetchone():
+            raise HTTPException(status_code=400, detail="Email already exists")
+        cur.execute(
+            "INSERT INTO users (name, email, password_hash, role, country, currency, manager_id, company_id) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)",
+            (payload.name, payload.email, password_hash, payload.role, payload.country, payload.currency, payload.manager_id, company_id)
+        )
+        db.commit()
+        cur.execute("SELECT id, name, email, role, country, currency, manager_id FROM users WHERE email=%s", (payload.email,))
+        return cur.fetchone()
+
 @app.post('/admin/users')
-def create_user(payload: CreateUserRequest, authorization: str | None = Header(None)):
-    admin = auth_user_from_header(authorization)
+async def create_user(payload: CreateUserRequest, admin: Mapping = Depends(current_user), db: RequestDB = Depends(request_db)):
     if admin['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     if payload.role not in ('manager','employee'):
         raise HTTPException(status_code=400, detail="Invalid role")
-    try:
-        conn = get_conn()
-    except Exception:
-        raise HTTPException(status_code=503, detail="Database unavailable")
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT id FROM users WHERE email=%s", (payload.email,))
-    if cur.fetchone():
-        cur.close(); conn.close();
-        raise HTTPException(status_code=400, detail="Email already exists")
-    password_hash = bcrypt.hashpw(payload.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    cur.execute(
-        "INSERT INTO users (name, email, password_hash, role, country, currency, manager_id, company_id) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)",
-        (payload.name, payload.email, password_hash, payload.role, payload.country, payload.currency, payload.manager_id, admin['company_id'])
-    )
-    conn.commit()
-    cur.execute("SELECT id, name, email, role, country, currency, manager_id FROM users WHERE email=%s", (payload.email,))
-    user = cur.fetchone()
-    cur.close(); conn.close()
+    # Don't hold the connection while bcrypt runs
+    await run_in_threadpool(db.release)
+    password_hash = await hash_password(payload.password)
+    user = await run_in_threadpool(insert_user, payload, password_hash, admin['company_id'], db)
     return {"message":"User created","user":user}
 
 @app.get('/admin/users')
-def list_users(authorization: str | None = Header(None)):
-    admin = auth_user_from_header(authorization)
+def list_users(admin: Mapping = Depends(current_user), db: RequestDB = Depends(request_db)):
     if admin['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
-    conn = get_conn(); cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT id, name, email, role, country, currency, manager_id FROM users WHERE company_id=%s", (admin['company_id'],))
-    users = cur.fetchall()
-    cur.close(); conn.close()
+    with db.cursor(dictionary=True) as cur:
+        cur.execute("SELECT id, name, email, role, country, currency, manager_id FROM users WHERE company_id=%s", (admin['company_id'],))
+        users = cur.fetchall()
     return {"users": users}
 
+# Columns a caller may project with ?fields=a,b,c
+EXPENSE_COLUMNS = (
+    "id", "employee_id", "company_id", "amount", "currency", "category", "description",
+    "date", "status", "manager_comment", "created_at",
+)
+
 @app.get('/admin/expenses')
-def list_expenses(authorization: str | None = Header(None)):
-    admin = auth_user_from_header(authorization)
+def list_expenses(
+    status: str | None = None,
+    category: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    min_amount: float | None = None,
+    max_amount: float | None = None,
+    employee_id: int | None = None,
+    fields: str | None = None,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    admin: Mapping = Depends(current_user),
+    db: RequestDB = Depends(request_db),
+):
+    """Company expenses, newest first, keyset-paginated over (created_at, id).
+
+    min_amount/max_amount compare the amount as submitted, in each expense's
+    own currency: this schema stores no converted amount to filter on.
+    """
     if admin['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
-    conn = get_conn(); cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT * FROM expenses WHERE company_id=%s", (admin['company_id'],))
-    expenses = cur.fetchall()
-    cur.close(); conn.close()
-    return {"expenses": expenses}
+    columns = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(EXPENSE_COLUMNS)
+    unknown = [c for c in columns if c not in EXPENSE_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    where = ["company_id=%s"]
+    params: list = [admin['company_id']]
+    for clause, value in (
+        ("status=%s", status),
+        ("category=%s", category),
+        ("date>=%s", date_from),
+        ("date<=%s", date_to),
+        ("amount>=%s", min_amount),
+        ("amount<=%s", max_amount),
+        ("employee_id=%s", employee_id),
+    ):
+        if value is not None:
+            where.append(clause)
+            params.append(value)
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        where.append("(created_at < %s OR (created_at = %s AND id < %s))")
+        params += [created_at, created_at, last_id]
+    selected = list(dict.fromkeys(columns + ["created_at", "id"]))
+    with db.cursor(dictionary=True) as cur:
+        cur.execute(
+            f"SELECT {', '.join(selected)} FROM expenses WHERE {' AND '.join(where)} "
+            "ORDER BY created_at DESC, id DESC LIMIT %s",
+            tuple(params + [limit + 1])
+        )
+        rows = cur.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return {"expenses": [{c: row[c] for c in columns} for row in rows], "next_cursor": next_cursor}
+
+# expenses.date is a DATE here, not the DATETIME the app stores
+EXPORT_COLUMNS = [(name, "date" if name == "date" else kind) for name, kind in EXPENSE_EXPORT_COLUMNS]
+
+def iter_export_rows(company_id: int, where: list[str], params: list):
+    """Stream company expenses through an unbuffered cursor.
+
+    The approval trail is a correlated JSON_ARRAYAGG so everything arrives in
+    one result set; the connection can't run other queries until it's drained.
+    """
+    with connection() as conn, closing(conn.cursor(dictionary=True, buffered=False)) as cur:
+        cur.execute("SELECT currency FROM companies WHERE id=%s", (company_id,))
+        company = cur.fetchall()
+        company_currency = company[0]['currency'] if company else None
+        cur.execute(
+            "SELECT e.id, e.employee_id, u.name AS employee_name, e.category, e.description, e.date, "
+            "e.amount, e.currency, e.status, e.created_at, "
+            "(SELECT JSON_ARRAYAGG(JSON_OBJECT('step', a.step_order, 'approver', au.name, 'status', a.decision, "
+            "'comment', a.comment, 'decided_at', a.decided_at)) "
+            " FROM approvals a JOIN users au ON au.id=a.approver_id WHERE a.expense_id=e.id) AS approval_trail "
+            "FROM expenses e JOIN users u ON u.id=e.employee_id "
+            f"WHERE {' AND '.join('e.' + w for w in where)} ORDER BY e.id",
+            tuple(params)
+        )
+        rates: dict = {}
+        while True:
+            batch = cur.fetchmany(EXPORT_BATCH_SIZE)
+            if not batch:
+                break
+            for row in batch:
+                key = (row['currency'], row['date'])
+                if key not in rates:
+                    try:
+                        rates[key] = fx_rates.get_rate(row['currency'], company_currency, row['date']) if company_currency else None
+                    except Exception:
+                        rates[key] = None
+                rate = rates[key]
+                trail = json.loads(row['approval_trail']) if row['approval_trail'] else []
+                row['approval_trail'] = sorted(trail, key=lambda a: a['step'])
+                row['amount'] = float(row['amount'])
+                row['normalized_amount'] = round(row['amount'] * rate, 2) if rate is not None else None
+                row['company_currency'] = company_currency
+                yield row
+
+@app.get('/admin/expenses/export')
+def export_expenses(
+    format: str = Query('csv', pattern='^(csv|ndjson|parquet)$'),
+    gzip: bool = False,
+    status: str | None = None,
+    category: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    employee_id: int | None = None,
+    admin: Mapping = Depends(current_user),
+    db: RequestDB = Depends(request_db),
+):
+    if admin['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    # The export streams on its own connection
+    db.release()
+    where = ["company_id=%s"]
+    params: list = [admin['company_id']]
+    for clause, value in (
+        ("status=%s", status),
+        ("category=%s", category),
+        ("date>=%s", date_from),
+        ("date<=%s", date_to),
+        ("employee_id=%s", employee_id),
+    ):
+        if value is not None:
+            where.append(clause)
+            params.append(value)
+    rows = iter_export_rows(admin['company_id'], where, params)
+    return export_response(rows, EXPORT_COLUMNS, format, gzip, f"expenses-{admin['company_id']}")
 
 @app.put('/admin/rules')
-def update_rules(payload: RuleUpdate, authorization: str | None = Header(None)):
-    admin = auth_user_from_header(authorization)
+def update_rules(payload: RuleUpdate, admin: Mapping = Depends(current_user), db: RequestDB = Depends(request_db)):
     if admin['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
-    conn = get_conn(); cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT id FROM approval_rules WHERE company_id=%s", (admin['company_id'],))
-    row = cur.fetchone()
-    if not row:
-        cur.execute("INSERT INTO approval_rules (company_id) VALUES (%s)", (admin['company_id'],))
-        conn.commit()
+    with db.cursor(dictionary=True) as cur:
         cur.execute("SELECT id FROM approval_rules WHERE company_id=%s", (admin['company_id'],))
         row = cur.fetchone()
-    updates = []
-    params = []
-    if payload.percentage_threshold is not None:
-        updates.append("percentage_threshold=%s"); params.append(payload.percentage_threshold)
-    if payload.cfo_user_id is not None:
-        updates.append("cfo_user_id=%s"); params.append(payload.cfo_user_id)
-    if payload.hybrid is not None:
-        updates.append("hybrid=%s"); params.append(payload.hybrid)
-    if updates:
-        params.append(admin['company_id'])
-        cur.execute(f"UPDATE approval_rules SET {', '.join(updates)} WHERE company_id=%s", tuple(params))
-        conn.commit()
-    cur.close(); conn.close()
+        if not row:
+            cur.execute("INSERT INTO approval_rules (company_id) VALUES (%s)", (admin['company_id'],))
+            db.commit()
+            cur.execute("SELECT id FROM approval_rules WHERE company_id=%s", (admin['company_id'],))
+            row = cur.fetchone()
+        updates = []
+        params = []
+        if payload.percentage_threshold is not None:
+            updates.append("percentage_threshold=%s"); params.append(payload.percentage_threshold)
+        if payload.cfo_user_id is not None:
+            updates.append("cfo_user_id=%s"); params.append(payload.cfo_user_id)
+        if payload.hybrid is not None:
+            updates.append("hybrid=%s"); params.append(payload.hybrid)
+        if updates:
+            params.append(admin['company_id'])
+            cur.execute(f"UPDATE approval_rules SET {', '.join(updates)} WHERE company_id=%s", tuple(params))
+            cur.execute("UPDATE companies SET approval_version=approval_version+1 WHERE id=%s", (admin['company_id'],))
+            db.commit()
+            policy_cache.invalidate(admin['company_id'])
     return {"message":"Rules updated"}
 
 @app.post('/expenses')
-def create_expense(payload: ExpenseCreate, authorization: str | None = Header(None)):
-    user = auth_user_from_header(authorization)
+def create_expense(payload: ExpenseCreate, user: Mapping = Depends(current_user), db: RequestDB = Depends(request_db)):
     if user['id'] != payload.employee_id:
         raise HTTPException(status_code=403, detail="Cannot create for other user")
-    conn = get_conn(); cur = conn.cursor(dictionary=True)
     company_id = user['company_id']
-    cur.execute(
-        "INSERT INTO expenses (employee_id, amount, description, category, date, currency, status, company_id) VALUES (%s,%s,%s,%s,%s,%s,'Pending',%s)",
-        (payload.employee_id, payload.amount, payload.description, payload.category, payload.date, payload.currency, company_id)
-    )
-    conn.commit()
-    cur.execute("SELECT LAST_INSERT_ID() AS id")
-    expense_id = cur.fetchone()["id"]
-    if user.get('is_manager_approver') and user.get('manager_id'):
-        cur.execute("INSERT INTO approvals (expense_id, approver_id, step_order) VALUES (%s,%s,%s)", (expense_id, user['manager_id'], 1))
-    else:
-        cur.execute("SELECT approver_id, step_order FROM approver_assignments WHERE company_id=%s ORDER BY step_order", (company_id,))
-        assignments = cur.fetchall()
-        for a in assignments:
-            cur.execute("INSERT INTO approvals (expense_id, approver_id, step_order) VALUES (%s,%s,%s)", (expense_id, a['approver_id'], a['step_order']))
-    conn.commit()
-    cur.close(); conn.close()
+    with db.cursor(dictionary=True) as cur:
+        if user.get('is_manager_approver') and user.get('manager_id'):
+            steps = [(user['manager_id'], 1)]
+        else:
+            steps = list(company_policy(cur, company_id).steps)
+        cur.execute(
+            "INSERT INTO expenses (employee_id, amount, description, category, date, currency, status, company_id, total_steps, current_step) "
+            "VALUES (%s,%s,%s,%s,%s,%s,'Pending',%s,%s,%s)",
+            (payload.employee_id, payload.amount, payload.description, payload.category, payload.date, payload.currency, company_id,
+             len(steps), steps[0][1] if steps else None)
+        )
+        cur.execute("SELECT LAST_INSERT_ID() AS id")
+        expense_id = cur.fetchone()["id"]
+        if steps:
+            cur.executemany(
+                "INSERT INTO approvals (expense_id, approver_id, step_order) VALUES (%s,%s,%s)",
+                [(expense_id, approver_id, step_order) for approver_id, step_order in steps]
+            )
+        db.commit()
     return {"message":"Expense created","expense_id": expense_id}
 
-def evaluate_expense_status(conn, expense_id, company_id):
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT percentage_threshold, cfo_user_id, hybrid FROM approval_rules WHERE company_id=%s", (company_id,))
-    rules = cur.fetchone() or {"percentage_threshold": 60, "cfo_user_id": None, "hybrid": False}
-    cur.execute("SELECT decision, approver_id FROM approvals WHERE expense_id=%s", (expense_id,))
-    approvals = cur.fetchall()
-    total = len(approvals)
-    approved = sum(1 for a in approvals if a['decision'] == 'Approved')
-    cfo_approved = any(a['approver_id'] == rules.get('cfo_user_id') and a['decision'] == 'Approved' for a in approvals if rules.get('cfo_user_id'))
-    majority_ok = total > 0 and (approved / total) * 100 >= (rules.get('percentage_threshold') or 60)
-    final_approved = majority_ok or (rules.get('hybrid') and cfo_approved) or (not rules.get('hybrid') and cfo_approved)
-    status = 'Approved' if final_approved else 'Pending'
-    cur.execute("UPDATE expenses SET status=%s WHERE id=%s", (status, expense_id))
-    conn.commit()
-    cur.close()
+def company_policy(cur, company_id) -> ApprovalPolicy:
+    """Cached approver steps and rule for a company; `cur` must be a dictionary cursor."""
+    def version():
+        cur.execute("SELECT approval_version FROM companies WHERE id=%s", (company_id,))
+        row = cur.fetchone()
+        return row['approval_version'] if row else 0
+
+    def load(version):
+        cur.execute("SELECT approver_id, step_order FROM approver_assignments WHERE company_id=%s ORDER BY step_order", (company_id,))
+        steps = tuple((a['approver_id'], a['step_order']) for a in cur.fetchall())
+        cur.execute("SELECT percentage_threshold, cfo_user_id, hybrid FROM approval_rules WHERE company_id=%s", (company_id,))
+        rules = cur.fetchone() or {"percentage_threshold": 60, "cfo_user_id": None, "hybrid": False}
+        return ApprovalPolicy(
+            company_id=company_id,
+            version=version,
+            steps=steps,
+            percentage_threshold=rules['percentage_threshold'],
+            specific_approver_id=rules['cfo_user_id'],
+            hybrid=bool(rules['hybrid']),
+        )
+
+    return policy_cache.get(company_id, version, load)
+
+def evaluate_expense_status(cur, ap, decision, company_id):
+    """Fold one decision into the expense's counters and status with a single UPDATE.
+
+    MySQL applies SET assignments left to right, so the status test sees the
+    counters already updated. Decisions can be changed, hence the delta.
+    """
+    policy = company_policy(cur, company_id)
+    delta = int(decision == 'Approved') - int(ap['decision'] == 'Approved')
+    is_specific = policy.specific_approver_id is not None and ap['approver_id'] == policy.specific_approver_id
+    cur.execute(
+        "UPDATE expenses SET "
+        "approved_count = approved_count + %s, "
+        "specific_approver_approved = IF(%s, %s, specific_approver_approved), "
+        "current_step = (SELECT MIN(step_order) FROM approvals WHERE expense_id=%s AND decision='Pending'), "
+        "status = IF((total_steps > 0 AND approved_count * 100 >= %s * total_steps) OR specific_approver_approved, 'Approved', 'Pending') "
+        "WHERE id=%s",
+        (delta, is_specific, decision == 'Approved', ap['expense_id'], policy.percentage_threshold or 60, ap['expense_id'])
+    )
 
 @app.post('/expenses/{expense_id}/decision')
-def approve_expense(expense_id: int, payload: ApprovalDecision, authorization: str | None = Header(None)):
-    approver = auth_user_from_header(authorization)
+def approve_expense(expense_id: int, payload: ApprovalDecision, approver: Mapping = Depends(current_user), db: RequestDB = Depends(request_db)):
     if approver['role'] not in ('manager','admin','employee'):
         raise HTTPException(status_code=403, detail="Invalid role")
-    conn = get_conn(); cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT * FROM approvals WHERE expense_id=%s AND approver_id=%s", (expense_id, approver['id']))
-    ap = cur.fetchone()
-    if not ap:
-        cur.close(); conn.close();
-        raise HTTPException(status_code=404, detail="No approval step for user")
     if payload.decision not in ('Approved','Rejected'):
-        cur.close(); conn.close();
         raise HTTPException(status_code=400, detail="Invalid decision")
-    cur.execute("UPDATE approvals SET decision=%s, comment=%s, decided_at=%s WHERE id=%s", (payload.decision, payload.comment, datetime.utcnow(), ap['id']))
-    conn.commit()
-    cur.execute("SELECT company_id FROM expenses WHERE id=%s", (expense_id,))
-    company_row = cur.fetchone()
-    company_id = company_row['company_id'] if company_row else None
-    evaluate_expense_status(conn, expense_id, company_id)
-    cur.close(); conn.close()
+    with db.cursor(dictionary=True) as cur:
+        # Lock the step (and its expense) until commit: the counter delta is
+        # computed from the previous decision, so two concurrent decisions on
+        # the same step must not both read the same one
+        cur.execute(
+            "SELECT a.*, e.company_id FROM approvals a JOIN expenses e ON e.id=a.expense_id WHERE a.expense_id=%s AND a.approver_id=%s FOR UPDATE",
+            (expense_id, approver['id'])
+        )
+        ap = cur.fetchone()
+        if not ap:
+            raise HTTPException(status_code=404, detail="No approval step for user")
+        cur.execute("UPDATE approvals SET decision=%s, comment=%s, decided_at=%s WHERE id=%s", (payload.decision, payload.comment, datetime.utcnow(), ap['id']))
+        evaluate_expense_status(cur, ap, payload.decision, ap['company_id'])
+        db.commit()
     return {"message":"Decision recorded"}
 
-@app.post('/upload_receipt')
-def upload_receipt(file: UploadFile = File(...)):
+@app.post('/upload_receipt', status_code=202)
+async def upload_receipt(file: UploadFile = File(...)):
+    data = await file.read()
     try:
-        image = Image.open(file.file)
-        text = pytesseract.image_to_string(image)
+        Image.open(BytesIO(data))
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid image")
-    amount_match = re.search(r"(\d+[\.,]\d{2})", text)
-    date_match = re.search(r"(\d{4}-\d{2}-\d{2}|\d{2}/\d{2}/\d{4})", text)
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    vendor = lines[0] if lines else None
-    description = " ".join(lines[:5]) if lines else None
-    return {
-        "message":"Receipt parsed",
-        "parsed": {
-            "amount": float(amount_match.group(1).replace(',', '.')) if amount_match else None,
-            "date": date_match.group(1) if date_match else None,
-            "description": description,
-            "vendor": vendor,
-        }
-    }
+    try:
+        # Hashing and the cache lookup block, so keep them off the loop
+        job = await run_in_threadpool(ocr_service.submit, data, file.filename)
+    except OcrQueueFull:
+        raise HTTPException(status_code=429, detail="OCR queue full", headers={"Retry-After": "5"})
+    return {"message": "Receipt queued", **job.to_dict()}
+
+@app.get('/receipts/jobs/{job_id}')
+async def receipt_job(job_id: str, wait: float = 0):
+    """Job status; `wait` long-polls for up to that many seconds (max 30)."""
+    job = ocr_service.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    await ocr_service.wait(job, min(wait, 30))
+    return job.to_dict()
+
+def create_draft_expenses(user: Mapping, parsed_items: list[dict]) -> int:
+    rows = [
+        (user['id'], p['amount'], p['description'], parse_receipt_date(p['date']), user['currency'], user['company_id'])
+        for p in parsed_items
+        if p.get('amount') is not None
+    ]
+    if not rows:
+        return 0
+    with connection() as conn, closing(conn.cursor()) as cur:
+        cur.executemany(
+            "INSERT INTO expenses (employee_id, amount, description, date, currency, status, company_id) VALUES (%s,%s,%s,%s,%s,'Draft',%s)",
+            rows
+        )
+        conn.commit()
+    return len(rows)
+
+@app.post('/receipts/batch')
+async def upload_receipt_batch(
+    files: list[UploadFile] = File(...),
+    create_expenses: bool = False,
+    authorization: str | None = Header(None),
+    db: RequestDB = Depends(request_db),
+):
+    """OCR many receipts (images and/or zip archives) and stream one NDJSON
+    line per receipt as it finishes, then a summary line. With
+    `create_expenses`, receipts with an amount become Draft expenses for
+    the caller in one transaction at the end."""
+    user = await run_in_threadpool(auth_user_from_header, authorization, db) if create_expenses else None
+    # Drafts are inserted on a fresh connection once OCR finishes
+    await run_in_threadpool(db.release)
+    try:
+        # Reads the spooled uploads and inflates archives in chunks, off the loop
+        items = await run_in_threadpool(expand_batch, [(f.filename, f.file) for f in files])
+    except BatchTooLarge:
+        raise HTTPException(status_code=413, detail="Batch too large")
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid archive")
+
+    async def stream():
+        started = time.perf_counter()
+        parsed_items, failed = [], 0
+        async for index, job in ocr_service.run_batch(items):
+            result = job.to_dict()
+            if result["status"] == "done":
+                parsed_items.append(result["parsed"])
+            else:
+                failed += 1
+            yield json.dumps({"index": index, **result}) + "\n"
+        summary = {"files": len(items), "parsed": len(parsed_items), "failed": failed}
+        if user is not None:
+            try:
+                summary["expenses_created"] = await run_in_threadpool(create_draft_expenses, user, parsed_items)
+            except Exception as e:
+                summary["expenses_error"] = str(e)
+        summary["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get('/db/pool-stats')
+def db_pool_stats():
+    return POOL.stats()
+
+@app.get('/auth/session-stats')
+def session_stats():
+    return {"sweeper": session_sweeper.stats(), "cache": principal_cache.stats()}
+
+@app.get('/receipts/stats')
+def receipt_stats():
+    return ocr_service.stats()
 
 @app.get('/utils/currencies')
-def list_currencies():
+def list_currencies(request: Request):
     try:
-        resp = requests.get('https://restcountries.com/v3.1/all?fields=name,currencies', timeout=10)
-        data = resp.json()
-        out = []
-        for c in data:
-            name = c.get('name', {}).get('common') or c.get('name', {}).get('official')
-            cur = list(c.get('currencies', {}).keys())[0] if c.get('currencies') else None
-            if name and cur:
-                out.append({"country": name, "currency": cur})
-        return {"items": out}
+        return get_catalogue().currencies_json.response(request)
     except Exception:
         raise HTTPException(status_code=502, detail="Currency service error")
 
 @app.get('/utils/convert')
-def convert_currency(base: str, target: str, amount: float):
+def convert_currency(base: str, target: str, amount: float, date: str | None = None):
     try:
-        resp = requests.get(f'https://api.exchangerate-api.com/v4/latest/{base}', timeout=10)
-        data = resp.json()
-        rate = data.get('rates', {}).get(target)
-        if not rate:
-            raise HTTPException(status_code=400, detail="Unsupported currency")
+        on = datetime.fromisoformat(date).date() if date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    try:
+        rate = fx_rates.get_rate(base, target, on)
         return {"base": base, "target": target, "amount": amount, "converted": amount * rate}
-    except HTTPException:
-        raise
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Unsupported currency")
     except Exception:
         raise HTTPException(status_code=502, detail="Exchange rate error")
 
 @app.get('/health')
-def health():
+async def health():
     return {"status":"ok"}
\ No newline at end of file
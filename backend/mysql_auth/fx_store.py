@@ -0,0 +1,53 @@
+from contextlib import closing
+from datetime import date
+from typing import Callable, Dict, Optional
+
+
+class MySQLSnapshotStore:
+    """Daily pivot rate snapshots in this app's own MySQL database.
+
+    Plugs into app.fx.FxRates in place of its SQLAlchemy store, so FX
+    conversions here never open the other app's database. `connection` is
+    a context manager factory yielding a pooled connection.
+    """
+
+    def __init__(self, connection: Callable):
+        self._connection = connection
+
+    def ensure(self) -> None:
+        with self._connection() as conn, closing(conn.cursor()) as cur:
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fx_rates (
+                    pivot VARCHAR(10) NOT NULL,
+                    rate_date DATE NOT NULL,
+                    currency VARCHAR(10) NOT NULL,
+                    rate DOUBLE NOT NULL,
+                    PRIMARY KEY (pivot, rate_date, currency)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+                """
+            )
+            conn.commit()
+
+    def load(self, day: Optional[date], pivot: str):
+        """(rate_date, rates) of the latest snapshot on or before `day`."""
+        with self._connection() as conn, closing(conn.cursor()) as cur:
+            if day is None:
+                cur.execute("SELECT MAX(rate_date) FROM fx_rates WHERE pivot=%s", (pivot,))
+            else:
+                cur.execute("SELECT MAX(rate_date) FROM fx_rates WHERE pivot=%s AND rate_date<=%s", (pivot, day))
+            (latest,) = cur.fetchone()
+            if latest is None:
+                return None, None
+            cur.execute("SELECT currency, rate FROM fx_rates WHERE pivot=%s AND rate_date=%s", (pivot, latest))
+            rates: Dict[str, float] = {code: float(rate) for code, rate in cur.fetchall()}
+        return latest, rates
+
+    def save(self, day: date, rates: Dict[str, float], pivot: str) -> None:
+        with self._connection() as conn, closing(conn.cursor()) as cur:
+            cur.execute("DELETE FROM fx_rates WHERE pivot=%s AND rate_date=%s", (pivot, day))
+            cur.executemany(
+                "INSERT INTO fx_rates (pivot, rate_date, currency, rate) VALUES (%s, %s, %s, %s)",
+                [(pivot, day, code, rate) for code, rate in rates.items()],
+            )
+            conn.commit()
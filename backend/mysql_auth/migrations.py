@@ -0,0 +1,82 @@
+from contextlib import closing
+from typing import Callable, List, Tuple
+
+# init_schema creates missing tables; these steps bring existing databases
+# forward and are recorded in schema_migrations once applied. MySQL commits
+# DDL as it goes, so every step checks information_schema first and a step
+# interrupted halfway simply runs again.
+
+
+def has_index(cur, database: str, table: str, name: str) -> bool:
+    cur.execute(
+        "SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s AND INDEX_NAME=%s LIMIT 1",
+        (database, table, name)
+    )
+    return cur.fetchone() is not None
+
+
+def has_column(cur, database: str, table: str, name: str) -> bool:
+    cur.execute(
+        "SELECT 1 FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s AND COLUMN_NAME=%s LIMIT 1",
+        (database, table, name)
+    )
+    return cur.fetchone() is not None
+
+
+def add_index(cur, database: str, table: str, name: str, columns: str) -> None:
+    if not has_index(cur, database, table, name):
+        cur.execute(f"ALTER TABLE {table} ADD INDEX {name} ({columns})")
+
+
+def _hot_query_indexes(cur, database: str) -> None:
+    # Decisions: the caller's step on one expense; current_step: pending steps in order
+    add_index(cur, database, "approvals", "ix_approvals_expense_approver_decision", "expense_id, approver_id, decision")
+    add_index(cur, database, "approvals", "ix_approvals_expense_decision_step", "expense_id, decision, step_order")
+    # Approval chains read a company's assignments in step order
+    add_index(cur, database, "approver_assignments", "ix_approver_assignments_company_step", "company_id, step_order")
+    # Admin listings filter a company's expenses by status and date
+    add_index(cur, database, "expenses", "ix_expenses_company_status_date", "company_id, status, date")
+
+
+def _legacy_tokens_to_sessions(cur, database: str) -> None:
+    # Tokens issued before the sessions table keep working as sessions that
+    # expire in 30 days; the plaintext column goes
+    if not has_column(cur, database, "users", "auth_token"):
+        return
+    cur.execute(
+        "INSERT IGNORE INTO sessions (token_hash, user_id, created_at, expires_at) "
+        "SELECT UNHEX(SHA2(auth_token, 256)), id, UTC_TIMESTAMP(), UTC_TIMESTAMP() + INTERVAL 30 DAY "
+        "FROM users WHERE auth_token IS NOT NULL"
+    )
+    cur.execute("ALTER TABLE users DROP COLUMN auth_token")
+
+
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "composite indexes for decisions, approval chains and filtered listings", _hot_query_indexes),
+    (2, "move users.auth_token into hashed sessions", _legacy_tokens_to_sessions),
+]
+
+
+def migrate(conn, database: str) -> List[int]:
+    """Apply pending migrations in order; returns the versions applied."""
+    applied = []
+    with closing(conn.cursor()) as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+            """
+        )
+        cur.execute("SELECT version FROM schema_migrations")
+        done = {row[0] for row in cur.fetchall()}
+        for version, description, step in MIGRATIONS:
+            if version in done:
+                continue
+            step(cur, database)
+            cur.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)", (version, description))
+            conn.commit()
+            applied.append(version)
+    return applied
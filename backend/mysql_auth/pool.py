@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Tuple
+
+from app.pool import PoolMetrics
+
+
+class PoolExhausted(Exception):
+    """No connection became free within the checkout timeout."""
+
+
+class PooledConnection:
+    """Proxy for a pooled mysql-connector connection; `close()` hands it back."""
+
+    def __init__(self, pool: "BlockingPool", raw, created_at: float):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self) -> None:
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw, self._created_at)
+
+
+class BlockingPool:
+    """Bounded connection pool whose checkout waits instead of failing.
+
+    Up to `size` connections are kept open; `max_overflow` more may be
+    opened under load and are closed on return. Connections older than
+    `recycle` seconds are replaced at checkout, and `pre_ping` (always,
+    idle or never) decides when a connection is checked with a ping
+    first; `idle` pings only connections unused for `ping_idle` seconds.
+    Connections are created lazily, so the pool exists even while the
+    database is down.
+    """
+
+    def __init__(
+        self,
+        connect: Callable,
+        size: int = 5,
+        max_overflow: int = 0,
+        timeout: float = 30.0,
+        recycle: float = 1800.0,
+        pre_ping: str = "idle",
+        ping_idle: float = 30.0,
+    ):
+        self._connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.ping_idle = ping_idle
+        self.metrics = PoolMetrics()
+        self._idle: Deque[Tuple[object, float, float]] = deque()  # (connection, created_at, returned_at)
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def get_connection(self) -> PooledConnection:
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        with self._cond:
+            while not self._idle and self._in_use >= self.size + self.max_overflow:
+                waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.metrics.record_exhausted()
+                    raise PoolExhausted(f"No connection available within {self.timeout:g}s")
+                self._cond.wait(remaining)
+            entry = self._idle.pop() if self._idle else None
+            self._in_use += 1
+        try:
+            raw, created_at = self._usable(entry)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        self.metrics.record(time.perf_counter() - started, waited)
+        return PooledConnection(self, raw, created_at)
+
+    def _usable(self, entry) -> Tuple[object, float]:
+        if entry is not None:
+            raw, created_at, returned_at = entry
+            now = time.monotonic()
+            if self.recycle >= 0 and now - created_at > self.recycle:
+                self._discard(raw)
+            elif self.pre_ping == "always" or (self.pre_ping == "idle" and now - returned_at > self.ping_idle):
+                try:
+                    raw.ping(reconnect=False)
+                    return raw, created_at
+                except Exception:
+                    self.metrics.record_ping_failure()
+                    self._discard(raw)
+            else:
+                return raw, created_at
+        return self._connect(), time.monotonic()
+
+    def _release(self, raw, created_at: float) -> None:
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+            keep = True
+        except Exception:
+            keep = False
+        with self._cond:
+            self._in_use -= 1
+            if keep and len(self._idle) < self.size:
+                self._idle.append((raw, created_at, time.monotonic()))
+                raw = None
+            self._cond.notify()
+        if raw is not None:
+            self._discard(raw)
+
+    @staticmethod
+    def _discard(raw) -> None:
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def warm(self, count: int) -> int:
+        """Open up to `count` connections now so the first requests skip connect."""
+        connections = []
+        try:
+            for _ in range(min(count, self.size)):
+                connections.append(self.get_connection())
+        finally:
+            for connection in connections:
+                connection.close()
+        return len(connections)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            in_use, idle = self._in_use, len(self._idle)
+        return self.metrics.stats(
+            size=self.size,
+            in_use=in_use,
+            idle=idle,
+            overflow=max(in_use + idle - self.size, 0),
+            max_overflow=self.max_overflow,
+        )
@@ -0,0 +1,123 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "./.ocr_cache")  # empty disables the cache
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "50000"))
+OCR_DUPLICATE_DISTANCE = int(os.getenv("OCR_DUPLICATE_DISTANCE", "6"))
+
+
+class ReceiptCache:
+    """On-disk cache of parsed receipts keyed by SHA-256 of the upload.
+
+    Entries also carry a 64-bit perceptual hash so visually near-identical
+    uploads (re-photographed or re-compressed receipts) can be flagged.
+    Least recently used entries are evicted beyond `max_entries`. Nothing
+    touches the disk until `open()`; until then (and after `close()`) the
+    cache is disabled.
+    """
+
+    def __init__(self, directory: str, max_entries: int, duplicate_distance: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.duplicate_distance = duplicate_distance
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._phashes: dict[str, int] = {}
+        self._db = None
+
+    def open(self) -> None:
+        if self._db is not None or not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        db = sqlite3.connect(os.path.join(self.directory, "receipts.sqlite3"), check_same_thread=False)
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS receipts (
+                sha256 TEXT PRIMARY KEY,
+                phash TEXT,
+                parsed TEXT NOT NULL,
+                filename TEXT,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+            """
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS ix_receipts_accessed ON receipts (accessed)")
+        db.commit()
+        phashes = {sha: int(ph, 16) for sha, ph in db.execute("SELECT sha256, phash FROM receipts WHERE phash IS NOT NULL")}
+        with self._lock:
+            self._db, self._phashes = db, phashes
+
+    def close(self) -> None:
+        with self._lock:
+            db, self._db = self._db, None
+            self._phashes = {}
+        if db is not None:
+            db.close()
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def get(self, sha256: str) -> dict | None:
+        with self._lock:
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT parsed, filename, created, phash FROM receipts WHERE sha256=?", (sha256,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE receipts SET accessed=? WHERE sha256=?", (time.time(), sha256))
+            self._db.commit()
+        return {"parsed": json.loads(row[0]), "filename": row[1], "created": row[2], "phash": None if row[3] is None else int(row[3], 16)}
+
+    def put(self, sha256: str, parsed: dict, phash: int | None, filename: str | None) -> None:
+        now = time.time()
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO receipts (sha256, phash, parsed, filename, created, accessed) VALUES (?,?,?,?,?,?)",
+                (sha256, None if phash is None else f"{phash:016x}", json.dumps(parsed), filename, now, now),
+            )
+            if phash is not None:
+                self._phashes[sha256] = phash
+            (count,) = self._db.execute("SELECT COUNT(*) FROM receipts").fetchone()
+            if count > self.max_entries:
+                evicted = [r[0] for r in self._db.execute(
+                    "SELECT sha256 FROM receipts ORDER BY accessed ASC LIMIT ?", (count - self.max_entries,)
+                )]
+                self._db.executemany("DELETE FROM receipts WHERE sha256=?", [(s,) for s in evicted])
+                for s in evicted:
+                    self._phashes.pop(s, None)
+            self._db.commit()
+
+    def find_similar(self, phash: int, exclude: str | None = None) -> dict | None:
+        """Closest cached receipt within the duplicate distance, if any."""
+        best = None
+        with self._lock:
+            for sha, other in self._phashes.items():
+                if sha == exclude:
+                    continue
+                distance = (phash ^ other).bit_count()
+                if distance <= self.duplicate_distance and (best is None or distance < best[1]):
+                    best = (sha, distance)
+            if best is None:
+                return None
+            row = self._db.execute("SELECT filename, created FROM receipts WHERE sha256=?", (best[0],)).fetchone()
+        if row is None:
+            return None
+        return {"sha256": best[0], "distance": best[1], "filename": row[0], "created": row[1]}
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM receipts").fetchone()[0] if self._db else 0
+            return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "entries": entries, "max_entries": self.max_entries}
+
+
+receipt_cache = ReceiptCache(OCR_CACHE_DIR, OCR_CACHE_MAX_ENTRIES, OCR_DUPLICATE_DISTANCE)
@@ -0,0 +1,373 @@
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import BinaryIO
+
+from starlette.concurrency import run_in_threadpool
+
+from .preprocess import PreprocessConfig, load_image, preprocess
+from .receipt_cache import ReceiptCache, receipt_cache
+
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")  # auto, tesseract, stub
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+OCR_QUEUE_LIMIT = int(os.getenv("OCR_QUEUE_LIMIT", "256"))
+OCR_JOB_RETENTION_SECONDS = float(os.getenv("OCR_JOB_RETENTION_SECONDS", "3600"))
+OCR_BATCH_MAX_FILES = int(os.getenv("OCR_BATCH_MAX_FILES", "500"))
+OCR_BATCH_MAX_BYTES = int(os.getenv("OCR_BATCH_MAX_BYTES", str(1024 * 1024 * 1024)))
+OCR_BATCH_MAX_FILE_BYTES = int(os.getenv("OCR_BATCH_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp", ".webp", ".gif")
+
+
+def resolve_engine(tesseract_cmd: str) -> str:
+    if OCR_ENGINE != "auto":
+        return OCR_ENGINE
+    if os.path.exists(tesseract_cmd) or shutil.which(tesseract_cmd):
+        return "tesseract"
+    return "stub"
+
+
+_AMOUNT = re.compile(r"(\d+[\.,]\d{2})")
+# "TOTAL 10.73" or "Grand total 10.73", but not "SUBTOTAL"
+_TOTAL_LINE = re.compile(r"^\s*(?:grand\s+)?total\b.*?(\d+[\.,]\d{2})", re.IGNORECASE | re.MULTILINE)
+
+
+def parse_receipt_text(text: str) -> dict:
+    # The receipt total when there is a TOTAL line, else the first amount
+    amount_match = _TOTAL_LINE.search(text) or _AMOUNT.search(text)
+    date_match = re.search(r"(\d{4}-\d{2}-\d{2}|\d{2}/\d{2}/\d{4})", text)
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    return {
+        "amount": float(amount_match.group(1).replace(',', '.')) if amount_match else None,
+        "date": date_match.group(1) if date_match else None,
+        "description": " ".join(lines[:5]) if lines else None,
+        "vendor": lines[0] if lines else None,
+    }
+
+
+def parse_receipt_date(value: str | None):
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+# ---- Worker process --------------------------------------------------------
+
+_engine = "stub"
+_preprocess = PreprocessConfig()
+
+
+def _init_worker(engine: str, tesseract_cmd: str, tessdata_prefix: str, config: PreprocessConfig) -> None:
+    # Runs once per worker so imports and tesseract setup are paid up front
+    global _engine, _preprocess
+    _engine = engine
+    _preprocess = config
+    if engine == "tesseract":
+        import pytesseract
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        os.environ["TESSDATA_PREFIX"] = tessdata_prefix
+
+
+def image_to_text(image, engine: str) -> str:
+    if engine == "tesseract":
+        import pytesseract
+        return pytesseract.image_to_string(image)
+    # Stub engine: text carried in the image metadata (PNG tEXt "ocr_text" or
+    # a JPEG comment), so the pipeline runs where tesseract isn't installed
+    text = image.info.get("ocr_text") or image.info.get("comment") or ""
+    return text.decode("utf-8", "replace") if isinstance(text, bytes) else text
+
+
+def dhash(image, size: int = 8) -> int:
+    """64-bit difference hash of the downscaled grayscale image."""
+    small = image.convert("L").resize((size + 1, size))
+    px = list(small.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = px[row * (size + 1) + col]
+            bits = (bits << 1) | (left > px[row * (size + 1) + col + 1])
+    return bits
+
+
+def run_ocr(data: bytes) -> dict:
+    started = time.time()
+    image = load_image(data, _preprocess)
+    if _preprocess.enabled:
+        image = preprocess(image, _preprocess)
+    text = image_to_text(image, _engine)
+    phash = dhash(image)
+    finished = time.time()
+    return {"parsed": parse_receipt_text(text), "phash": phash, "started": started, "finished": finished}
+
+
+class BatchTooLarge(Exception):
+    pass
+
+
+_READ_CHUNK = 1024 * 1024
+
+
+def _read_limited(stream: BinaryIO, limit: int) -> bytes:
+    """Read `stream` to the end, giving up as soon as it passes `limit` bytes."""
+    chunks, size = [], 0
+    while True:
+        chunk = stream.read(_READ_CHUNK)
+        if not chunk:
+            return b"".join(chunks)
+        size += len(chunk)
+        if size > limit:
+            raise BatchTooLarge()
+        chunks.append(chunk)
+
+
+def expand_batch(uploads: list[tuple[str | None, BinaryIO]]) -> list[tuple[str | None, bytes]]:
+    """Flatten uploaded files, unpacking zip archives into their images.
+
+    Blocking; run it in a thread. Every file and zip member is read in chunks
+    against OCR_BATCH_MAX_FILE_BYTES and what is left of OCR_BATCH_MAX_BYTES,
+    so an archive whose members inflate far past their declared sizes is
+    stopped after at most one chunk over the limit.
+    """
+    items: list[tuple[str | None, bytes]] = []
+    total = 0
+    for filename, stream in uploads:
+        is_zip = zipfile.is_zipfile(stream)
+        stream.seek(0)
+        if not is_zip:
+            if len(items) >= OCR_BATCH_MAX_FILES:
+                raise BatchTooLarge()
+            data = _read_limited(stream, min(OCR_BATCH_MAX_FILE_BYTES, OCR_BATCH_MAX_BYTES - total))
+            total += len(data)
+            items.append((filename, data))
+            continue
+        with zipfile.ZipFile(stream) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or not member.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                if len(items) >= OCR_BATCH_MAX_FILES:
+                    raise BatchTooLarge()
+                # Declared sizes reject most oversized members without inflating anything
+                if member.file_size > OCR_BATCH_MAX_FILE_BYTES or total + member.file_size > OCR_BATCH_MAX_BYTES:
+                    raise BatchTooLarge()
+                with archive.open(member) as fh:
+                    data = _read_limited(fh, min(OCR_BATCH_MAX_FILE_BYTES, OCR_BATCH_MAX_BYTES - total))
+                total += len(data)
+                items.append((member.filename, data))
+    return items
+
+
+# ---- Job tracking ----------------------------------------------------------
+
+class OcrJob:
+    __slots__ = ("id", "filename", "sha256", "created", "future", "task")
+
+    def __init__(self, filename: str | None, sha256: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.sha256 = sha256
+        self.created = time.time()
+        # `task` is the pool future; `future` resolves once caching is done
+        self.task: Future | None = None
+        self.future: Future = Future()
+
+    def to_dict(self) -> dict:
+        out = {"job_id": self.id, "filename": self.filename}
+        if not self.future.done():
+            out["status"] = "running" if self.task is not None and self.task.running() else "queued"
+            return out
+        exc = self.future.exception()
+        if exc is not None:
+            out.update(status="failed", error=str(exc) or exc.__class__.__name__)
+            return out
+        result = self.future.result()
+        out.update(
+            status="done",
+            parsed=result["parsed"],
+            cached=result.get("cached", False),
+            possible_duplicate_of=result.get("possible_duplicate_of"),
+            timings={
+                "queued_ms": round((result["started"] - self.created) * 1000, 1),
+                "ocr_ms": round((result["finished"] - result["started"]) * 1000, 1),
+                "total_ms": round((result["finished"] - self.created) * 1000, 1),
+            },
+        )
+        return out
+
+
+class OcrQueueFull(Exception):
+    pass
+
+
+class OcrService:
+    """Process pool for OCR plus an in-memory job registry."""
+
+    def __init__(self, workers: int, queue_limit: int, retention: float, cache: ReceiptCache, preprocess: PreprocessConfig):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.retention = retention
+        self.cache = cache
+        self.preprocess = preprocess
+        self.engine = "stub"
+        self._executor: ProcessPoolExecutor | None = None
+        self._jobs: dict[str, OcrJob] = {}  # in submission order, which _sweep relies on
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def start(self, tesseract_cmd: str, tessdata_prefix: str) -> None:
+        if self._executor is not None:
+            return
+        self.engine = resolve_engine(tesseract_cmd)
+        self.cache.open()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.engine, tesseract_cmd, tessdata_prefix, self.preprocess),
+        )
+        # Spin every worker up now rather than on the first uploads
+        for f in [self._executor.submit(time.sleep, 0) for _ in range(self.workers)]:
+            f.result()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        self.cache.close()
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def submit(self, data: bytes, filename: str | None = None, enforce_limit: bool = True) -> OcrJob:
+        """Queue `data` for OCR, or answer it from the cache.
+
+        Blocking (hashing and the cache lookup); async callers run it in a thread.
+        """
+        job = OcrJob(filename, hashlib.sha256(data).hexdigest())
+        hit = self.cache.get(job.sha256)
+        if hit is not None:
+            # Same bytes were processed before: answer now. `cached` marks the
+            # exact re-upload; near-duplicates are other receipts only
+            now = time.time()
+            similar = self.cache.find_similar(hit["phash"], exclude=job.sha256) if hit["phash"] is not None else None
+            job.future.set_result({
+                "parsed": hit["parsed"],
+                "cached": True,
+                "possible_duplicate_of": similar,
+                "started": now,
+                "finished": now,
+            })
+        else:
+            with self._lock:
+                if enforce_limit and self._pending >= self.workers + self.queue_limit:
+                    raise OcrQueueFull()
+                self._pending += 1
+            try:
+                job.task = self._executor.submit(run_ocr, data)
+            except BaseException:
+                with self._lock:
+                    self._pending -= 1
+                raise
+            job.task.add_done_callback(lambda f: self._complete(job, f))
+        with self._lock:
+            self._sweep()
+            self._jobs[job.id] = job
+        return job
+
+    def _complete(self, job: OcrJob, inner: Future) -> None:
+        # The pool slot is free now, whatever caching does next
+        with self._lock:
+            self._pending -= 1
+        exc = inner.exception()
+        if exc is not None:
+            job.future.set_exception(exc)
+            return
+        result = inner.result()
+        if self.cache.enabled:
+            try:
+                result["possible_duplicate_of"] = self.cache.find_similar(result["phash"], exclude=job.sha256)
+                self.cache.put(job.sha256, result["parsed"], result["phash"], job.filename)
+            except Exception as e:
+                print(f"Receipt cache error: {e}")
+        job.future.set_result(result)
+
+    def get(self, job_id: str) -> OcrJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    async def wait(self, job: OcrJob, timeout: float) -> None:
+        if job.future.done() or timeout <= 0:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), timeout)
+        except Exception:
+            pass
+
+    async def run_batch(self, items: list[tuple[str | None, bytes]]):
+        """Yield (index, job) in completion order.
+
+        At most two jobs per worker are in flight, so a large batch keeps the
+        pool busy without crowding out single uploads in the queue.
+        """
+        window = self.workers * 2
+        queued = iter(enumerate(items))
+        running: dict[asyncio.Future, tuple[int, OcrJob]] = {}
+
+        async def fill():
+            while len(running) < window:
+                nxt = next(queued, None)
+                if nxt is None:
+                    return
+                index, (filename, data) = nxt
+                job = await run_in_threadpool(self.submit, data, filename, enforce_limit=False)
+                running[asyncio.wrap_future(job.future)] = (index, job)
+
+        await fill()
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                yield running.pop(fut)
+            await fill()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "engine": self.engine,
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "jobs": len(self._jobs),
+                "pending": self._pending,
+                "cache": self.cache.stats(),
+            }
+
+    # Must be called with self._lock held
+    def _sweep(self) -> None:
+        # Oldest first, stopping at the first job to keep, so each call only
+        # touches what it removes; a job still running holds back later ones
+        # until it finishes
+        cutoff = time.time() - self.retention
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if job.created >= cutoff or not job.future.done():
+                return
+            del self._jobs[job.id]
+
+
+ocr_service = OcrService(
+    workers=OCR_WORKERS,
+    queue_limit=OCR_QUEUE_LIMIT,
+    retention=OCR_JOB_RETENTION_SECONDS,
+    cache=receipt_cache,
+    preprocess=PreprocessConfig(),
+)
@@ -0,0 +1,83 @@
+import argparse
+import json
+
+RECONCILE_BATCH_SIZE = 5000
+_SAMPLE_LIMIT = 20
+
+# Counters recomputed from the approval rows, one id-ordered batch at a time
+_BATCH_SQL = """
+    SELECT e.id, e.approved_count, e.total_steps, e.current_step, e.specific_approver_approved,
+           COUNT(a.id) AS total,
+           COALESCE(SUM(a.decision='Approved'), 0) AS approved,
+           MIN(CASE WHEN a.decision='Pending' THEN a.step_order END) AS pending_step,
+           COALESCE(MAX(a.decision='Approved' AND a.approver_id=r.cfo_user_id), 0) AS specific
+    FROM expenses e
+    LEFT JOIN approvals a ON a.expense_id=e.id
+    LEFT JOIN approval_rules r ON r.company_id=e.company_id
+    WHERE e.id > %s
+    GROUP BY e.id
+    ORDER BY e.id
+    LIMIT %s
+"""
+
+
+def reconcile_expenses(conn, fix: bool = False, batch_size: int = RECONCILE_BATCH_SIZE) -> dict:
+    """Compare each expense's approval counters with its approval rows; with `fix`, rewrite mismatches."""
+    cur = conn.cursor(dictionary=True)
+    checked = mismatched = 0
+    samples = []
+    last_id = 0
+    try:
+        while True:
+            cur.execute(_BATCH_SQL, (last_id, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            checked += len(rows)
+            fixes = []
+            for r in rows:
+                expected = {
+                    "approved_count": int(r['approved']),
+                    "total_steps": int(r['total']),
+                    "current_step": r['pending_step'],
+                    "specific_approver_approved": bool(r['specific']),
+                }
+                actual = {
+                    "approved_count": r['approved_count'],
+                    "total_steps": r['total_steps'],
+                    "current_step": r['current_step'],
+                    "specific_approver_approved": bool(r['specific_approver_approved']),
+                }
+                if expected != actual:
+                    mismatched += 1
+                    if len(samples) < _SAMPLE_LIMIT:
+                        samples.append({"expense_id": r['id'], "expected": expected, "actual": actual})
+                    fixes.append((
+                        expected['approved_count'], expected['total_steps'], expected['current_step'],
+                        expected['specific_approver_approved'], r['id'],
+                    ))
+            if fix and fixes:
+                cur.executemany(
+                    "UPDATE expenses SET approved_count=%s, total_steps=%s, current_step=%s, specific_approver_approved=%s WHERE id=%s",
+                    fixes
+                )
+                conn.commit()
+    finally:
+        cur.close()
+    return {"checked": checked, "mismatched": mismatched, "fixed": mismatched if fix else 0, "samples": samples}
+
+
+if __name__ == "__main__":
+    # python -m mysql_auth.reconcile [--fix]
+    from .app import get_conn
+
+    parser = argparse.ArgumentParser(description="Check expense approval counters against approval rows")
+    parser.add_argument("--fix", action="store_true", help="rewrite mismatched counters")
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+    args = parser.parse_args()
+    conn = get_conn()
+    try:
+        print(json.dumps(reconcile_expenses(conn, args.fix, args.batch_size), indent=2))
+    finally:
+        conn.close()
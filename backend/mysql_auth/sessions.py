@@ -0,0 +1,121 @@
+import hashlib
+import secrets
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+# Bearer tokens are random and only their SHA-256 digest is stored, so the
+# lookup is a primary-key read on a fixed-width BINARY(32) and a leaked
+# sessions table holds nothing that can be replayed.
+_LOOKUP_SQL = """
+    SELECT u.id, u.name, u.email, u.role, u.country, u.currency, u.manager_id, u.company_id,
+           TIMESTAMPDIFF(SECOND, UTC_TIMESTAMP(), s.expires_at) AS expires_in
+    FROM sessions s
+    JOIN users u ON u.id=s.user_id
+    WHERE s.token_hash=%s AND s.expires_at > UTC_TIMESTAMP()
+"""
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+def create_session(cur, user_id: int, ttl: int, user_agent: str | None = None, ip_address: str | None = None) -> str:
+    """Insert a session for `user_id` and return its token; the caller commits."""
+    token = secrets.token_urlsafe(32)
+    cur.execute(
+        "INSERT INTO sessions (token_hash, user_id, created_at, expires_at, user_agent, ip_address) "
+        "VALUES (%s, %s, UTC_TIMESTAMP(), UTC_TIMESTAMP() + INTERVAL %s SECOND, %s, %s)",
+        (token_digest(token), user_id, int(ttl), user_agent[:255] if user_agent else None, ip_address)
+    )
+    return token
+
+
+def find_session(cur, token: str) -> Optional[Dict]:
+    """User columns plus `expires_in` seconds for a live session; `cur` must be a dictionary cursor."""
+    cur.execute(_LOOKUP_SQL, (token_digest(token),))
+    return cur.fetchone()
+
+
+def revoke_session(cur, token: str) -> bool:
+    cur.execute("DELETE FROM sessions WHERE token_hash=%s", (token_digest(token),))
+    return cur.rowcount > 0
+
+
+class SessionSweeper:
+    """Background thread that deletes expired sessions in batches.
+
+    Each batch is one short `DELETE ... ORDER BY expires_at LIMIT n` on the
+    expires_at index, committed on its own, so a large backlog never holds
+    locks for long. Expired sessions are already rejected by the lookup;
+    sweeping only keeps the table small.
+    """
+
+    def __init__(self, connection: Callable, interval: float, batch_size: int):
+        self._connection = connection
+        self.interval = interval
+        self.batch_size = max(batch_size, 1)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.deleted = 0
+        self.last_run: float | None = None
+        self.last_error: str | None = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                with self._lock:
+                    self.last_error = str(e)
+
+    def sweep(self) -> int:
+        """Delete every expired session now; returns how many went."""
+        total = 0
+        with self._connection() as conn:
+            cur = conn.cursor()
+            try:
+                while not self._stop.is_set():
+                    cur.execute(
+                        "DELETE FROM sessions WHERE expires_at <= UTC_TIMESTAMP() ORDER BY expires_at LIMIT %s",
+                        (self.batch_size,)
+                    )
+                    conn.commit()
+                    total += cur.rowcount
+                    if cur.rowcount < self.batch_size:
+                        break
+            finally:
+                cur.close()
+        with self._lock:
+            self.runs += 1
+            self.deleted += total
+            self.last_run = time.time()
+            self.last_error = None
+        return total
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "interval_seconds": self.interval,
+                "batch_size": self.batch_size,
+                "runs": self.runs,
+                "deleted": self.deleted,
+                "last_run": self.last_run,
+                "last_error": self.last_error,
+            }
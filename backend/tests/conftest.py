@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+# Settings are read at import, so point everything at throwaway state first
+_workdir = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_workdir}/test.db")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("OCR_ENGINE", "stub")
+os.environ.setdefault("OCR_CACHE_DIR", "")
+os.environ.setdefault("MYSQL_SESSION_SWEEP_SECONDS", "0")
+
+import pytest
+
+
+def _rates(base):
+    rates = {"USD": 1.0, "EUR": 0.5, "INR": 80.0}
+    return {"base": base, "date": "2024-01-01", "rates": {k: v / rates[base] for k, v in rates.items()}}
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.fx import rate_cache
+    from app.main import app
+
+    rate_cache.fetcher = _rates
+    with TestClient(app) as c:
+        yield c
+
+
+def _login(client, email):
+    token = client.post("/auth/login", json={"email": email, "password": "pw"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="session")
+def company(client):
+    """One company (the app allows a single admin): an admin, a manager who
+    approves first, and an employee reporting to them. Values are auth headers."""
+    r = client.post("/auth/signup", json={"name": "A", "email": "admin@example.com", "password": "pw", "currency": "USD"})
+    assert r.status_code == 200, r.text
+    admin = _login(client, "admin@example.com")
+    r = client.post("/company/create", json={"name": "Co", "country": "US", "currency": "USD"}, headers=admin)
+    assert r.status_code == 200, r.text
+    r = client.post("/admin/users", json={"name": "M", "email": "manager@example.com", "password": "pw", "role": "manager"}, headers=admin)
+    assert r.status_code == 200, r.text
+    manager_id = r.json()["id"]
+    r = client.post(
+        "/admin/users",
+        json={"name": "E", "email": "employee@example.com", "password": "pw", "role": "employee", "manager_id": manager_id, "is_manager_approver": True},
+        headers=admin,
+    )
+    assert r.status_code == 200, r.text
+    return {
+        "admin": admin,
+        "manager": _login(client, "manager@example.com"),
+        "employee": _login(client, "employee@example.com"),
+        "manager_id": manager_id,
+        "employee_id": r.json()["id"],
+    }
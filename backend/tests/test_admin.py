@@ -0,0 +1,25 @@
+from app.auth import get_password_hash
+from app.database import SessionLocal
+from app.models import Company, User
+
+
+def test_admin_lists_only_their_company(client, company):
+    db = SessionLocal()
+    try:
+        other = Company(name="Other", country="US", currency="USD")
+        db.add(other)
+        db.flush()
+        db.add(User(name="X", email="outsider@example.com", hashed_password=get_password_hash("pw"), role="employee", company_id=other.id))
+        db.commit()
+    finally:
+        db.close()
+
+    r = client.get("/admin/users", headers=company["admin"])
+    assert r.status_code == 200, r.text
+    emails = {u["email"] for u in r.json()}
+    assert {"admin@example.com", "manager@example.com", "employee@example.com"} <= emails
+    assert "outsider@example.com" not in emails
+
+
+def test_only_admins_list_users(client, company):
+    assert client.get("/admin/users", headers=company["employee"]).status_code == 403
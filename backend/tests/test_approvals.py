@@ -0,0 +1,116 @@
+import contextlib
+
+from app.database import SessionLocal
+from app.models import Expense
+from app.reconcile import reconcile_expenses
+
+
+def _submit(client, company, amount=10):
+    r = client.post(
+        "/expenses/",
+        json={"amount": amount, "currency": "USD", "category": "food", "description": "x", "date": "2024-01-02"},
+        headers=company["employee"],
+    )
+    assert r.status_code == 200, r.text
+    return r.json()["id"]
+
+
+def _counters(expense_id):
+    db = SessionLocal()
+    try:
+        e = db.get(Expense, expense_id)
+        return e.approved_count, e.total_steps, e.current_step, e.status
+    finally:
+        db.close()
+
+
+def test_repeated_decision_does_not_fold_twice(client, company):
+    expense_id = _submit(client, company)
+    approved, total, step, _ = _counters(expense_id)
+    assert approved == 0 and total >= 1 and step == 1
+
+    r = client.post(f"/expenses/approvals/{expense_id}/decide", json={"approve": True}, headers=company["manager"])
+    assert r.status_code == 200, r.text
+    after_first = _counters(expense_id)
+    assert after_first[0] == 1
+
+    r = client.post(f"/expenses/approvals/{expense_id}/decide", json={"approve": True}, headers=company["manager"])
+    assert r.status_code == 400
+    r = client.post(f"/expenses/approvals/{expense_id}/decide", json={"approve": False}, headers=company["manager"])
+    assert r.status_code == 400
+    assert _counters(expense_id) == after_first
+
+
+def test_batch_duplicates_fold_once(client, company):
+    expense_id = _submit(client, company)
+    r = client.post(
+        "/expenses/approvals/decide-batch",
+        json={"decisions": [{"expense_id": expense_id, "approve": True}, {"expense_id": expense_id, "approve": False}]},
+        headers=company["manager"],
+    )
+    assert r.status_code == 200, r.text
+    assert [res["ok"] for res in r.json()["results"]] == [True, False]
+    assert _counters(expense_id)[0] == 1
+
+
+def test_counters_match_approval_rows(client, company):
+    for approve in (True, False, True):
+        expense_id = _submit(client, company)
+        client.post(f"/expenses/approvals/{expense_id}/decide", json={"approve": approve}, headers=company["manager"])
+    db = SessionLocal()
+    try:
+        assert reconcile_expenses(db)["mismatched"] == 0
+    finally:
+        db.close()
+
+
+class _FoldDB:
+    """Stands in for RequestDB on one approval step: answers the locking
+    read from the stored decision and logs each statement and commit."""
+
+    def __init__(self):
+        self.decision = "Pending"
+        self.log = []
+        self.deltas = []
+        self._row = None
+
+    def cursor(self, **kwargs):
+        return contextlib.nullcontext(self)
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+    def execute(self, sql, params=()):
+        self.log.append(" ".join(sql.split()))
+        self._row = None
+        if sql.startswith("SELECT a.*"):
+            self._row = {"id": 3, "expense_id": 1, "approver_id": 7, "decision": self.decision, "company_id": 1}
+        elif sql.startswith("SELECT approval_version"):
+            self._row = {"approval_version": 1}
+        elif sql.startswith("UPDATE approvals"):
+            self.decision = params[0]
+        elif sql.startswith("UPDATE expenses"):
+            self.deltas.append(params[0])
+
+    def fetchone(self):
+        return self._row
+
+    def fetchall(self):
+        return []
+
+
+def test_mysql_fold_under_changed_decisions():
+    from mysql_auth.app import ApprovalDecision, approve_expense
+
+    db = _FoldDB()
+    for decision in ("Approved", "Approved", "Rejected", "Rejected", "Approved"):
+        db.log.clear()
+        approve_expense(1, ApprovalDecision(decision=decision), {"id": 7, "role": "manager"}, db)
+        # The step is read under a row lock, then both writes, then commit
+        writes = [i for i, sql in enumerate(db.log) if sql.startswith("UPDATE")]
+        assert db.log[0].startswith("SELECT a.*") and db.log[0].endswith("FOR UPDATE")
+        assert [db.log[i].split()[1] for i in writes] == ["approvals", "expenses"]
+        assert db.log[-1] == "COMMIT" and writes[-1] == len(db.log) - 2
+    # Each delta is against the decision the previous call stored
+    assert db.deltas == [1, 0, -1, 0, 1]
+    assert sum(db.deltas) == 1
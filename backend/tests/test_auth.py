@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+import pytest
+from passlib.context import CryptContext
+
+from app.auth import PasswordPool, PasswordPoolBusy, hash_password, verify_and_update_password
+
+
+def test_pool_rejects_beyond_its_queue():
+    pool = PasswordPool(workers=1, queue_limit=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = [asyncio.ensure_future(pool.run(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert pool.stats()["pending"] == 2
+        with pytest.raises(PasswordPoolBusy):
+            await pool.run(release.wait, 5)
+        release.set()
+        await asyncio.gather(*running)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+    assert pool.stats() == {"workers": 1, "queue_limit": 1, "pending": 0, "rejected": 1}
+
+
+def test_cancelled_caller_keeps_its_slot_until_bcrypt_ends():
+    pool = PasswordPool(workers=1, queue_limit=0)
+    release = threading.Event()
+
+    async def scenario():
+        task = asyncio.ensure_future(pool.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The worker thread is still busy, so the slot is still taken
+        assert pool.stats()["pending"] == 1
+        with pytest.raises(PasswordPoolBusy):
+            await pool.run(release.wait, 5)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+    pool._executor.shutdown(wait=True)
+    assert pool.stats()["pending"] == 0
+
+
+def test_outdated_hash_is_replaced():
+    async def scenario():
+        current = await hash_password("pw")
+        assert await verify_and_update_password("pw", current) == (True, None)
+        assert (await verify_and_update_password("wrong", current))[0] is False
+        old = CryptContext(schemes=["bcrypt"], bcrypt__rounds=5).hash("pw")
+        valid, new_hash = await verify_and_update_password("pw", old)
+        assert valid and new_hash and new_hash != old
+        assert await verify_and_update_password("pw", new_hash) == (True, None)
+
+    asyncio.run(scenario())
+
+
+def test_change_password_round_trip(client, company):
+    def login(password):
+        return client.post("/auth/login", json={"email": "manager@example.com", "password": password}).status_code
+
+    r = client.post("/auth/change-password", json={"old_password": "nope", "new_password": "x"}, headers=company["manager"])
+    assert r.status_code == 400
+    r = client.post("/auth/change-password", json={"old_password": "pw", "new_password": "pw2"}, headers=company["manager"])
+    assert r.status_code == 200, r.text
+    assert login("pw") == 401 and login("pw2") == 200
+    r = client.post("/auth/change-password", json={"old_password": "pw2", "new_password": "pw"}, headers=company["manager"])
+    assert r.status_code == 200, r.text
+    assert login("pw") == 200
+
+
+def test_login_upgrades_an_outdated_hash(client, company):
+    from app.database import SessionLocal
+    from app.models import User
+
+    old = CryptContext(schemes=["bcrypt"], bcrypt__rounds=5).hash("pw")
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == "employee@example.com").one()
+        user.hashed_password = old
+        db.commit()
+        r = client.post("/auth/login", json={"email": "employee@example.com", "password": "pw"})
+        assert r.status_code == 200, r.text
+        db.expire_all()
+        assert user.hashed_password != old
+        assert CryptContext(schemes=["bcrypt"]).verify("pw", user.hashed_password)
+    finally:
+        db.close()
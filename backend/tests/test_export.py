@@ -0,0 +1,48 @@
+import io
+from datetime import date, datetime
+
+import pytest
+
+from app.export import EXPENSE_EXPORT_COLUMNS, iter_parquet
+from mysql_auth.app import EXPORT_COLUMNS
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def _row(**overrides):
+    row = {
+        "id": 1,
+        "employee_id": 2,
+        "employee_name": "E",
+        "category": "food",
+        "description": "lunch",
+        "date": datetime(2024, 1, 2, 9, 30),
+        "amount": 10.5,
+        "currency": "EUR",
+        "normalized_amount": 21.0,
+        "company_currency": "USD",
+        "status": "Approved",
+        "created_at": datetime(2024, 1, 3, 12, 0),
+        "approval_trail": [{"step": 1, "approver": "M", "status": "Approved"}],
+    }
+    row.update(overrides)
+    return row
+
+
+def _read(rows, columns):
+    return pq.read_table(io.BytesIO(b"".join(iter_parquet(rows, columns)))).to_pylist()
+
+
+def test_parquet_round_trip():
+    rows = [_row(id=i, description=None if i % 2 else "x") for i in range(1, 6)]
+    out = _read(rows, EXPENSE_EXPORT_COLUMNS)
+    assert [r["id"] for r in out] == [1, 2, 3, 4, 5]
+    assert out[0]["description"] is None and out[1]["description"] == "x"
+    assert out[0]["date"] == datetime(2024, 1, 2, 9, 30)
+    assert out[0]["approval_trail"] == '[{"step": 1, "approver": "M", "status": "Approved"}]'
+
+
+def test_parquet_mysql_date_column():
+    # mysql-connector returns DATE columns as datetime.date
+    out = _read([_row(date=date(2024, 1, 2))], EXPORT_COLUMNS)
+    assert out[0]["date"] == date(2024, 1, 2)
@@ -0,0 +1,34 @@
+import subprocess
+import sys
+from datetime import date
+
+from app.fx import FxRates
+
+
+class MemoryStore:
+    def __init__(self):
+        self.days = {}
+
+    def ensure(self):
+        pass
+
+    def load(self, day, pivot):
+        days = [d for d in self.days if day is None or d <= day]
+        return (max(days), self.days[max(days)]) if days else (None, None)
+
+    def save(self, day, rates, pivot):
+        self.days[day] = rates
+
+
+def test_past_days_come_from_the_store():
+    rates = FxRates(MemoryStore(), pivot="USD")
+    rates.save(date(2024, 1, 1), {"USD": 1.0, "EUR": 0.5})
+    assert rates.get_rate("EUR", "USD", date(2024, 3, 1)) == 2.0
+    rates.save(date(2024, 2, 1), {"USD": 1.0, "EUR": 0.25})
+    assert rates.get_rate("EUR", "USD", date(2024, 3, 1)) == 4.0
+
+
+def test_mysql_auth_does_not_load_the_app_database():
+    code = "import sys, mysql_auth.app; print('app.database' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
@@ -0,0 +1,96 @@
+from datetime import datetime
+
+from sqlalchemy import update
+
+from app.database import SessionLocal
+from app.models import Expense
+from app.pagination import decode_cursor, encode_cursor
+
+
+def _submit(client, company, amount):
+    r = client.post(
+        "/expenses/",
+        json={"amount": amount, "currency": "USD", "category": "travel", "description": "p", "date": "2024-02-01"},
+        headers=company["employee"],
+    )
+    assert r.status_code == 200, r.text
+    return r.json()["id"]
+
+
+def _pages(client, headers, path, **params):
+    cursor, pages = None, []
+    while True:
+        r = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})}, headers=headers)
+        assert r.status_code == 200, r.text
+        body = r.json()
+        pages.append(body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    at = datetime(2024, 1, 2, 3, 4, 5, 678901)
+    assert decode_cursor(encode_cursor(at, 42)) == (at, 42)
+    assert decode_cursor(encode_cursor(12.5, 7), float) == (12.5, 7)
+
+
+def test_invalid_cursor_is_rejected(client, company):
+    r = client.get("/expenses/me", params={"cursor": "not-a-cursor"}, headers=company["employee"])
+    assert r.status_code == 400
+
+
+def test_keyset_pages_cover_every_row_once(client, company):
+    ids = [_submit(client, company, amount) for amount in range(1, 8)]
+    # Ties on created_at must be broken by id, not dropped or repeated
+    db = SessionLocal()
+    try:
+        db.execute(update(Expense).where(Expense.id.in_(ids[2:5])).values(created_at=datetime(2024, 2, 1, 12, 0)))
+        db.commit()
+    finally:
+        db.close()
+
+    pages = _pages(client, company["employee"], "/expenses/me", limit=3, fields="id,created_at", category="travel")
+    seen = [item["id"] for page in pages for item in page]
+    assert all(len(page) <= 3 for page in pages)
+    assert sorted(seen) == sorted(ids)
+    keys = [(item["created_at"], item["id"]) for page in pages for item in page]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_rows_added_mid_walk_do_not_shift_pages(client, company):
+    params = {"limit": 2, "fields": "id"}
+    first = client.get("/expenses/me", params=params, headers=company["employee"]).json()
+    second = client.get("/expenses/me", params={**params, "cursor": first["next_cursor"]}, headers=company["employee"]).json()
+    _submit(client, company, 99)
+    again = client.get("/expenses/me", params={**params, "cursor": first["next_cursor"]}, headers=company["employee"]).json()
+    assert again["items"] == second["items"]
+
+
+def test_inbox_pages_by_amount(client, company):
+    for amount in (5, 50, 500):
+        _submit(client, company, amount)
+    pages = _pages(client, company["manager"], "/expenses/approvals/inbox", limit=2, sort="amount_desc")
+    amounts = [item["normalized_amount"] for page in pages for item in page]
+    ids = [item["approval_id"] for page in pages for item in page]
+    assert len(ids) == len(set(ids))
+    assert amounts == sorted(amounts, reverse=True)
+
+
+def test_amount_filter_is_in_the_company_currency(client, company):
+    r = client.post(
+        "/expenses/",
+        json={"amount": 30, "currency": "EUR", "category": "amount-filter", "description": "p", "date": "2024-02-01"},
+        headers=company["employee"],
+    )
+    assert r.status_code == 200, r.text
+    expense_id = r.json()["id"]
+
+    def ids(**params):
+        r = client.get("/expenses/me", params={"category": "amount-filter", **params}, headers=company["employee"])
+        assert r.status_code == 200, r.text
+        return [item["id"] for item in r.json()["items"]]
+
+    # 30 EUR is 60 USD at the stubbed rate
+    assert ids(min_amount=50, max_amount=70) == [expense_id]
+    assert ids(max_amount=40) == []
@@ -0,0 +1,68 @@
+from app.approvals import ApprovalPolicy, PolicyCache, bump_policy_version, get_policy, policy_cache
+from app.database import SessionLocal
+from app.models import User
+
+
+def test_version_change_reloads():
+    cache = PolicyCache()
+    loads = []
+
+    def load(version):
+        loads.append(version)
+        return ApprovalPolicy(company_id=1, version=version)
+
+    assert cache.get(1, lambda: 1, load).version == 1
+    assert cache.get(1, lambda: 1, load).version == 1
+    assert cache.get(1, lambda: 2, load).version == 2
+    assert loads == [1, 2]
+    assert cache.stats() == {"hits": 1, "misses": 2, "entries": 1}
+
+
+def test_recheck_window_skips_the_version_query():
+    cache = PolicyCache(recheck=60)
+    cache.get(1, lambda: 1, lambda v: ApprovalPolicy(company_id=1, version=v))
+    # Within the window the (stale) entry is served without asking for the version
+    assert cache.get(1, lambda: 2, lambda v: ApprovalPolicy(company_id=1, version=v)).version == 1
+    cache.invalidate(1)
+    assert cache.get(1, lambda: 2, lambda v: ApprovalPolicy(company_id=1, version=v)).version == 2
+
+
+def _company_id():
+    db = SessionLocal()
+    try:
+        return db.query(User.company_id).filter(User.role == "admin").scalar()
+    finally:
+        db.close()
+
+
+def test_bump_invalidates_only_after_commit(company):
+    company_id = _company_id()
+    db = SessionLocal()
+    try:
+        before = get_policy(db, company_id)
+        db.rollback()
+        bump_policy_version(db, company_id)
+        # Not yet committed: other requests must keep the current entry
+        assert company_id in policy_cache._entries
+        db.commit()
+        assert company_id not in policy_cache._entries
+        assert get_policy(db, company_id).version == before.version + 1
+    finally:
+        db.close()
+
+
+def test_rule_change_reaches_new_decisions(client, company):
+    r = client.put("/admin/approval-rule", json={"percentage_threshold": 100}, headers=company["admin"])
+    assert r.status_code == 200, r.text
+    db = SessionLocal()
+    try:
+        assert get_policy(db, _company_id()).percentage_threshold == 100
+    finally:
+        db.close()
+    r = client.put("/admin/approval-rule", json={"percentage_threshold": 60}, headers=company["admin"])
+    assert r.status_code == 200, r.text
+    db = SessionLocal()
+    try:
+        assert get_policy(db, _company_id()).percentage_threshold == 60
+    finally:
+        db.close()
@@ -0,0 +1,23 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from mysql_auth.preprocess import PreprocessConfig, load_image, preprocess
+
+
+def _encode(fmt, size=(4000, 3000), dpi=(600, 600)):
+    out = BytesIO()
+    Image.new("L", size, 200).save(out, fmt, dpi=dpi)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("size, dpi, expected", [
+    ((4000, 3000), (600, 600), (2000, 1500)),  # the DPI target decides
+    ((4000, 3000), (72, 72), (2000, 1500)),  # max_side decides
+    ((3000, 4000), (1200, 1200), (750, 1000)),  # draft decodes at 1/4, nothing left to resize
+])
+def test_jpeg_and_png_come_out_the_same_size(size, dpi, expected):
+    config = PreprocessConfig(target_dpi=300, max_side=2000, binarize=False)
+    sizes = {fmt: preprocess(load_image(_encode(fmt, size, dpi), config), config).size for fmt in ("JPEG", "PNG")}
+    assert sizes == {"JPEG": expected, "PNG": expected}
@@ -0,0 +1,116 @@
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from mysql_auth import receipts
+from mysql_auth.receipts import BatchTooLarge, expand_batch
+
+
+def _zip(members):
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+def test_expands_images_and_skips_other_members():
+    archive = _zip({"a.png": b"a" * 10, "notes.txt": b"x", "dir/b.JPG": b"b" * 20})
+    items = expand_batch([("batch.zip", archive), ("c.png", BytesIO(b"c" * 5))])
+    assert items == [("a.png", b"a" * 10), ("dir/b.JPG", b"b" * 20), ("c.png", b"c" * 5)]
+
+
+def test_member_over_the_per_file_limit(monkeypatch):
+    monkeypatch.setattr(receipts, "OCR_BATCH_MAX_FILE_BYTES", 1000)
+    with pytest.raises(BatchTooLarge):
+        expand_batch([("bomb.zip", _zip({"a.png": bytes(10_000)}))])
+
+
+def test_total_limit_counts_inflated_bytes(monkeypatch):
+    monkeypatch.setattr(receipts, "OCR_BATCH_MAX_BYTES", 25)
+    with pytest.raises(BatchTooLarge):
+        expand_batch([("a.zip", _zip({"a.png": bytes(20)})), ("b.zip", _zip({"b.png": bytes(20)}))])
+
+
+
+def test_pending_counter_and_queue_limit(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    import threading
+
+    from mysql_auth.preprocess import PreprocessConfig
+    from mysql_auth.receipt_cache import ReceiptCache
+    from mysql_auth.receipts import OcrQueueFull, OcrService
+
+    release = threading.Event()
+
+    def fake_ocr(data):
+        release.wait(5)
+        return {"parsed": {"amount": 1.0}, "phash": None, "cached": False}
+
+    monkeypatch.setattr(receipts, "run_ocr", fake_ocr)
+    service = OcrService(workers=1, queue_limit=1, retention=0, cache=ReceiptCache("", 10, 6), preprocess=PreprocessConfig())
+    service._executor = ThreadPoolExecutor(1)
+    try:
+        jobs = [service.submit(b"one"), service.submit(b"two")]
+        assert service.pending() == 2
+        with pytest.raises(OcrQueueFull):
+            service.submit(b"three")
+        assert service.pending() == 2
+        release.set()
+        for job in jobs:
+            job.future.result(5)
+        assert service.pending() == 0
+        assert service.stats()["pending"] == 0
+        # retention=0: finished jobs are swept on the next submit
+        service.submit(b"four").future.result(5)
+        assert all(service.get(job.id) is None for job in jobs)
+    finally:
+        release.set()
+        service._executor.shutdown()
+
+
+def test_exact_hit_is_not_its_own_duplicate(tmp_path):
+    import hashlib
+
+    from mysql_auth.preprocess import PreprocessConfig
+    from mysql_auth.receipt_cache import ReceiptCache
+    from mysql_auth.receipts import OcrService
+
+    cache = ReceiptCache(str(tmp_path), 10, 6)
+    cache.open()
+    service = OcrService(workers=1, queue_limit=1, retention=60, cache=cache, preprocess=PreprocessConfig())
+    sha = hashlib.sha256(b"receipt").hexdigest()
+    cache.put(sha, {"amount": 1.0}, 0b1010, "a.png")
+
+    result = service.submit(b"receipt").future.result(1)
+    assert result["cached"] and result["possible_duplicate_of"] is None
+
+    cache.put("other", {"amount": 1.0}, 0b1011, "b.png")
+    result = service.submit(b"receipt").future.result(1)
+    assert result["possible_duplicate_of"]["sha256"] == "other"
+    assert result["possible_duplicate_of"]["distance"] == 1
+
+
+def test_amount_is_the_total_line():
+    from mysql_auth.receipts import parse_receipt_text
+
+    text = "FRESHMART\nMilk 2L   3.49\nSUBTOTAL  7.73\nTax 3.00\n  Total   10.73\n"
+    assert parse_receipt_text(text)["amount"] == 10.73
+    assert parse_receipt_text("CITY CAB CO\nFare 24,00\n")["amount"] == 24.0
+
+
+def test_cache_touches_the_disk_only_while_open(tmp_path):
+    from mysql_auth.receipt_cache import ReceiptCache
+
+    directory = tmp_path / "ocr_cache"
+    cache = ReceiptCache(str(directory), 10, 6)
+    assert not directory.exists() and not cache.enabled
+    cache.open()
+    cache.put("a", {"amount": 1.0}, 0b1010, "a.png")
+    cache.close()
+    assert not cache.enabled and cache.get("a") is None
+    cache.open()
+    assert cache.get("a")["parsed"] == {"amount": 1.0}
+    cache.close()
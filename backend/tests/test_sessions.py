@@ -0,0 +1,159 @@
+import hashlib
+import time
+from contextlib import closing, contextmanager
+
+import pytest
+from fastapi import HTTPException
+
+from app.principals import PrincipalCache, principal_cache
+from mysql_auth.app import auth_user_from_header
+from mysql_auth.migrations import _legacy_tokens_to_sessions
+from mysql_auth.sessions import SessionSweeper, create_session, revoke_session, token_digest
+
+USER = {"id": 1, "name": "A", "email": "a@example.com", "role": "admin", "country": "US", "currency": "USD", "manager_id": None, "company_id": 1}
+
+
+class Store:
+    """The sessions table, answering the statements mysql_auth.sessions issues."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.statements = []
+
+    def cursor(self, **kwargs):
+        return Cursor(self)
+
+    def commit(self):
+        pass
+
+
+class Cursor:
+    def __init__(self, store):
+        self.store = store
+        self.row = None
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        self.store.statements.append(sql)
+        sessions = self.store.sessions
+        if sql.startswith("INSERT INTO sessions"):
+            token_hash, user_id, ttl = params[:3]
+            sessions[token_hash] = {"user_id": user_id, "expires_at": time.time() + ttl}
+        elif "FROM sessions s" in sql:
+            s = sessions.get(params[0])
+            live = s is not None and s["expires_at"] > time.time()
+            self.row = {**USER, "expires_in": int(s["expires_at"] - time.time())} if live else None
+        elif sql.startswith("DELETE FROM sessions WHERE token_hash"):
+            self.rowcount = 1 if sessions.pop(params[0], None) else 0
+        elif sql.startswith("DELETE FROM sessions WHERE expires_at"):
+            expired = sorted((s["expires_at"], h) for h, s in sessions.items() if s["expires_at"] <= time.time())
+            for _, h in expired[:params[0]]:
+                del sessions[h]
+            self.rowcount = min(len(expired), params[0])
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class RequestDB:
+    def __init__(self, store):
+        self.store = store
+
+    def cursor(self, **kwargs):
+        return closing(self.store.cursor(**kwargs))
+
+
+@pytest.fixture
+def store():
+    principal_cache.clear()
+    yield Store()
+    principal_cache.clear()
+
+
+def test_only_the_digest_is_stored(store):
+    token = create_session(store.cursor(), 1, ttl=60)
+    assert list(store.sessions) == [hashlib.sha256(token.encode()).digest()]
+    assert len(token_digest(token)) == 32
+    assert create_session(store.cursor(), 1, ttl=60) != token
+
+
+def test_lookup_caches_until_revoked(store):
+    token = create_session(store.cursor(), 1, ttl=60)
+    db = RequestDB(store)
+    assert auth_user_from_header(f"Bearer {token}", db)["email"] == USER["email"]
+    lookups = len(store.statements)
+    assert auth_user_from_header(f"Bearer {token}", db)["id"] == 1
+    assert len(store.statements) == lookups
+
+    assert revoke_session(store.cursor(), token)
+    principal_cache.invalidate_token(token)
+    with pytest.raises(HTTPException) as e:
+        auth_user_from_header(f"Bearer {token}", db)
+    assert e.value.status_code == 401
+
+
+def test_expired_session_is_rejected(store):
+    token = create_session(store.cursor(), 1, ttl=0)
+    with pytest.raises(HTTPException) as e:
+        auth_user_from_header(f"Bearer {token}", RequestDB(store))
+    assert e.value.status_code == 401
+
+
+def test_cache_never_outlives_the_session():
+    cache = PrincipalCache(maxsize=10, ttl=60)
+    cache.put("t", 1, USER, expires_in=0.05)
+    assert cache.get("t") is USER
+    time.sleep(0.06)
+    assert cache.get("t") is None
+    cache.put("gone", 1, USER, expires_in=0)
+    assert cache.get("gone") is None
+
+
+def test_sweeper_deletes_expired_in_batches(store):
+    for _ in range(5):
+        create_session(store.cursor(), 1, ttl=0)
+    live = create_session(store.cursor(), 1, ttl=60)
+
+    @contextmanager
+    def connection():
+        yield store
+
+    sweeper = SessionSweeper(connection, interval=0, batch_size=2)
+    assert sweeper.sweep() == 5
+    assert list(store.sessions) == [token_digest(live)]
+    assert sum(s.startswith("DELETE FROM sessions WHERE expires_at") for s in store.statements) == 3
+    assert sweeper.stats()["deleted"] == 5
+
+
+class ColumnCursor:
+    def __init__(self, columns):
+        self.columns = columns
+        self.row = None
+        self.statements = []
+
+    def execute(self, sql, params=()):
+        if "information_schema.COLUMNS" in sql:
+            self.row = (1,) if params[2] in self.columns else None
+            return
+        self.statements.append(sql.split()[0])
+        if sql.startswith("ALTER TABLE users DROP COLUMN"):
+            self.columns.remove(sql.split()[-1])
+
+    def fetchone(self):
+        return self.row
+
+
+def test_legacy_tokens_move_to_sessions_and_the_column_goes():
+    columns = {"id", "auth_token"}
+    cur = ColumnCursor(columns)
+    _legacy_tokens_to_sessions(cur, "db")
+    assert cur.statements == ["INSERT", "ALTER"]
+    assert columns == {"id"}
+    # New databases never had the column; a rerun after an interruption finds it gone
+    cur = ColumnCursor(columns)
+    _legacy_tokens_to_sessions(cur, "db")
+    assert cur.statements == []
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.sqlite import WriteQueue, begin_immediate, install_pragmas
+
+
+@pytest.fixture
+def writer(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/w.db")
+    install_pragmas(engine, "WAL", "NORMAL", 5000, 0, -2000)
+    begin_immediate(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (name TEXT PRIMARY KEY)"))
+    queue = WriteQueue(sessionmaker(engine), max_batch=64)
+    yield queue, engine
+    queue.close()
+    engine.dispose()
+
+
+def insert(session, names):
+    for name in names:
+        if name == "bad":
+            raise ValueError("bad item")
+        session.execute(text("INSERT INTO items (name) VALUES (:n)"), {"n": name})
+    return list(names)
+
+
+def _names(engine):
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT name FROM items"))}
+
+
+def test_queued_writes_are_group_committed(writer):
+    queue, engine = writer
+    release = threading.Event()
+
+    def blocker(session, items):
+        release.wait(5)
+        return items
+
+    first = queue.submit(blocker, None)
+    futures = [queue.submit(insert, f"n{i}") for i in range(10)]
+    release.set()
+    first.result(5)
+    assert [f.result(5) for f in futures] == [f"n{i}" for i in range(10)]
+    assert _names(engine) == {f"n{i}" for i in range(10)}
+    stats = queue.stats()
+    assert stats["jobs"] == 11 and stats["largest_batch"] > 1 and stats["batches"] < 11
+
+
+def test_a_failing_write_only_fails_itself(writer):
+    queue, engine = writer
+    release = threading.Event()
+    queue.submit(lambda session, items: [release.wait(5)] * len(items), None)
+    futures = {name: queue.submit(insert, name) for name in ("a", "bad", "b")}
+    release.set()
+    assert futures["a"].result(5) == "a" and futures["b"].result(5) == "b"
+    with pytest.raises(ValueError):
+        futures["bad"].result(5)
+    assert _names(engine) == {"a", "b"}
+    assert queue.stats()["failed"] == 1
+
+
+def test_close_drains_the_queue(writer):
+    queue, engine = writer
+    futures = [queue.submit(insert, f"c{i}") for i in range(5)]
+    queue.close()
+    assert all(f.done() for f in futures)
+    assert _names(engine) == {f"c{i}" for i in range(5)}
@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import func
+
+from app.analytics import RollupDelta
+from app.database import SessionLocal
+from app.models import Approval, Expense, ExpenseRollup
+
+
+def _submit(client, company, description):
+    return client.post(
+        "/expenses/",
+        json={"amount": 20, "currency": "EUR", "category": "office", "description": description, "date": "2024-03-04"},
+        headers=company["employee"],
+    )
+
+
+def _rollup_count(db):
+    return db.query(func.coalesce(func.sum(ExpenseRollup.expense_count), 0)).filter(ExpenseRollup.dimension == "category", ExpenseRollup.key == "office").scalar()
+
+
+def test_submission_writes_expense_chain_and_rollups(client, company):
+    db = SessionLocal()
+    try:
+        before = _rollup_count(db)
+        r = _submit(client, company, "one transaction")
+        assert r.status_code == 200, r.text
+        body = r.json()
+        # Normalised at the stubbed EUR->USD rate
+        assert body["normalized_amount"] == pytest.approx(40.0)
+        expense = db.get(Expense, body["id"])
+        steps = db.query(Approval).filter(Approval.expense_id == expense.id).order_by(Approval.step_order).all()
+        assert len(steps) == expense.total_steps >= 1
+        assert [s.status for s in steps] == ["pending"] + ["queued"] * (len(steps) - 1)
+        assert _rollup_count(db) == before + 1
+    finally:
+        db.close()
+
+
+def test_failed_submission_leaves_nothing_behind(client, company, monkeypatch):
+    def broken(self, db):
+        raise RuntimeError("rollup write failed")
+
+    monkeypatch.setattr(RollupDelta, "flush", broken)
+    with pytest.raises(RuntimeError):
+        _submit(client, company, "rolled back")
+    db = SessionLocal()
+    try:
+        assert db.query(Expense).filter(Expense.description == "rolled back").count() == 0
+        orphans = db.query(Approval).outerjoin(Expense, Expense.id == Approval.expense_id).filter(Expense.id.is_(None)).count()
+        assert orphans == 0
+    finally:
+        db.close()
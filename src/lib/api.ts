@@ -106,12 +106,27 @@ export async function apiSubmitExpense(payload: ExpenseCreatePayload, token: str
   });
 }
 
+export type Page<T> = {
+  items: T[];
+  next_cursor: string | null;
+};
+
 export async function apiMyExpenses(token: string): Promise<ExpenseResponse[]> {
-  return request('/expenses/me', {
-    headers: {
-      Authorization: `Bearer ${token}`,
-    },
-  });
+  // Follow the keyset cursor until the last page
+  const items: ExpenseResponse[] = [];
+  let cursor: string | null = null;
+  do {
+    const qs = new URLSearchParams({ limit: '200' });
+    if (cursor) qs.set('cursor', cursor);
+    const page: Page<ExpenseResponse> = await request(`/expenses/me?${qs}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    });
+    items.push(...page.items);
+    cursor = page.next_cursor;
+  } while (cursor);
+  return items;
 }
 
 export type PendingApprovalItem = {
@@ -129,6 +144,36 @@ export async function apiPendingApprovals(token: string): Promise<PendingApprova
   });
 }
 
+export type ApprovalInboxItem = {
+  approval_id: number;
+  expense_id: number;
+  step_order: number;
+  employee_id: number;
+  employee_name: string;
+  amount: number;
+  currency: string;
+  normalized_amount: number;
+  category: string;
+  description: string;
+  date: string;
+  created_at: string;
+};
+
+export type ApprovalInboxSort = 'oldest' | 'newest' | 'amount_desc' | 'amount_asc';
+
+export async function apiApprovalInbox(
+  token: string,
+  params: { sort?: ApprovalInboxSort; cursor?: string | null; limit?: number } = {},
+): Promise<Page<ApprovalInboxItem> & { total: number; total_normalized_amount: number }> {
+  const qs = new URLSearchParams({ sort: params.sort ?? 'oldest', limit: String(params.limit ?? 50) });
+  if (params.cursor) qs.set('cursor', params.cursor);
+  return request(`/expenses/approvals/inbox?${qs}`, {
+    headers: {
+      Authorization: `Bearer ${token}`,
+    },
+  });
+}
+
 export type ApprovalDecisionPayload = { approve: boolean; comment?: string };
 
 export async function apiDecideApproval(expenseId: number, payload: ApprovalDecisionPayload, token: string): Promise<{ status: string }> {